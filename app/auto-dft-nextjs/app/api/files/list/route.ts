@@ -1,4 +1,4 @@
-import { readdir } from 'fs-extra';
+import { pathExists, readdir } from 'fs-extra';
 import path from 'path';
 import { NextResponse } from 'next/server';
 
@@ -7,6 +7,14 @@ export async function GET() {
     const uploadDir = process.env.UPLOAD_DIR || path.join(process.cwd(), 'uploads');
     const files = await readdir(uploadDir);
 
+    // Optimization jobs keep their inputs and outputs in uploads/jobs/<jobId>/
+    const jobsDir = path.join(uploadDir, 'jobs');
+    const jobIds = (await pathExists(jobsDir)) ? await readdir(jobsDir) : [];
+    for (const jobId of jobIds) {
+      const jobFiles = await readdir(path.join(jobsDir, jobId)).catch(() => [] as string[]);
+      files.push(...jobFiles.map(file => `jobs/${jobId}/${file}`));
+    }
+
     // Filter for .sdf and .xyz files and prepend 'uploads/' to match the expected file path
     const validFiles = files
       .filter(file => file.endsWith('.sdf') || file.endsWith('.xyz'))
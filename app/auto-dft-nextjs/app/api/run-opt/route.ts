@@ -1,22 +1,130 @@
-import { exec } from 'child_process';
-import { promisify } from 'util';
+import { randomUUID } from 'crypto';
 import fs from 'fs-extra';
 import path from 'path';
 import { NextRequest, NextResponse } from 'next/server';
 
-const execAsync = promisify(exec);
+// Jobs are handed to a long-lived `run_opt serve --spool-dir <uploadDir>` worker
+// through a file spool: the job directory holds the input and outputs, and the
+// worker claims specs dropped into <uploadDir>/incoming.
+const POLL_INTERVAL_MS = 1000;
+// A POST waits this long for its job before answering 504 with the jobId; the
+// client then polls GET /api/run-opt?jobId=<id>. The job keeps running either way.
+const WAIT_TIMEOUT_MS = Number(process.env.RUN_OPT_WAIT_TIMEOUT_MS) || 10 * 60 * 1000;
 
-export async function POST(req: NextRequest) {
-  const uploadDir = process.env.UPLOAD_DIR || path.join(process.cwd(), 'uploads');
-  const cliWorkingDir = uploadDir; // Run CLI in the uploads directory
+type JobStatus = {
+  state: 'queued' | 'running' | 'done' | 'failed' | 'unknown';
+  error?: string;
+  results?: { xyz_filename: string | null; energy_kjmol: number | null; error: string | null }[];
+};
+
+function uploadDirectory(): string {
+  return process.env.UPLOAD_DIR || path.join(process.cwd(), 'uploads');
+}
+
+async function readStatus(statusPath: string): Promise<JobStatus | null> {
+  try {
+    return await fs.readJson(statusPath);
+  } catch {
+    // status.json is replaced atomically; a missing file just means "not yet".
+    return null;
+  }
+}
+
+function isFinal(status: JobStatus | null): status is JobStatus {
+  return status !== null && (status.state === 'done' || status.state === 'failed');
+}
+
+// Resolves with the final status, or null once the deadline passes or the client goes away.
+async function waitForJob(statusPath: string, signal: AbortSignal, timeoutMs: number): Promise<JobStatus | null> {
+  const deadline = Date.now() + timeoutMs;
+  while (!signal.aborted && Date.now() < deadline) {
+    const status = await readStatus(statusPath);
+    if (isFinal(status)) {
+      return status;
+    }
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+  }
+  return null;
+}
+
+// The response for a finished job: its energy and optimized XYZ, or the failure with the log tail.
+async function jobResponse(jobDir: string, jobId: string, status: JobStatus, sdfFileName: string) {
+  const result = status.results?.[0];
+  if (status.state === 'failed' || !result || result.error || !result.xyz_filename || result.energy_kjmol === null) {
+    let log = '';
+    try {
+      log = await fs.readFile(path.join(jobDir, 'log.txt'), 'utf-8');
+    } catch {
+      // no log written
+    }
+    return NextResponse.json(
+      {
+        error: 'Optimization failed',
+        details: result?.error || status.error || 'Unknown error',
+        stderr: log.slice(-4000),
+        jobId,
+      },
+      { status: 500 }
+    );
+  }
+
+  const xyzPath = path.join(jobDir, result.xyz_filename);
+  if (!(await fs.pathExists(xyzPath))) {
+    return NextResponse.json(
+      { error: 'Output file not found', details: `Could not find ${xyzPath}`, jobId },
+      { status: 500 }
+    );
+  }
 
+  // Read XYZ file
+  let xyzContent: string;
   try {
-    // Ensure upload directory exists
-    await fs.ensureDir(uploadDir);
+    xyzContent = await fs.readFile(xyzPath, 'utf-8');
+  } catch (error) {
+    return NextResponse.json(
+      { error: 'Failed to read output file', details: (error as Error).message, jobId },
+      { status: 500 }
+    );
+  }
+
+  // The worker reports the full-precision energy; the XYZ comment holds the rounded one
+  const energy = result.energy_kjmol;
+  const xyzFileName = path.posix.join('jobs', jobId, result.xyz_filename);
 
-    // Clear existing files in /uploads
-    await fs.emptyDir(uploadDir);
+  // Return response with file names
+  return NextResponse.json({
+    energy,
+    xyz: xyzContent,
+    sdfFileName: path.posix.join('jobs', jobId, sdfFileName),
+    xyzFileName,
+    jobId,
+  });
+}
 
+// Polls a job that a POST answered with 504: 202 while it is queued or running, then the POST's response.
+export async function GET(req: NextRequest) {
+  const jobId = req.nextUrl.searchParams.get('jobId') || '';
+  if (!/^[0-9a-f]{32}$/.test(jobId)) {
+    return NextResponse.json({ error: 'Invalid job ID', details: 'Expected the jobId of a submitted job' }, { status: 400 });
+  }
+  const jobDir = path.join(uploadDirectory(), 'jobs', jobId);
+  const status = await readStatus(path.join(jobDir, 'status.json'));
+  if (status === null) {
+    return NextResponse.json({ error: 'Job not found', details: `No job ${jobId}`, jobId }, { status: 404 });
+  }
+  if (!isFinal(status)) {
+    return NextResponse.json({ jobId, state: status.state }, { status: 202 });
+  }
+  const sdfFileName = (await fs.readdir(jobDir)).find((name) => name.endsWith('.sdf')) || '';
+  return jobResponse(jobDir, jobId, status, sdfFileName);
+}
+
+export async function POST(req: NextRequest) {
+  const uploadDir = uploadDirectory();
+  const jobId = randomUUID().replace(/-/g, '');
+  const jobDir = path.join(uploadDir, 'jobs', jobId);
+
+  try {
     // Parse form data
     const formData = await req.formData();
     const sdfFile = formData.get('sdfFile') as File | null;
@@ -87,89 +195,53 @@ export async function POST(req: NextRequest) {
     const sanitize = (input: string) => input.replace(/[^a-zA-Z0-9.-]/g, '_').toLowerCase();
     const originalFileName = sdfFile.name.toLowerCase();
     const sdfFileName = sanitize(originalFileName);
-    const sdfPath = path.join(uploadDir, sdfFileName);
-    const xyzFileName = sdfFileName.replace('.sdf', '.xyz');
-    const xyzPath = path.join(uploadDir, xyzFileName);
+    const sdfPath = path.join(jobDir, sdfFileName);
 
-    // Save SDF file to uploads directory
+    // Each job gets its own directory so concurrent jobs never touch each other's files
+    await fs.ensureDir(jobDir);
+    await fs.ensureDir(path.join(uploadDir, 'incoming'));
+
+    // Save SDF file to the job directory
     const sdfBuffer = Buffer.from(await sdfFile.arrayBuffer());
     await fs.writeFile(sdfPath, sdfBuffer);
 
-    // Run CLI command in the uploads directory with Poetry environment
-    let stdout = '',
-      stderr = '';
-    try {
-      const cliCommand = `bash -c "source $(poetry env info --path)/bin/activate && run_opt --sdf-file-path ${sdfFileName} --dielectric-constant ${dielectric} --functional ${functional} --basis ${basis} --charge ${charge} --output-dir ${uploadDir}"`;
-      const result = await execAsync(cliCommand, { cwd: cliWorkingDir });
-      stdout = result.stdout;
-      stderr = result.stderr;
-    } catch (error) {
-      await fs.remove(sdfPath);
+    // Queue the job for the worker; the rename makes the spec appear atomically
+    const spec = {
+      job_id: jobId,
+      sdf_file: sdfFileName,
+      options: {
+        dielectric_constant: dielectricNum,
+        functional,
+        basis,
+        charge: chargeNum,
+      },
+    };
+    const statusPath = path.join(jobDir, 'status.json');
+    await fs.writeJson(statusPath, { job_id: jobId, state: 'queued' });
+    const specPath = path.join(uploadDir, 'incoming', `${jobId}.json`);
+    await fs.writeJson(`${specPath}.tmp`, spec);
+    await fs.rename(`${specPath}.tmp`, specPath);
+
+    const status = await waitForJob(statusPath, req.signal, WAIT_TIMEOUT_MS);
+    if (status === null) {
+      // Still queued or running (or no `run_opt serve` worker is taking jobs); the client polls from here.
+      const current = await readStatus(statusPath);
       return NextResponse.json(
         {
-          error: 'Optimization failed',
-          details: (error as Error & { stderr?: string }).message,
-          stderr: (error as Error & { stderr?: string }).stderr || '',
+          error: 'Optimization still running',
+          details: `No result after ${Math.round(WAIT_TIMEOUT_MS / 1000)} s; poll /api/run-opt?jobId=${jobId}`,
+          state: current?.state || 'unknown',
+          jobId,
         },
-        { status: 500 }
+        { status: 504 }
       );
     }
-
-    // Verify XYZ file exists
-    if (!(await fs.pathExists(xyzPath))) {
-      await fs.remove(sdfPath);
-      return NextResponse.json(
-        { error: 'Output file not found', details: `Could not find ${xyzPath}` },
-        { status: 500 }
-      );
-    }
-
-    // Read XYZ file
-    let xyzContent: string;
-    try {
-      xyzContent = await fs.readFile(xyzPath, 'utf-8');
-    } catch (error) {
-      await fs.remove(sdfPath);
-      await fs.remove(xyzPath);
-      return NextResponse.json(
-        { error: 'Failed to read output file', details: (error as Error).message },
-        { status: 500 }
-      );
-    }
-
-    // Parse energy
-    let energy: number | null = null;
-    const xyzEnergyMatch = xyzContent.match(/Energy: ([\d.-]+) kJ\/mol/);
-    if (xyzEnergyMatch) {
-      energy = parseFloat(xyzEnergyMatch[1]);
-    } else {
-      const stdoutEnergyMatch = stdout.match(/Optimized geometry with energy: ([\d.-]+) kJ\/mol/);
-      if (stdoutEnergyMatch) {
-        energy = parseFloat(stdoutEnergyMatch[1]);
-      }
-    }
-
-    if (energy === null) {
-      await fs.remove(sdfPath);
-      await fs.remove(xyzPath);
-      return NextResponse.json(
-        { error: 'Failed to parse energy', details: 'Could not extract energy from output' },
-        { status: 500 }
-      );
-    }
-
-    // Return response with file names
-    return NextResponse.json({
-      energy,
-      xyz: xyzContent,
-      sdfFileName,
-      xyzFileName,
-    });
+    return jobResponse(jobDir, jobId, status, sdfFileName);
   } catch (error: unknown) {
     const typedError = error as Error & { stderr?: string };
     console.error('Unexpected error:', typedError);
     try {
-      await fs.emptyDir(uploadDir);
+      await fs.remove(jobDir);
     } catch (cleanupError) {
       console.error('Cleanup failed:', cleanupError);
     }
@@ -9,6 +9,9 @@ import { Label } from '@/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { useDropzone } from 'react-dropzone';
 
+// How often a job that outlived its request is polled (see /api/run-opt GET).
+const POLL_INTERVAL_MS = 5000;
+
 export default function Sidebar() {
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [errors, setErrors] = useState<{ [key: string]: string }>({});
@@ -64,11 +67,20 @@ export default function Sidebar() {
       formData.append('basis', basis);
       formData.append('charge', charge);
 
-      const response = await fetch('/api/run-opt', {
+      let response = await fetch('/api/run-opt', {
         method: 'POST',
         body: formData,
       });
-      const result = await response.json();
+      let result = await response.json();
+      if (response.status === 504 && result.jobId) {
+        // The job outlived the request; it keeps running, so poll it until it finishes.
+        toast.info('Optimization is taking a while; still waiting for it');
+        do {
+          await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+          response = await fetch(`/api/run-opt?jobId=${result.jobId}`);
+          result = await response.json();
+        } while (response.status === 202);
+      }
       if (response.ok) {
         window.dispatchEvent(
           new CustomEvent('optimize', {
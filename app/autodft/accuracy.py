@@ -0,0 +1,87 @@
+"""Adaptive accuracy schedule for the production geometry optimization.
+
+Far from the minimum the optimizer takes large steps and does not need
+production-quality energies and gradients, so the first steps run on coarse
+DFT/PCM grids with loose SCF tolerances. After every step the largest
+gradient component is compared with geomeTRIC's gmax criterion, and the
+settings move to a tighter level once it falls below that level's multiple
+of gmax. Levels only ever tighten. Every recorded step is tagged with the
+level and settings that computed it.
+
+A run that converges before reaching full accuracy is continued at full
+accuracy from its last geometry, so the final steps and the reported energy
+always use the production settings.
+"""
+from autodft.app import PREOPT_SETTINGS, apply_settings
+from autodft.events import CONVERGENCE_CRITERIA
+
+# (name, used while the largest gradient component exceeds this multiple of gmax, settings)
+ADAPTIVE_LEVELS = (
+    # The grids and tolerances of the pre-optimization stage.
+    ("coarse", 30, PREOPT_SETTINGS),
+    ("medium", 5, {"atom_grid": (75, 302), "lebedev_order": 23, "conv_tol": 1e-7, "conv_tol_grad": 5e-4,
+                   "max_cycle": 70}),
+)
+
+
+class AccuracySchedule:
+    """geomeTRIC callback that tightens the scanner's grids and SCF tolerances as the gradient converges.
+
+    full is the settings dict of the final level; coarse levels that are not
+    cheaper than it are skipped. grad_max (e.g. the last step of a resumed
+    run) picks the starting level; without it the run starts at the coarsest.
+    Must run after the StepRecorder in the callback chain.
+    """
+
+    def __init__(self, full, recorder, grad_max=None, gmax=CONVERGENCE_CRITERIA["gmax"], events=None):
+        self.levels = [(name, factor, settings) for name, factor, settings in ADAPTIVE_LEVELS
+                       if settings["atom_grid"][1] < full["atom_grid"][1] or settings["conv_tol"] > full["conv_tol"]]
+        self.levels.append(("full", 0, full))
+        self.recorder = recorder
+        self.gmax = gmax
+        self.events = events
+        self.level = 0 if grad_max is None else self._level_for(grad_max)
+        self._announce()
+
+    @property
+    def name(self):
+        return self.levels[self.level][0]
+
+    @property
+    def settings(self):
+        return self.levels[self.level][2]
+
+    def _level_for(self, grad_max):
+        return next(index for index, (_, factor, _) in enumerate(self.levels) if grad_max > factor * self.gmax)
+
+    def _announce(self):
+        if self.events is not None:
+            self.events.context["accuracy"] = self.name
+
+    def step_settings(self):
+        """The current level as a JSON-friendly dict, as logged with every step."""
+        settings = self.settings
+        return {"level": self.name, "atom_grid": list(settings["atom_grid"]),
+                "lebedev_order": settings["lebedev_order"], "conv_tol": settings["conv_tol"],
+                "conv_tol_grad": settings["conv_tol_grad"]}
+
+    def set_level(self, level, mf):
+        """Moves to level and applies its settings to the SCF object (or scanner) mf."""
+        if level != self.level:
+            self.level = level
+            apply_settings(mf, self.settings)
+            self._announce()
+
+    def finish(self, mf):
+        """Switches mf to full accuracy; returns whether the last recorded step was already at full accuracy."""
+        self.set_level(len(self.levels) - 1, mf)
+        history = self.recorder.history
+        return bool(history) and history[-1].get("accuracy", {}).get("level") == self.name
+
+    def __call__(self, envs):
+        entry = self.recorder.history[-1]
+        entry["accuracy"] = self.step_settings()
+        print(f"Step {entry['step']}: max gradient {entry['grad_max']:.2e}, {self.name} accuracy "
+              f"(grid {self.settings['atom_grid']}, Lebedev {self.settings['lebedev_order']}, "
+              f"conv_tol {self.settings['conv_tol']:.0e})")
+        self.set_level(max(self.level, self._level_for(entry["grad_max"])), envs["g_scanner"].base)
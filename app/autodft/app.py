@@ -1,140 +1,1168 @@
 import typer
-from rdkit import Chem
 import warnings
 import numpy as np
 import time
 import os
-from pyscf import gto
-from pyscf.geomopt import geometric_solver
-from gpu4pyscf.dft import rks
+import sys
+import shutil
+import tempfile
+from autodft import batch, cache
+from autodft.results import OptResult, StepRecorder, scf_cycles, to_numpy, write_csv
 
-app = typer.Typer()
+# RDKit, PySCF, geomeTRIC and gpu4pyscf take seconds to import, so they are
+# imported inside the functions that use them; `run_opt --help`, input
+# validation and cache hits never load PySCF.
 
+app = typer.Typer()
 
-def read_xyz_content(content: str) -> Chem.Mol:
-    """Reads XYZ content, adds bonds based on distances, and returns an RDKit molecule."""
-    lines = content.strip().splitlines()
-    num_atoms = int(lines[0].strip())
-    atom_block = lines[2:]
+BACKENDS = ("auto", "cpu", "gpu")
+PREOPT_METHODS = ("none", "ff", "dft")
 
-    mol = Chem.RWMol()
-    conformer = Chem.Conformer(num_atoms)
-    positions = []
+# Grid, PCM and SCF settings of the production optimization.
+PRODUCTION_SETTINGS = {
+    "atom_grid": (99, 590),
+    "lebedev_order": 29,
+    "conv_tol": 1e-8,
+    "conv_tol_grad": 3e-4,
+    "max_cycle": 70,
+}
 
-    for i, line in enumerate(atom_block):
-        parts = line.split()
-        symbol = parts[0]
-        x, y, z = map(float, parts[1:])
-        positions.append((x, y, z))
+# Coarse grids and loose tolerances for the cheap pre-optimization stage.
+PREOPT_SETTINGS = {
+    "atom_grid": (50, 194),
+    "lebedev_order": 17,
+    "conv_tol": 1e-6,
+    "conv_tol_grad": 1e-3,
+    "max_cycle": 50,
+}
+PREOPT_MAX_STEPS = 100
+OPT_MAX_STEPS = 200
 
-        atom = Chem.Atom(symbol)
-        mol.AddAtom(atom)
-        conformer.SetAtomPosition(i, (x, y, z))
 
-    mol.AddConformer(conformer, assignId=True)
+def read_xyz_content(content: str):
+    """Reads XYZ content and returns an RDKit molecule (see autodft.xyz)."""
+    from autodft.xyz import read_xyz_content as read
+    return read(content)
 
-    positions = np.array(positions)
-    for i in range(num_atoms):
-        for j in range(i + 1, num_atoms):
-            distance = np.linalg.norm(positions[i] - positions[j])
-            if distance < 1.6:
-                mol.AddBond(i, j, Chem.BondType.SINGLE)
 
-    Chem.SanitizeMol(mol)
+def mol_to_atom_list(mol):
+    conformer = mol.GetConformer()
 
-    return mol
+    atom_list = []
+    for atom in mol.GetAtoms():
+        pos = conformer.GetAtomPosition(atom.GetIdx())
+        atom_list.append((atom.GetSymbol(), (pos.x, pos.y, pos.z)))
+    return atom_list
 
 
 def get_atom_list(sdf_file_path):
+    from rdkit import Chem
+
     molecules = Chem.SDMolSupplier(sdf_file_path, removeHs=False)
     mol = next(molecules)
+    return mol_to_atom_list(mol)
 
-    conformer = mol.GetConformer()
 
-    atom_list = []
-    for atom in mol.GetAtoms():
-        pos = conformer.GetAtomPosition(atom.GetIdx())
-        atom_list.append((atom.GetSymbol(), (pos.x, pos.y, pos.z)))
-    return atom_list
+def iter_sdf_records(sdf_file_path):
+    """Yields (index, name, mol) for every record of an SDF file.
 
+    Records RDKit cannot parse are yielded with mol set to None so the caller
+    can report them instead of silently dropping them.
+    """
+    from rdkit import Chem
 
-def opti_PCM(mol, functional, eps, xyz_filename):
-    start_time = time.time()
+    molecules = Chem.SDMolSupplier(sdf_file_path, removeHs=False)
+    for index, mol in enumerate(molecules):
+        if mol is None:
+            yield index, None, None
+            continue
+        name = mol.GetProp("_Name").strip() if mol.HasProp("_Name") else ""
+        yield index, name, mol
+
+
+def iter_atom_lists(sdf_file_path):
+    """Yields (index, name, atom_list) for every record of an SDF file; atom_list is None for unparsable records."""
+    for index, name, mol in iter_sdf_records(sdf_file_path):
+        yield index, name, None if mol is None else mol_to_atom_list(mol)
+
+
+def resolve_backend(backend="auto"):
+    """Maps 'auto' to 'gpu' when gpu4pyscf and a CUDA device are usable, otherwise 'cpu'."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    if backend != "auto":
+        return backend
+    try:
+        import cupy
+        from gpu4pyscf.dft import rks  # noqa: F401
+        if cupy.cuda.runtime.getDeviceCount() > 0:
+            return "gpu"
+    except Exception:
+        pass
+    return "cpu"
+
+
+def get_rks(backend):
+    """Returns the RKS module of the given (resolved) backend."""
+    if backend == "gpu":
+        from gpu4pyscf.dft import rks
+    else:
+        from pyscf.dft import rks
+    return rks
+
+
+def apply_settings(mf, settings):
+    """Sets the grid, PCM and SCF settings (see PRODUCTION_SETTINGS) of an RKS + PCM object.
+
+    On a scanner they take effect at the next geometry, when grids and PCM
+    surface are rebuilt.
+    """
+    mf.conv_tol = settings["conv_tol"]
+    mf.conv_tol_grad = settings["conv_tol_grad"]
+    mf.max_cycle = settings["max_cycle"]
+    mf.grids.atom_grid = settings["atom_grid"]
+    mf.with_solvent.lebedev_order = settings["lebedev_order"]
+    return mf
+
+
+def build_mf(mol, functional, eps, backend="cpu", settings=None):
+    """Builds the density-fitted RKS + IEF-PCM object (production settings by default)."""
+    rks = get_rks(backend)
     mf = rks.RKS(mol).density_fit()
     mf.xc = functional
 
-    mf.conv_tol = 1e-8
-    mf.conv_tol_grad = 3e-4
-    mf.max_cycle = 70
-
     mf = mf.PCM()
-    mf.grids.atom_grid = (99, 590)
-    mf.with_solvent.lebedev_order = 29
     mf.with_solvent.method = 'IEF-PCM'
     mf.with_solvent.eps = eps
+    return apply_settings(mf, settings or PRODUCTION_SETTINGS)
 
-    print("Starting geometry optimization...")
-    mol_opt = geometric_solver.optimize(mf, max_steps=200, xtol=1e-8, gtol=3e-4, etol=1e-8)
-    mf = rks.RKS(mol_opt).density_fit()
-    mf.kernel()
 
-    optimized_atoms = [(atom[0], mol_opt.atom_coords(unit='Angstrom')[i]) for i, atom in enumerate(mol_opt.atom)]
+def chain_callbacks(*callbacks):
+    callbacks = [callback for callback in callbacks if callback is not None]
 
-    print(f"Optimized geometry saved to '{xyz_filename}'.")
+    def callback(envs):
+        for fn in callbacks:
+            fn(envs)
+    return callback
+
+
+def warm_scanner(mf, dm0):
+    """Converges mf from dm0 and returns it as a scanner that reuses that work at the same geometry.
+
+    SCF_Scanner resets the DF tensors, grids and PCM intermediates on every
+    call. The optimizer's first step evaluates the start geometry again, so
+    while the geometry stays the same, resets keep the DF tensors and grids,
+    clear only the PCM intermediates and the SCF starts from the converged
+    density. The gradient scanner resets twice per call (itself, then the SCF
+    scanner), so the full reset only comes back once the geometry changes.
+    """
+    mf = mf.as_scanner()
+    mf.kernel(dm0=dm0)
+    coords = mf.mol.atom_coords()
+
+    def reset(mol=None):
+        if (mol is None or mol.natm != len(coords)
+                or not np.allclose(mol.atom_coords(), coords, rtol=0, atol=1e-10)):
+            del mf.reset
+            return mf.reset(mol)
+        mf.mol = mol
+        mf.with_solvent.reset(mol)
+        return mf
+    mf.reset = reset
+    return mf
+
+
+def seed_guess(mf, dm0):
+    """Makes dm0 the initial density of mf's first SCF run, in place of the atomic guess.
+
+    Unlike warm_scanner, nothing is converged here: the optimizer's first step
+    starts from dm0 and every later step from the step before, as usual.
+    """
+    get_init_guess = mf.get_init_guess
+    used = []
+
+    def seeded(mol=None, key="minao", **kwargs):
+        if used:
+            return get_init_guess(mol, key, **kwargs)
+        used.append(True)
+        return dm0
+    mf.get_init_guess = seeded
+    return mf
+
+
+def plan_memory_for(mf, functional, settings, backend):
+    """Estimates the memory of mf's optimization, prints the plan for mf.max_memory and applies it to mf."""
+    from autodft.memory import configure_memory, estimate_memory, plan_memory, print_memory_plan
+    from autodft.profiling import current_rss_mb
+
+    estimate = estimate_memory(mf.mol, settings, functional, getattr(mf.with_df, "auxbasis", None))
+    plan = plan_memory(estimate, mf.max_memory, backend, baseline_mb=current_rss_mb())
+    print_memory_plan(estimate, plan)
+    configure_memory(mf, plan)
+    return dict(plan, estimate=estimate)
+
+
+def preoptimize_ff(mol, molblock):
+    """Relaxes mol with MMFF94 (UFF when MMFF lacks parameters); returns the relaxed mol and step count.
+
+    molblock must hold the same atoms in the same order as mol, i.e. the SDF
+    record mol was built from. RDKit does not expose the iteration count, so
+    the step count is None.
+    """
+    from rdkit import Chem
+    from rdkit.Chem import AllChem
+
+    rdmol = Chem.MolFromMolBlock(molblock, removeHs=False)
+    if rdmol is None:
+        raise ValueError("force-field pre-optimization needs a parsable SDF record")
+    if AllChem.MMFFHasAllMoleculeParams(rdmol):
+        ff = AllChem.MMFFGetMoleculeForceField(rdmol, AllChem.MMFFGetMoleculeProperties(rdmol))
+    else:
+        ff = AllChem.UFFGetMoleculeForceField(rdmol)
+    ff.Initialize()
+    ff.Minimize(maxIts=2000)
+    coords = np.array(ff.Positions()).reshape(-1, 3)
+    return mol.set_geom_(coords, unit='Angstrom', inplace=False), None
+
+
+def preoptimize_dft(mol, functional, eps, backend, basis, events=None):
+    """Relaxes mol in a small basis with coarse grids and loose tolerances; returns the relaxed mol and step count."""
+    from pyscf.geomopt import geometric_solver
+
+    mol_small = mol.copy()
+    mol_small.basis = basis
+    mol_small.build()
+    mf = build_mf(mol_small, functional, eps, backend, PREOPT_SETTINGS)
 
-    final_energy_hartree = mf.e_tot
-    hartree_to_kjmol = 2625.5
-    final_energy_kjmol = final_energy_hartree * hartree_to_kjmol
+    recorder = StepRecorder()
+    callback = recorder
+    if events is not None:
+        mf.callback = events.on_scf_cycle
+        callback = chain_callbacks(recorder, events.on_geometry_step)
+    mol_relaxed = geometric_solver.optimize(mf, maxsteps=PREOPT_MAX_STEPS, convergence_set='GAU_LOOSE',
+                                            callback=callback)
+    return mol.set_geom_(mol_relaxed.atom_coords(), unit='Bohr', inplace=False), len(recorder.history)
 
-    print(f"Final energy: {final_energy_hartree:.8f} Hartree ({final_energy_kjmol:.2f} kJ/mol)")
+
+def print_stages(stages):
+    print(f"{'Stage':<16}{'Steps':>8}{'Time (s)':>12}")
+    for stage in stages:
+        steps = "-" if stage["steps"] is None else stage["steps"]
+        print(f"{stage['stage']:<16}{steps:>8}{stage['time']:>12.2f}")
+
+
+def mol_atoms(mol):
+    """Returns [(symbol, (x, y, z)), ...] in Angstrom for a PySCF Mole."""
+    coords = mol.atom_coords(unit='Angstrom')
+    return [(mol.atom_symbol(i), tuple(float(c) for c in coords[i])) for i in range(mol.natm)]
+
+
+def write_xyz(xyz_filename, atoms, energy_kjmol):
     with open(xyz_filename, 'w') as xyz_file:
-        xyz_file.write(f"{len(optimized_atoms)}\n")
-        xyz_file.write(f"Energy: {final_energy_kjmol:.2f} kJ/mol\n")
-        for symbol, coords in optimized_atoms:
+        xyz_file.write(f"{len(atoms)}\n")
+        xyz_file.write(f"Energy: {energy_kjmol:.2f} kJ/mol\n")
+        for symbol, coords in atoms:
             formatted_coords = ' '.join(f"{coord:.8f}" for coord in coords)
             xyz_file.write(f"{symbol} {formatted_coords}\n")
-    opt_time = time.time()
-    total_opt_time = opt_time - start_time
-    print(f"\nOPT Time: {total_opt_time:.2f} seconds")
+
+
+def opti_PCM(mol, functional, eps, xyz_filename, backend="auto", preopt="none", preopt_basis="sto-3g",
+             molblock=None, single_point=False, checkpoint=None, resume=False, events=None, settings=None,
+             profiler=None, frequencies=False, hessian="auto", temperature=298.15, pressure=101325.0,
+             freq_workers=None, mf=None, adaptive=False, dm0=None, dm0_coords=None):
+    """Optimizes mol with DFT + IEF-PCM, writes the XYZ file and returns an OptResult.
+
+    The reported energy is the optimizer's converged final step. A separate
+    single point at the optimized geometry, warm-started from the final
+    density, only runs when single_point is set.
+
+    With a checkpoint path the optimization state is saved after every step
+    and the file is removed once the run succeeds. With resume set, a run
+    restarts from that file: last geometry, SCF orbitals as the initial guess,
+    the optimizer's Hessian and the step history.
+
+    events is an optional autodft.events.EventStream that receives one event
+    per SCF cycle and per geometry step. settings overrides the production
+    grid/SCF settings (see build_mf). profiler is an installed
+    autodft.profiling.Profiler that also records every geometry step.
+
+    With frequencies set, a Hessian (see autodft.frequencies) is computed at
+    the optimized geometry and result.thermo holds the frequencies, imaginary
+    modes and ZPE/enthalpy/free energy at temperature (K) and pressure (Pa).
+
+    mf is an optional SCF object (or SCF scanner) for mol to use instead of a
+    new one, e.g. result.scf of an earlier run in the same basis; its last
+    density is the initial guess of the first step.
+
+    With adaptive set, early steps use coarser grids and looser SCF
+    tolerances that tighten as the gradient converges (see autodft.accuracy);
+    the final steps and the reported energy use the full settings.
+
+    dm0 is an optional initial density for the start geometry, e.g. the
+    converged density of another conformer with the same atoms; with
+    dm0_coords (Bohr), the geometry dm0 belongs to, it is first rotated into
+    the orientation of the start geometry (see autodft.guess). dm0 is not used
+    when resuming from a checkpoint.
+    """
+    from pyscf import lib
+    from pyscf.geomopt import geometric_solver
+    from autodft.checkpoint import Checkpointer, load_checkpoint
+    from autodft.events import CONVERGENCE_CRITERIA
+    from autodft.memory import configure_memory
+    from autodft.profiling import peak_rss_mb
+
+    start_time = time.time()
+    backend = resolve_backend(backend)
+    print(f"Backend: {backend} ({lib.num_threads()} threads, max_memory {mol.max_memory:.0f} MB)")
+
+    state = load_checkpoint(checkpoint) if resume else None
+    if state is not None:
+        chk_mol = state["mol"]
+        if [chk_mol.atom_symbol(i) for i in range(chk_mol.natm)] != [mol.atom_symbol(i) for i in range(mol.natm)]:
+            raise ValueError(f"Checkpoint '{checkpoint}' does not match the input molecule")
+        mol = mol.set_geom_(chk_mol.atom_coords(), unit='Bohr', inplace=False)
+        print(f"Resuming from '{checkpoint}' after {len(state['history'])} geometry steps.")
+    elif checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    stages = []
+    if preopt != "none" and state is None:
+        print(f"Starting {preopt} pre-optimization...")
+        stage_start = time.time()
+        if events is not None:
+            events.context["stage"] = f"preopt ({preopt})"
+        if preopt == "ff":
+            mol, steps = preoptimize_ff(mol, molblock)
+        elif preopt == "dft":
+            mol, steps = preoptimize_dft(mol, functional, eps, backend, preopt_basis, events)
+        else:
+            raise ValueError(f"Unknown pre-optimization '{preopt}', expected one of {', '.join(PREOPT_METHODS)}")
+        stages.append({"stage": f"preopt ({preopt})", "steps": steps, "time": time.time() - stage_start})
+
+    recorder = StepRecorder(history=state["history"] if state else None)
+    schedule = None
+    if adaptive:
+        from autodft.accuracy import AccuracySchedule
+        schedule = AccuracySchedule(settings or PRODUCTION_SETTINGS, recorder,
+                                    grad_max=recorder.history[-1]["grad_max"] if recorder.history else None,
+                                    events=events)
+    if mf is None:
+        mf = build_mf(mol, functional, eps, backend, schedule.settings if schedule else settings)
+    elif schedule is not None:
+        apply_settings(mf, schedule.settings)
+    memory = plan_memory_for(mf, functional, settings or PRODUCTION_SETTINGS, backend)
+    warm_start = dm0 is not None and state is None
+    if warm_start:
+        if dm0_coords is not None:
+            from autodft.guess import align_density
+            dm0 = align_density(mol, dm0, dm0_coords)
+        if backend == "gpu":
+            import cupy
+            dm0 = cupy.asarray(dm0)
+        mf = seed_guess(mf, dm0)
+        print("The first SCF starts from the initial density.")
+
+    print("Starting geometry optimization...")
+    stage_start = time.time()
+    step_events = None
+    if events is not None:
+        events.context["stage"] = "production"
+        mf.callback = events.on_scf_cycle
+        step_events = events.on_geometry_step
+    opt_kwargs = {}
+    checkpointer = None
+    if checkpoint:
+        mf.chkfile = checkpoint
+        checkpointer = Checkpointer(checkpoint, recorder)
+        if state is not None:
+            mf.init_guess = 'chkfile'
+            if state["hessian"] is not None:
+                opt_kwargs["hess_data"] = state["hessian"].tolist()
+                opt_kwargs["frequency"] = False
+    callback = chain_callbacks(recorder, schedule, checkpointer, step_events, profiler and profiler.on_geometry_step)
+    # geomeTRIC's own keys; they are the criteria the geometry_step events report.
+    conv_params = {f"convergence_{key}": value for key, value in CONVERGENCE_CRITERIA.items()}
+    converged, mol_opt = geometric_solver.kernel(mf, maxsteps=OPT_MAX_STEPS, callback=callback, **conv_params,
+                                                 **opt_kwargs)
+    if not recorder.history:
+        raise RuntimeError("geometry optimizer finished without evaluating a single step")
+    if schedule is not None and not schedule.finish(recorder.scanner.base):
+        print("Optimizer stopped before reaching full accuracy; continuing at full accuracy...")
+        converged, mol_opt = geometric_solver.kernel(recorder.scanner, maxsteps=OPT_MAX_STEPS, callback=callback,
+                                                     **conv_params)
+    stages.append({"stage": "production", "steps": len(recorder.history), "time": time.time() - stage_start})
+    if events is not None:
+        events.context.pop("accuracy", None)
+
+    result = OptResult(
+        mol=mol_opt,
+        energy_hartree=recorder.energy,
+        converged=converged,
+        gradient=recorder.gradient,
+        dm=recorder.density(),
+        history=recorder.history,
+        stages=stages,
+        scf=recorder.scanner.base,
+        trajectory=np.array(recorder.trajectory) * lib.param.BOHR,
+        warm_start=warm_start,
+    )
+
+    mf_final = None
+    if single_point:
+        stage_start = time.time()
+        mf_final = configure_memory(build_mf(mol_opt, functional, eps, backend, settings), memory)
+        if events is not None:
+            events.context["stage"] = "single point"
+            mf_final.callback = events.on_scf_cycle
+        mf_final.kernel(dm0=result.dm)
+        result.energy_hartree = float(mf_final.e_tot)
+        result.dm = to_numpy(mf_final.make_rdm1())
+        stages.append({"stage": "single point", "steps": 1, "time": time.time() - stage_start})
+
+    if frequencies:
+        from autodft.frequencies import print_thermo, run_frequencies
+
+        print("Starting frequency calculation...")
+        stage_start = time.time()
+        if events is not None:
+            events.context["stage"] = "frequencies"
+        if mf_final is None:
+            mf_final = configure_memory(build_mf(mol_opt, functional, eps, backend, settings), memory)
+            mf_final.kernel(dm0=result.dm)
+        result.thermo = run_frequencies(mf_final, functional, eps, backend, settings, hessian=hessian,
+                                        temperature=temperature, pressure=pressure, workers=freq_workers)
+        print_thermo(result.thermo)
+        stages.append({"stage": "frequencies", "steps": None, "time": time.time() - stage_start})
+
+    write_xyz(xyz_filename, mol_atoms(mol_opt), result.energy_kjmol)
+    print(f"Optimized geometry saved to '{xyz_filename}'.")
+    if not converged:
+        print("Warning: geometry optimization did not converge; the last geometry was saved.")
+
+    print(f"Final energy: {result.energy_hartree:.8f} Hartree ({result.energy_kjmol:.2f} kJ/mol)")
+    result.time = time.time() - start_time
+    result.memory = dict(memory, peak_rss_mb=round(peak_rss_mb(), 1))
+    print(f"\nOPT Time: {result.time:.2f} seconds")
+    print(f"Peak memory: {result.memory['peak_rss_mb']:.0f} MB (estimate {memory['estimate']['total']:.0f} MB, "
+          f"budget {memory['budget_mb']:.0f} MB)")
+    print_stages(stages)
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
 
     print("################################################################")
-    return mol_opt, final_energy_kjmol
+    return result
+
+
+def _optimize_record(job):
+    """Optimizes one SDF record; errors are returned rather than raised so a batch keeps going."""
+    from pyscf import gto, lib
+    from autodft.checkpoint import checkpoint_path
+    from autodft.events import EventStream
+    from autodft.profiling import Profiler
+
+    result = {"index": job["index"], "name": job["name"], "xyz_filename": job["xyz_filename"]}
+    profiler = Profiler() if job.get("profile") else None
+    events = None
+    if job.get("events"):
+        events = EventStream(job["events"], index=job["index"], name=job["name"])
+        events.emit("start", xyz_filename=job["xyz_filename"])
+    try:
+        if job["atom_list"] is None:
+            raise ValueError("RDKit could not parse this record")
+        dm0 = dm0_coords = cold_cycles = None
+        if job.get("guess_dir"):
+            from autodft import guess
+            guess_key = guess.guess_key(job)
+            dm0, dm0_coords, cold_cycles = guess.load_guess(
+                job["guess_dir"], guess_key, np.array([coords for _, coords in job["atom_list"]]) / lib.param.BOHR)
+        if profiler is not None:
+            profiler.install()
+        mol = gto.Mole()
+        # Mole's default stdout is bound at import time; follow redirections (e.g. a service job log).
+        mol.stdout = sys.stdout
+        mol.build(
+            atom=job["atom_list"],
+            basis=job["basis"],
+            charge=job["charge"],
+            spin=0,
+            verbose=4,
+            max_memory=job["max_memory"] or lib.param.MAX_MEMORY,
+        )
+        opt = opti_PCM(mol, job["functional"], job["eps"], job["xyz_filename"],
+                       backend=job["backend"], preopt=job["preopt"], preopt_basis=job["preopt_basis"],
+                       molblock=job["molblock"], single_point=job["single_point"],
+                       checkpoint=checkpoint_path(job["xyz_filename"]) if job["checkpoint"] else None,
+                       resume=job["resume"], events=events, profiler=profiler,
+                       frequencies=job.get("frequencies", False), hessian=job.get("hessian", "auto"),
+                       temperature=job.get("temperature", 298.15), pressure=job.get("pressure", 101325.0),
+                       freq_workers=job.get("freq_workers"), adaptive=job.get("adaptive", False), dm0=dm0,
+                       dm0_coords=dm0_coords)
+        result["energy_kjmol"] = opt.energy_kjmol
+        result["energy_hartree"] = opt.energy_hartree
+        result["converged"] = opt.converged
+        result["history"] = opt.history
+        result["atoms"] = mol_atoms(opt.mol)
+        result["time"] = opt.time
+        result["opt_time"] = next(stage["time"] for stage in opt.stages if stage["stage"] == "production")
+        result["peak_rss_mb"] = opt.memory["peak_rss_mb"]
+        cycles = scf_cycles(opt.history)
+        if cycles is not None:
+            result["scf_cycles"] = cycles
+        if job.get("guess_dir"):
+            first_step = opt.history[0].get("scf_cycles") if opt.history else None
+            if not opt.warm_start:
+                if dm0 is None and cold_cycles is None:
+                    # The first conformer of its atom list is the cold-start reference.
+                    cold_cycles = first_step
+            else:
+                result["warm_start"] = True
+                if cold_cycles is not None and first_step is not None:
+                    result["scf_cycles_saved"] = cold_cycles - first_step
+            guess.save_guess(job["guess_dir"], guess_key, to_numpy(opt.dm), opt.mol.atom_coords(), cold_cycles)
+        if job.get("store"):
+            # Only sent back to the parent when a results store will keep them.
+            result["gradient"] = to_numpy(opt.gradient).tolist()
+            result["trajectory"] = opt.trajectory.tolist()
+        if opt.thermo is not None:
+            result["thermo"] = opt.thermo
+        if events is not None:
+            events.context.pop("stage", None)
+            events.emit("result", energy_hartree=opt.energy_hartree, energy_kjmol=opt.energy_kjmol,
+                        converged=opt.converged, steps=len(opt.history), stages=opt.stages,
+                        xyz_filename=job["xyz_filename"], opt_time=opt.time, thermo=opt.thermo)
+    except Exception as e:
+        result["error"] = str(e)
+        if events is not None:
+            events.emit("error", error=str(e))
+    finally:
+        if profiler is not None:
+            profiler.uninstall()
+            result["profile"] = profiler.summary()
+        if events is not None:
+            events.close()
+    return result
+
+
+def job_cache_key(job):
+    """Cache key of everything in a job that changes the optimized geometry or energy."""
+    return cache.cache_key(
+        job["atom_list"],
+        functional=job["functional"].upper(),
+        basis=job["basis"].lower(),
+        charge=job["charge"],
+        eps=job["eps"],
+        settings=PRODUCTION_SETTINGS,
+        solvent_method='IEF-PCM',
+        preopt=job["preopt"],
+        preopt_basis=job["preopt_basis"].lower() if job["preopt"] == "dft" else None,
+        single_point=job["single_point"],
+        # Only present when requested so keys of earlier entries stay valid.
+        **({"frequencies": [job["temperature"], job["pressure"]]} if job.get("frequencies") else {}),
+        **({"adaptive": True} if job.get("adaptive") else {}),
+    )
+
+
+def batch_xyz_filenames(sdf_file_path, count, output_dir=None):
+    """One XYZ per record: '<base>.xyz' for a single record, '<base>_<n>.xyz' otherwise."""
+    base_name = os.path.splitext(os.path.basename(sdf_file_path))[0]
+    if count == 1:
+        names = [f"{base_name}.xyz"]
+    else:
+        names = [f"{base_name}_{i + 1}.xyz" for i in range(count)]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        names = [os.path.join(output_dir, name) for name in names]
+    return names
+
+
+def make_job(index, name, rdmol, xyz_filename, **options):
+    """Builds the job dict _optimize_record runs for one SDF record (rdmol None marks an unparsable record).
+
+    options are the method/run settings: functional, basis, charge, eps,
+    backend, max_memory, preopt, preopt_basis, single_point, checkpoint,
+    resume, events, profile and adaptive.
+    """
+    from rdkit import Chem
+
+    return dict(
+        options,
+        index=index,
+        name=name,
+        atom_list=None if rdmol is None else mol_to_atom_list(rdmol),
+        molblock=None if rdmol is None else Chem.MolToMolBlock(rdmol),
+        xyz_filename=xyz_filename,
+    )
+
+
+def run_jobs(jobs, workers=1, threads=None, use_cache=True, cache_dir=None, schedule=False, memory_budget_mb=None):
+    """Runs optimization jobs, answering from the result cache where possible; returns one result dict per job.
+
+    With schedule set, the jobs to compute are ordered and packed by their
+    predicted cost and memory (see autodft.costmodel), within memory_budget_mb
+    (default: the node's physical memory), and predicted against actual
+    times are reported.
+    """
+    results = [None] * len(jobs)
+    cache_dir = cache_dir or cache.default_cache_dir()
+    if use_cache:
+        for i, job in enumerate(jobs):
+            if job["atom_list"] is None:
+                continue
+            job["cache_key"] = job_cache_key(job)
+            entry = cache.lookup(cache_dir, job["cache_key"])
+            if entry is not None:
+                write_xyz(job["xyz_filename"], entry["atoms"], entry["energy_kjmol"])
+                results[i] = dict(entry, index=job["index"], name=job["name"],
+                                  xyz_filename=job["xyz_filename"], cached=True)
+                if job.get("events"):
+                    from autodft.events import EventStream
+                    stream = EventStream(job["events"], index=job["index"], name=job["name"])
+                    stream.emit("result", energy_hartree=entry["energy_hartree"], energy_kjmol=entry["energy_kjmol"],
+                                converged=entry["converged"], xyz_filename=job["xyz_filename"], cached=True)
+                    stream.close()
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        backend = resolve_backend(jobs[pending[0]]["backend"])
+        for i in pending:
+            jobs[i]["backend"] = backend
+    scheduled = [jobs[i] for i in pending]
+    costs = memory = None
+    if schedule and scheduled:
+        from autodft import costmodel
+        worker_threads = batch.thread_budget(workers, threads)
+        costmodel.predict(scheduled, backend, workers, worker_threads, PRODUCTION_SETTINGS, cache_dir)
+        memory_budget_mb = memory_budget_mb or costmodel.node_memory_mb()
+        makespan = costmodel.print_schedule(scheduled, workers, memory_budget_mb)
+        costs = [job["predicted"] for job in scheduled]
+        memory = [costmodel.job_memory_mb(job) for job in scheduled]
+    start = time.time()
+    computed = batch.run_batch(scheduled, _optimize_record, workers=workers, threads=threads, costs=costs,
+                               memory_mb=memory, memory_budget_mb=memory_budget_mb if schedule else None)
+    if costs is not None:
+        costmodel.report(scheduled, computed, makespan, time.time() - start, backend, workers, worker_threads,
+                         cache_dir)
+    for i, result in zip(pending, computed):
+        results[i] = dict(result, index=jobs[i]["index"], name=jobs[i]["name"],
+                          xyz_filename=jobs[i]["xyz_filename"])
+        if use_cache and "error" not in result and "cache_key" in jobs[i]:
+            cache.store(cache_dir, jobs[i]["cache_key"],
+                        {key: result[key] for key in ("atoms", "energy_hartree", "energy_kjmol", "converged", "time",
+                                                      "thermo") if key in result})
+    if use_cache and pending:
+        cache.evict(cache_dir)
+    return results
+
+
+def optimize_sdf(sdf_file_path, dielectric_constant=78.5, functional="M06-2X", basis="def2-svpd", charge=0,
+                 output_dir=None, workers=1, threads=None, backend="auto", max_memory=None, preopt="none",
+                 preopt_basis="sto-3g", single_point=False, checkpoint=True, resume=False, use_cache=True,
+                 cache_dir=None, events=None, profile_report=None, metrics_file=None, dedupe=False,
+                 dedupe_tolerance=None, frequencies=False, hessian="auto", temperature=298.15, pressure=101325.0,
+                 freq_workers=None, adaptive_accuracy=False, results_store=None, schedule=False, node_memory=None, conformer_guess=True):
+    """Optimizes every record of an SDF file and returns one result dict per record.
+
+    Failed records carry an 'error' message instead of energies; cache hits
+    are flagged with 'cached'. events is an event stream target ('-',
+    'fd:N' or a file path, see autodft.events) or None. With profile_report
+    and/or metrics_file, computed records are instrumented (see
+    autodft.profiling) and their stage timings written as a JSON run report
+    and a Prometheus textfile.
+
+    With dedupe set, near-duplicate records (see autodft.dedupe) are not
+    optimized: each one gets a copy of its representative's result and XYZ,
+    renumbered to its own atom order, with 'duplicate_of' holding the
+    representative's record index.
+
+    frequencies, hessian, temperature, pressure and freq_workers configure
+    the optional frequency stage (see opti_PCM); its results are in 'thermo'.
+    adaptive_accuracy enables the adaptive grid/tolerance schedule. With
+    results_store (an HDF5 path, see autodft.store), every optimized record is
+    also appended to that store. schedule runs the records longest first
+    within node_memory MB (see run_jobs). With conformer_guess, a record
+    starts from the converged density of a finished record with the same atom
+    list (see autodft.guess) and reports 'scf_cycles_saved'.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    if preopt not in PREOPT_METHODS:
+        raise ValueError(f"Unknown pre-optimization '{preopt}', expected one of {', '.join(PREOPT_METHODS)}")
+    if frequencies and hessian not in ("auto", "analytic", "fd"):
+        raise ValueError(f"Unknown Hessian method '{hessian}', expected one of auto, analytic, fd")
+    if not os.path.isfile(sdf_file_path):
+        raise FileNotFoundError(f"SDF file '{sdf_file_path}' not found")
+    if events and events.startswith("fd:") and workers > 1:
+        raise ValueError("an fd: event stream is not inherited by pool workers; use '-' or a file path")
+    records = list(iter_sdf_records(sdf_file_path))
+    if not records:
+        raise ValueError(f"No molecules found in '{sdf_file_path}'")
+    xyz_filenames = batch_xyz_filenames(sdf_file_path, len(records), output_dir)
+    # Densities are only shared within this batch.
+    guess_dir = tempfile.mkdtemp(prefix="autodft_guess_") if conformer_guess and len(records) > 1 else None
+    jobs = [
+        make_job(index, name, rdmol, xyz_filename, functional=functional, basis=basis, charge=charge,
+                 eps=dielectric_constant, backend=backend, max_memory=max_memory, preopt=preopt,
+                 preopt_basis=preopt_basis, single_point=single_point, checkpoint=checkpoint or resume,
+                 resume=resume, events=events, profile=bool(profile_report or metrics_file),
+                 frequencies=frequencies, hessian=hessian, temperature=temperature, pressure=pressure,
+                 freq_workers=freq_workers, adaptive=adaptive_accuracy, store=bool(results_store),
+                 guess_dir=guess_dir)
+        for (index, name, rdmol), xyz_filename in zip(records, xyz_filenames)
+    ]
+
+    duplicates, orders = {}, {}
+    if dedupe:
+        from autodft import dedupe as dedupe_index
+        tolerance = dedupe_index.DEFAULT_TOLERANCE if dedupe_tolerance is None else dedupe_tolerance
+        duplicates = dedupe_index.find_duplicates(
+            [(index, rdmol) for index, _, rdmol in records if rdmol is not None], tolerance)
+        rdmols = {index: rdmol for index, _, rdmol in records}
+        orders = {index: dedupe_index.atom_order(rdmols[index], rdmols[kept]) for index, kept in duplicates.items()}
+        # A duplicate whose atoms cannot be matched to its representative's is optimized itself.
+        duplicates = {index: kept for index, kept in duplicates.items() if orders[index] is not None}
+        if duplicates:
+            print(f"{len(duplicates)} near-duplicate records skipped "
+                  f"({len(records) - len(duplicates)} sent to DFT, tolerance {tolerance} A).")
+
+    unique = [job for job in jobs if job["index"] not in duplicates]
+    try:
+        results = dict(zip((job["index"] for job in unique),
+                           run_jobs(unique, workers=workers, threads=threads, use_cache=use_cache,
+                                    cache_dir=cache_dir, schedule=schedule, memory_budget_mb=node_memory)))
+    finally:
+        if guess_dir:
+            shutil.rmtree(guess_dir, ignore_errors=True)
+    for job in jobs:
+        if job["index"] in duplicates:
+            representative = reorder_atoms(results[duplicates[job["index"]]], orders[job["index"]])
+            if "error" not in representative:
+                write_xyz(job["xyz_filename"], representative["atoms"], representative["energy_kjmol"])
+            results[job["index"]] = dict(representative, index=job["index"], name=job["name"],
+                                         xyz_filename=job["xyz_filename"],
+                                         duplicate_of=duplicates[job["index"]])
+    results = [results[job["index"]] for job in jobs]
+    if results_store:
+        store_results(results_store, jobs, results, sdf_file=os.path.abspath(sdf_file_path))
+    if profile_report or metrics_file:
+        write_profiles(results, profile_report, metrics_file, functional=functional, basis=basis,
+                       backend=jobs[0]["backend"], workers=workers, threads=threads)
+    return results
+
+
+def reorder_atoms(result, order):
+    """Copy of result with its geometry, gradient and trajectory in another atom numbering (see dedupe.atom_order)."""
+    result = dict(result)
+    if "atoms" in result:
+        result["atoms"] = [result["atoms"][k] for k in order]
+    if result.get("gradient") is not None:
+        result["gradient"] = [result["gradient"][k] for k in order]
+    if result.get("trajectory") is not None:
+        result["trajectory"] = [[frame[k] for k in order] for frame in result["trajectory"]]
+    return result
+
+
+def store_results(path, jobs, results, **metadata):
+    """Appends every successful record of a batch to the HDF5 results store at path."""
+    from autodft.store import ResultStore
+
+    with ResultStore(path) as store:
+        for job, result in zip(jobs, results):
+            if "error" in result:
+                continue
+            store.append(
+                os.path.splitext(os.path.basename(job["xyz_filename"]))[0], result["atoms"],
+                result["energy_hartree"], result["converged"], gradient=result.get("gradient"),
+                trajectory=result.get("trajectory"), molblock=job["molblock"], name=job["name"],
+                index=job["index"], functional=job["functional"], basis=job["basis"], charge=job["charge"],
+                eps=job["eps"], backend=job["backend"], preopt=job["preopt"], single_point=job["single_point"],
+                adaptive=job.get("adaptive", False), settings=PRODUCTION_SETTINGS, time=result.get("time"),
+                cached=result.get("cached", False), duplicate_of=result.get("duplicate_of"),
+                history=result.get("history"), thermo=result.get("thermo"), **metadata,
+            )
+    print(f"Results appended to '{path}'.")
+
+
+def write_profiles(results, profile_report=None, metrics_file=None, **metadata):
+    """Exports the profiles of the computed records as a JSON run report and/or a Prometheus textfile."""
+    from autodft import profiling
+
+    runs = [
+        {key: result.get(key) for key in ("index", "name", "xyz_filename", "energy_hartree", "converged",
+                                          "error", "profile")}
+        for result in results if "profile" in result
+    ]
+    for run in runs:
+        run["name"] = run["name"] or f"record {run['index'] + 1}"
+    if profile_report:
+        profiling.write_report(profile_report, runs, **metadata)
+        print(f"Run report written to '{profile_report}'.")
+    if metrics_file:
+        profiling.write_prometheus(metrics_file, runs)
+        print(f"Metrics written to '{metrics_file}'.")
 
 
 @app.command()
 def optimize(
     sdf_file_path: str = typer.Option(..., help="Path to the molecule SDF file for geometry optimization"),
     dielectric_constant: float = typer.Option(78.5, help="Dielectric constant for the solvent model (e.g., Water = 78.5)"),
+    dielectric: list[str] = typer.Option(None, help="Solvent names or dielectric constants, repeated or comma-separated; overrides --dielectric-constant, and several run a solvent scan of a single-record SDF (see solvent-scan), which cannot be combined with batch options such as --workers, --frequencies or --results-store"),
     functional: str = "M06-2X",
     basis: str = "def2-svpd",
     charge: int = 0,
-    output_dir: str = typer.Option(None, help="Directory to save the optimized XYZ file")
+    output_dir: str = typer.Option(None, help="Directory to save the optimized XYZ file"),
+    workers: int = typer.Option(1, help="Number of records of a multi-molecule SDF optimized in parallel"),
+    threads: int = typer.Option(None, help="OpenMP/BLAS threads per worker (default: CPU count / workers)"),
+    backend: str = typer.Option("auto", help="Compute backend: cpu (pyscf), gpu (gpu4pyscf) or auto"),
+    max_memory: int = typer.Option(None, help="Memory budget per worker in MB; DF integrals go out of core when they do not fit (default: PySCF's MAX_MEMORY)"),
+    preopt: str = typer.Option("none", help="Cheap pre-optimization before the production DFT: none, ff (MMFF/UFF) or dft"),
+    preopt_basis: str = typer.Option("sto-3g", help="Basis set of the dft pre-optimization stage"),
+    single_point: bool = typer.Option(False, help="Run a final single point at the optimized geometry, warm-started from the last density"),
+    checkpoint: bool = typer.Option(True, help="Save the optimization state to '<xyz name>.chk' after every step"),
+    resume: bool = typer.Option(False, help="Restart from the last checkpoint of an interrupted run"),
+    use_cache: bool = typer.Option(True, "--cache/--no-cache", help="Reuse results of identical earlier runs from the local result cache"),
+    cache_dir: str = typer.Option(None, help="Result cache directory (default: $AUTODFT_CACHE_DIR or ~/.cache/autodft)"),
+    events: str = typer.Option(None, help="Write JSON-lines progress events to '-' (stdout), 'fd:N' or a file path"),
+    profile_report: str = typer.Option(None, help="Instrument the run and write per-stage timings/memory as a JSON report"),
+    metrics_file: str = typer.Option(None, help="Instrument the run and write per-stage metrics as a Prometheus textfile"),
+    dedupe: bool = typer.Option(False, help="Optimize only one representative of each group of near-duplicate records"),
+    dedupe_tolerance: float = typer.Option(None, help="Largest difference (Angstrom) between sorted heavy-atom distances of duplicates (default: 0.1)"),
+    frequencies: bool = typer.Option(False, help="Compute harmonic frequencies and thermochemistry (ZPE, H, G) at the optimized geometry"),
+    hessian: str = typer.Option("auto", help="Hessian of the frequency stage: analytic, fd (finite differences of gradients) or auto"),
+    temperature: float = typer.Option(298.15, help="Temperature (K) of the thermochemistry"),
+    pressure: float = typer.Option(101325.0, help="Pressure (Pa) of the thermochemistry"),
+    freq_workers: int = typer.Option(None, help="Processes computing finite-difference gradients in parallel, sharing the run's threads and memory (default: one per thread; 1 inside a multi-worker batch)"),
+    adaptive_accuracy: bool = typer.Option(False, help="Start with coarse grids and loose SCF tolerances and tighten them as the gradient converges; the final steps use full accuracy"),
+    results_store: str = typer.Option(None, help="Also append every optimized record (coordinates, energies, gradient, trajectory, metadata) to this HDF5 store"),
+    schedule: bool = typer.Option(False, "--schedule/--no-schedule", help="Predict each record's runtime and memory, run the longest first within --node-memory, and report predicted against actual times (default: input order)"),
+    node_memory: int = typer.Option(None, help="Memory in MB the parallel workers may use together (default: the node's physical memory)"),
+    conformer_guess: bool = typer.Option(True, help="Start each record's SCF from the converged density of a finished record with the same atom list"),
 ):
     warnings.filterwarnings("ignore", category=UserWarning, module="scipy.cluster")
 
+    if dielectric:
+        from autodft.solvents import parse_dielectrics, print_scan_table, scan_sdf
+        try:
+            solvents = parse_dielectrics(dielectric)
+        except Exception as e:
+            typer.echo(f"Error in solvent scan: {str(e)}", err=True)
+            return
+        if len(solvents) > 1:
+            # The scan optimizes one molecule in every solvent; refuse batch options rather than ignore them.
+            batch_options = {"--workers": workers != 1, "--single-point": single_point, "--resume": resume,
+                             "--no-cache": not use_cache, "--events": events, "--profile-report": profile_report,
+                             "--metrics-file": metrics_file, "--dedupe": dedupe, "--frequencies": frequencies,
+                             "--adaptive-accuracy": adaptive_accuracy, "--results-store": results_store}
+            unsupported = [name for name, used in batch_options.items() if used]
+            if unsupported:
+                raise typer.BadParameter(f"several values run a solvent scan, which does not support "
+                                         f"{', '.join(unsupported)}", param_hint="--dielectric")
+            if os.path.isfile(sdf_file_path) and sum(1 for _ in iter_sdf_records(sdf_file_path)) > 1:
+                raise typer.BadParameter(f"several values run a solvent scan of a single molecule, but "
+                                         f"'{sdf_file_path}' has more than one record", param_hint="--dielectric")
+            try:
+                rows, csv_path = scan_sdf(sdf_file_path, dielectric, functional, basis, charge, output_dir,
+                                          backend=backend, max_memory=max_memory, preopt=preopt,
+                                          preopt_basis=preopt_basis)
+            except Exception as e:
+                typer.echo(f"Error in solvent scan: {str(e)}", err=True)
+                return
+            print_scan_table(rows)
+            print(f"Results written to '{csv_path}'.")
+            return
+        dielectric_constant = solvents[0][1]
+
     try:
-        atom_list = get_atom_list(sdf_file_path)
-        mol1 = gto.M(
-            atom=atom_list,
-            basis=basis,
-            charge=charge,
-            spin=0,
-            verbose=4,
+        results = optimize_sdf(
+            sdf_file_path, dielectric_constant, functional, basis, charge, output_dir, workers=workers,
+            threads=threads, backend=backend, max_memory=max_memory, preopt=preopt, preopt_basis=preopt_basis,
+            single_point=single_point, checkpoint=checkpoint, resume=resume, use_cache=use_cache,
+            cache_dir=cache_dir, events=events, profile_report=profile_report, metrics_file=metrics_file,
+            dedupe=dedupe, dedupe_tolerance=dedupe_tolerance, frequencies=frequencies, hessian=hessian,
+            temperature=temperature, pressure=pressure, freq_workers=freq_workers,
+            adaptive_accuracy=adaptive_accuracy, results_store=results_store, schedule=schedule,
+            node_memory=node_memory, conformer_guess=conformer_guess,
         )
-        # Determine the XYZ filename
-        base_name = os.path.splitext(os.path.basename(sdf_file_path))[0]
-        xyz_filename = f"{base_name}.xyz"
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-            xyz_filename = os.path.join(output_dir, xyz_filename)
-
-        mol_opt, energy_kjmol = opti_PCM(mol1, functional, dielectric_constant, xyz_filename)
 
-        print(f"Optimized geometry with energy: {energy_kjmol:.2f} kJ/mol")
+        failed = 0
+        for result in results:
+            label = result["name"] or f"record {result['index'] + 1}"
+            if "error" in result:
+                failed += 1
+                typer.echo(f"Error in optimization of {label}: {result['error']}", err=True)
+            else:
+                source = " [cached]" if result.get("cached") else ""
+                if "duplicate_of" in result:
+                    source = f" [duplicate of record {result['duplicate_of'] + 1}]"
+                elif "scf_cycles_saved" in result:
+                    source = f" [conformer guess: {result['scf_cycles_saved']} SCF cycles saved]"
+                print(f"Optimized geometry with energy: {result['energy_kjmol']:.2f} kJ/mol ({label} -> {result['xyz_filename']}){source}")
+                thermo = result.get("thermo")
+                if thermo:
+                    print(f"  G({thermo['temperature']:.2f} K) = {thermo['free_energy']:.8f} Hartree, "
+                          f"H = {thermo['enthalpy']:.8f} Hartree, ZPE = {thermo['zpe']:.8f} Hartree")
+                    if thermo["imaginary_cm"]:
+                        print(f"  Warning: {len(thermo['imaginary_cm'])} imaginary mode(s)")
+        if len(results) > 1:
+            print(f"Batch finished: {len(results) - failed}/{len(results)} records optimized.")
+            saved = [result["scf_cycles_saved"] for result in results
+                     if "scf_cycles_saved" in result and "duplicate_of" not in result]
+            if saved:
+                print(f"Conformer guesses saved {sum(saved)} SCF cycles over {len(saved)} records.")
 
     except Exception as e:
         typer.echo(f"Error in optimization: {str(e)}", err=True)
 
 
+@app.command()
+def ensemble(
+    sdf_file_path: str = typer.Option(..., help="Conformer ensemble SDF (one conformer per record)"),
+    output_dir: str = typer.Option(None, help="Directory for the XYZ files and the ranked ensemble (default: next to the SDF)"),
+    prescreen: str = typer.Option("ff", help="Cheap scoring method: ff (MMFF94/UFF minimization) or dft (small-basis single point)"),
+    prescreen_basis: str = typer.Option("sto-3g", help="Basis set of the dft pre-screen"),
+    rmsd_threshold: float = typer.Option(0.5, help="Conformers closer than this heavy-atom RMSD (Angstrom) are duplicates"),
+    top_k: int = typer.Option(5, help="Optimize at most this many of the lowest pre-screened conformers (0: no limit, every unique conformer within --energy-window)"),
+    energy_window: float = typer.Option(None, help="Only optimize conformers within this many kJ/mol of the lowest pre-screen energy"),
+    temperature: float = typer.Option(298.15, help="Temperature (K) of the Boltzmann weights"),
+    dielectric_constant: float = typer.Option(78.5, help="Dielectric constant for the solvent model (e.g., Water = 78.5)"),
+    functional: str = "M06-2X",
+    basis: str = "def2-svpd",
+    charge: int = 0,
+    workers: int = typer.Option(1, help="Number of conformers processed in parallel"),
+    threads: int = typer.Option(None, help="OpenMP/BLAS threads per worker (default: CPU count / workers)"),
+    backend: str = typer.Option("auto", help="Compute backend: cpu (pyscf), gpu (gpu4pyscf) or auto"),
+    max_memory: int = typer.Option(None, help="Memory limit per worker in MB (default: PySCF's MAX_MEMORY)"),
+    use_cache: bool = typer.Option(True, "--cache/--no-cache", help="Reuse results of identical earlier runs from the local result cache"),
+    cache_dir: str = typer.Option(None, help="Result cache directory (default: $AUTODFT_CACHE_DIR or ~/.cache/autodft)"),
+):
+    """Pre-screens a conformer ensemble, removes duplicates and ranks the best conformers by DFT energy."""
+    from autodft.ensemble import run_ensemble
+    warnings.filterwarnings("ignore", category=UserWarning, module="scipy.cluster")
+
+    try:
+        summary = run_ensemble(
+            sdf_file_path, output_dir, prescreen=prescreen, rmsd_threshold=rmsd_threshold, top_k=top_k,
+            energy_window=energy_window, temperature=temperature, dielectric_constant=dielectric_constant,
+            functional=functional, basis=basis, charge=charge, prescreen_basis=prescreen_basis, workers=workers,
+            threads=threads, backend=backend, max_memory=max_memory, use_cache=use_cache, cache_dir=cache_dir,
+        )
+    except Exception as e:
+        typer.echo(f"Error in ensemble workflow: {str(e)}", err=True)
+        return
+
+    for entry in summary["conformers"]:
+        if entry.get("error"):
+            label = entry["name"] or f"record {entry['index'] + 1}"
+            typer.echo(f"Error in {label}: {entry['error']}", err=True)
+    print(f"{'Rank':<6}{'Conformer':<24}{'Rel. E (kJ/mol)':>16}{'Weight':>9}  XYZ")
+    for entry in summary["ranked"]:
+        label = entry["name"] or f"record {entry['index'] + 1}"
+        print(f"{entry['rank']:<6}{label:<24}{entry['relative_kjmol']:>16.2f}{entry['boltzmann_weight']:>9.3f}  "
+              f"{entry['xyz_filename']}")
+    print(f"Ranked ensemble written to '{summary['ensemble_sdf']}' ('{summary['ensemble_json']}').")
+
+
+@app.command()
+def solvent_scan(
+    sdf_file_path: str = typer.Option(..., help="Path to the molecule SDF file (the first record is used)"),
+    dielectric: list[str] = typer.Option(..., help="Solvent names (water, dmso, acetone, chloroform, vacuum, ...) or dielectric constants; repeat the option or separate with commas"),
+    functional: str = "M06-2X",
+    basis: str = "def2-svpd",
+    charge: int = 0,
+    output_dir: str = typer.Option(None, help="Directory for the XYZ files and the results table (default: next to the SDF)"),
+    backend: str = typer.Option("auto", help="Compute backend: cpu (pyscf), gpu (gpu4pyscf) or auto"),
+    max_memory: int = typer.Option(None, help="Memory limit in MB (default: PySCF's MAX_MEMORY)"),
+    preopt: str = typer.Option("none", help="Cheap pre-optimization before the first solvent: none, ff (MMFF/UFF) or dft"),
+    preopt_basis: str = typer.Option("sto-3g", help="Basis set of the dft pre-optimization stage"),
+):
+    """Optimizes one molecule in several solvents, each warm-started from the closest solvent already done."""
+    from autodft.solvents import print_scan_table, scan_sdf
+    warnings.filterwarnings("ignore", category=UserWarning, module="scipy.cluster")
+
+    try:
+        rows, csv_path = scan_sdf(sdf_file_path, dielectric, functional, basis, charge, output_dir, backend=backend,
+                                  max_memory=max_memory, preopt=preopt, preopt_basis=preopt_basis)
+    except Exception as e:
+        typer.echo(f"Error in solvent scan: {str(e)}", err=True)
+        return
+
+    print_scan_table(rows)
+    print(f"Results written to '{csv_path}'.")
+
+
+@app.command()
+def basis_ladder(
+    sdf_file_path: str = typer.Option(..., help="Path to the molecule SDF file (the first record is used)"),
+    basis: list[str] = typer.Option(["6-31g", "def2-svpd", "cc-pvdz"], help="Basis sets of the ladder (repeat the option); they run smallest first"),
+    dielectric_constant: float = typer.Option(78.5, help="Dielectric constant for the solvent model (e.g., Water = 78.5)"),
+    functional: str = "M06-2X",
+    charge: int = 0,
+    output_dir: str = typer.Option(None, help="Directory for the XYZ files and the results table (default: next to the SDF)"),
+    backend: str = typer.Option("auto", help="Compute backend: cpu (pyscf), gpu (gpu4pyscf) or auto"),
+    max_memory: int = typer.Option(None, help="Memory limit in MB (default: PySCF's MAX_MEMORY)"),
+    cold_reference: bool = typer.Option(False, help="Also optimize every larger basis from the input geometry with a cold guess, for comparison"),
+    preopt: str = typer.Option("none", help="Cheap pre-optimization before the smallest basis: none, ff (MMFF/UFF) or dft"),
+    preopt_basis: str = typer.Option("sto-3g", help="Basis set of the dft pre-optimization stage"),
+):
+    """Optimizes one molecule in several basis sets, each starting from the previous geometry and projected density."""
+    from autodft.ladder import ladder_sdf, print_ladder_table
+    warnings.filterwarnings("ignore", category=UserWarning, module="scipy.cluster")
+
+    try:
+        rows, csv_path = ladder_sdf(sdf_file_path, basis, dielectric_constant, functional, charge, output_dir,
+                                    backend=backend, max_memory=max_memory, cold_reference=cold_reference,
+                                    preopt=preopt, preopt_basis=preopt_basis)
+    except Exception as e:
+        typer.echo(f"Error in basis ladder: {str(e)}", err=True)
+        return
+
+    print_ladder_table(rows)
+    print(f"Results written to '{csv_path}'.")
+
+
+@app.command()
+def export(
+    store: str = typer.Option(..., help="HDF5 results store written by 'optimize --results-store'"),
+    output: str = typer.Option(..., help="Output file; the format follows the extension (.xyz or .sdf)"),
+    ids: list[str] = typer.Option(None, "--id", help="Molecule IDs to export (repeat the option; default: all)"),
+):
+    """Exports the latest run of molecules in a results store as multi-frame XYZ or SDF."""
+    from autodft.store import ResultStore, export_sdf, export_xyz
+
+    extension = os.path.splitext(output)[1].lower()
+    if extension not in (".xyz", ".sdf"):
+        typer.echo(f"Error: unsupported output format '{extension}', expected .xyz or .sdf", err=True)
+        return
+    try:
+        with ResultStore(store, mode="r") as results:
+            records = [results.get(mol_id) for mol_id in ids] if ids else list(results)
+            (export_xyz if extension == ".xyz" else export_sdf)(records, output)
+    except (OSError, KeyError, ValueError) as e:
+        typer.echo(f"Error in export: {str(e)}", err=True)
+        return
+    print(f"{len(records)} molecules written to '{output}'.")
+
+
+@app.command()
+def queue_init(
+    sdf_file_path: str = typer.Option(..., help="SDF file whose records become the jobs of the queue"),
+    queue_dir: str = typer.Option(..., help="Queue directory on a filesystem shared by all worker nodes"),
+    dielectric_constant: float = typer.Option(78.5, help="Dielectric constant for the solvent model"),
+    functional: str = "M06-2X",
+    basis: str = "def2-svpd",
+    charge: int = 0,
+    backend: str = typer.Option("auto", help="Compute backend: cpu, gpu or auto (resolved on each worker node)"),
+    max_memory: int = typer.Option(None, help="Memory budget per worker in MB"),
+    preopt: str = typer.Option("none", help="Cheap pre-optimization before the production DFT: none, ff (MMFF/UFF) or dft"),
+    preopt_basis: str = typer.Option("sto-3g", help="Basis set of the dft pre-optimization stage"),
+    single_point: bool = typer.Option(False, help="Run a final single point at the optimized geometry"),
+    adaptive_accuracy: bool = typer.Option(False, help="Start with coarse grids and loose SCF tolerances and tighten them as the gradient converges"),
+    conformer_guess: bool = typer.Option(True, help="Start each job's SCF from the converged density of a finished job with the same atom list"),
+):
+    """Creates a shared-filesystem work queue with one job per SDF record for 'run_opt queue-work' workers."""
+    from autodft import workqueue
+
+    try:
+        count = workqueue.init_queue(queue_dir, sdf_file_path, functional=functional, basis=basis, charge=charge,
+                                     eps=dielectric_constant, backend=backend, max_memory=max_memory, preopt=preopt,
+                                     preopt_basis=preopt_basis, single_point=single_point, adaptive=adaptive_accuracy,
+                                     conformer_guess=conformer_guess)
+    except Exception as e:
+        typer.echo(f"Error in queue creation: {str(e)}", err=True)
+        return
+    print(f"Queued {count} jobs in '{queue_dir}'.")
+
+
+@app.command()
+def queue_work(
+    queue_dir: str = typer.Option(..., help="Queue directory created by 'run_opt queue-init'"),
+    worker_id: str = typer.Option(None, help="Name of this worker in leases and results (default: <host>-<pid>)"),
+    lease_seconds: float = typer.Option(300.0, help="Seconds without a heartbeat after which a job's lease is taken over"),
+    heartbeat: float = typer.Option(30.0, help="Seconds between renewals of the lease of the running job"),
+    poll_interval: float = typer.Option(10.0, help="Seconds between checks while every remaining job is leased"),
+    max_jobs: int = typer.Option(None, help="Stop after this many jobs (default: when every job has a result)"),
+    threads: int = typer.Option(None, help="OpenMP/BLAS threads (default: CPU count)"),
+    use_cache: bool = typer.Option(True, "--cache/--no-cache", help="Reuse results of identical earlier runs from this node's result cache"),
+    cache_dir: str = typer.Option(None, help="Result cache directory (default: $AUTODFT_CACHE_DIR or ~/.cache/autodft)"),
+):
+    """Runs jobs of a work queue until every job has a result, taking over the jobs of dead workers."""
+    from autodft import workqueue
+    warnings.filterwarnings("ignore", category=UserWarning, module="scipy.cluster")
+
+    try:
+        workqueue.work(queue_dir, worker_id=worker_id, lease_seconds=lease_seconds, heartbeat=heartbeat,
+                       poll_interval=poll_interval, max_jobs=max_jobs, threads=threads, use_cache=use_cache,
+                       cache_dir=cache_dir)
+    except (OSError, ValueError) as e:
+        typer.echo(f"Error in queue worker: {str(e)}", err=True)
+
+
+@app.command()
+def queue_status(
+    queue_dir: str = typer.Option(..., help="Queue directory created by 'run_opt queue-init'"),
+    lease_seconds: float = typer.Option(300.0, help="Lease length the workers use, to tell running from expired jobs"),
+    results_store: str = typer.Option(None, help="Once every job is done, append the results to this HDF5 store"),
+):
+    """Prints the state of every job of a work queue and writes '<queue-dir>/status.csv'."""
+    from autodft import workqueue
+
+    try:
+        rows = workqueue.queue_status(queue_dir, lease_seconds)
+    except OSError as e:
+        typer.echo(f"Error in queue status: {str(e)}", err=True)
+        return
+    print(f"{'Job':>5}  {'Name':<20}{'State':<9}{'Worker':<24}{'Attempt':>8}{'Energy (Hartree)':>19}")
+    for row in rows:
+        energy = "-" if row.get("energy_hartree") is None else f"{row['energy_hartree']:.8f}"
+        print(f"{row['job']:>5}  {(row['name'] or '-')[:19]:<20}{row['state']:<9}{(row.get('worker') or '-')[:23]:<24}"
+              f"{row.get('attempt') or '-':>8}{energy:>19}")
+    counts = {state: sum(row["state"] == state for row in rows)
+              for state in ("pending", "running", "expired", "done", "failed")}
+    print(", ".join(f"{count} {state}" for state, count in counts.items() if count))
+    write_csv(os.path.join(queue_dir, "status.csv"), rows, workqueue.STATUS_FIELDS)
+    if results_store:
+        if counts["done"] + counts["failed"] < len(rows):
+            typer.echo("Error: the queue still has unfinished jobs; not writing the results store", err=True)
+            return
+        jobs, results = workqueue.collect(queue_dir)
+        store_results(results_store, jobs, results, sdf_file=workqueue.read_queue(queue_dir)["sdf_file"])
+
+
+@app.command()
+def serve(
+    spool_dir: str = typer.Option(..., help="Spool directory to take jobs from (jobs are queued in <spool-dir>/incoming)"),
+    poll_interval: float = typer.Option(1.0, help="Seconds between checks for new jobs"),
+    backend: str = typer.Option("auto", help="Backend whose modules are imported up front"),
+):
+    """Runs a long-lived worker that keeps PySCF loaded and processes queued optimization jobs."""
+    from autodft import service
+    service.serve(spool_dir, poll_interval=poll_interval, backend=backend)
+
+
+@app.command()
+def submit(
+    sdf_file_path: str = typer.Option(..., help="SDF file to optimize"),
+    spool_dir: str = typer.Option(..., help="Spool directory served by 'run_opt serve'"),
+    dielectric_constant: float = typer.Option(78.5, help="Dielectric constant for the solvent model"),
+    functional: str = "M06-2X",
+    basis: str = "def2-svpd",
+    charge: int = 0,
+):
+    """Queues an optimization job for a 'run_opt serve' worker and prints its job ID."""
+    from autodft import service
+    options = {"dielectric_constant": dielectric_constant, "functional": functional, "basis": basis, "charge": charge}
+    print(service.submit(spool_dir, sdf_file_path, options))
+
+
+@app.command()
+def status(
+    job_id: str = typer.Argument(..., help="Job ID printed by 'run_opt submit'"),
+    spool_dir: str = typer.Option(..., help="Spool directory served by 'run_opt serve'"),
+):
+    """Prints the status of a queued job as JSON."""
+    import json
+    from autodft import service
+    print(json.dumps(service.read_status(spool_dir, job_id), indent=2))
+
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
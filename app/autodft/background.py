@@ -0,0 +1,189 @@
+"""Background optimizations for the web app.
+
+A JobPool runs submitted SDF files in spawned worker processes, at most
+`workers` at a time, so the Streamlit script thread never waits on a DFT run.
+Every job is a job directory of a spool (see autodft.service), with the same
+status.json, log.txt and events.jsonl as a `run_opt serve` job. Nothing runs
+in the background of the caller: poll() reaps finished processes, starts
+queued jobs on free slots and reads each job's new progress events, so the
+app calls it on every rerun.
+
+Each running job has its own process, so cancelling it terminates only that
+job; cancelling a queued job just withdraws it.
+
+A pool without a spool_dir makes a temporary spool of its own and removes it
+again: a forgotten job's directory at once, the rest with close(), or when
+the pool is garbage collected (e.g. with the Streamlit session that held it)
+or the interpreter exits.
+"""
+import os
+import time
+import shutil
+import weakref
+import tempfile
+import multiprocessing
+
+from autodft import service
+from autodft.batch import _init_worker, thread_budget, thread_env
+from autodft.events import read_events
+
+# States of a job in JobPool.jobs (the same as in its status.json).
+ACTIVE_STATES = ("queued", "running")
+FINAL_STATES = ("done", "failed", "cancelled")
+# Seconds a terminated worker gets to exit before it is killed.
+CANCEL_TIMEOUT = 5.0
+
+
+def run_claimed_job(spool_dir, spec, backend, threads):
+    """Worker process entry point: runs one claimed job (see autodft.service.run_job)."""
+    _init_worker(threads)
+    service.run_job(spool_dir, spec, backend)
+
+
+def update_progress(progress, events):
+    """Folds progress events (see autodft.events) into the progress summary dict of a job."""
+    for event in events:
+        kind = event["event"]
+        if "stage" in event:
+            progress["stage"] = event["stage"]
+        if kind == "scf_cycle":
+            progress["scf_cycles"] = progress.get("scf_cycles", 0) + 1
+            progress["energy"] = event["energy"]
+        elif kind == "geometry_step":
+            progress.update(step=event["step"], energy=event["energy"], grad_max=event["grad_max"])
+        elif kind == "result":
+            progress.update(energy=event["energy_hartree"], energy_kjmol=event["energy_kjmol"])
+        elif kind == "error":
+            progress["error"] = event["error"]
+        progress["elapsed"] = event["elapsed"]
+    return progress
+
+
+def _stop(process):
+    process.terminate()
+    process.join(CANCEL_TIMEOUT)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+def _remove_spool(spool_dir, processes):
+    # A finalizer: it must not refer to the pool, only to what the pool owns.
+    for process in list(processes.values()):
+        _stop(process)
+    shutil.rmtree(spool_dir, ignore_errors=True)
+
+
+class JobPool:
+    """Optimizations of one interactive session, keyed by job ID.
+
+    jobs maps every submitted job ID to a dict with its name, input file, state,
+    progress summary (stage, geometry step, energy, largest gradient, SCF
+    cycles) and, once finished, its status.json contents.
+    """
+
+    def __init__(self, spool_dir=None, workers=1, backend="auto", threads=None):
+        self.owns_spool = spool_dir is None
+        self.spool_dir = spool_dir or tempfile.mkdtemp(prefix="autodft_jobs_")
+        self.workers = workers
+        self.backend = backend
+        self.threads = threads
+        self.jobs = {}
+        self._processes = {}
+        self._offsets = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._finalizer = (weakref.finalize(self, _remove_spool, self.spool_dir, self._processes)
+                           if self.owns_spool else None)
+
+    def submit(self, sdf_file_path, options=None, name=None):
+        """Queues an SDF file for optimize_sdf with options; returns the job ID."""
+        job_id = service.submit(self.spool_dir, sdf_file_path, options)
+        sdf_file = os.path.basename(sdf_file_path)
+        self.jobs[job_id] = {"job_id": job_id, "name": name or sdf_file, "sdf_file": sdf_file, "state": "queued",
+                             "submitted": time.time(), "progress": {}, "status": None}
+        self.poll()
+        return job_id
+
+    def directory(self, job_id):
+        return service.job_dir(self.spool_dir, job_id)
+
+    def active(self):
+        return [job_id for job_id, job in self.jobs.items() if job["state"] in ACTIVE_STATES]
+
+    def poll(self):
+        """Reaps finished workers, reads new progress and starts queued jobs on free slots; returns jobs."""
+        for job_id in self.active():
+            self._update(job_id)
+        running = sum(job["state"] == "running" for job in self.jobs.values())
+        for job_id in self.active():
+            if running >= self.workers:
+                break
+            if self.jobs[job_id]["state"] == "queued" and self._start(job_id):
+                running += 1
+        return self.jobs
+
+    def _start(self, job_id):
+        spec = service.claim(self.spool_dir, job_id)
+        if spec is None:
+            return False
+        threads = thread_budget(self.workers, self.threads)
+        process = self._context.Process(target=run_claimed_job, args=(self.spool_dir, spec, self.backend, threads),
+                                        daemon=True)
+        # CUDA and OpenMP runtimes do not survive fork(), so workers are spawned (see autodft.batch).
+        with thread_env(threads):
+            process.start()
+        self._processes[job_id] = process
+        self.jobs[job_id].update(state="running", started=time.time())
+        return True
+
+    def _update(self, job_id):
+        job = self.jobs[job_id]
+        events, self._offsets[job_id] = read_events(os.path.join(self.directory(job_id), "events.jsonl"),
+                                                    self._offsets.get(job_id, 0))
+        update_progress(job["progress"], events)
+        process = self._processes.get(job_id)
+        if process is None or process.is_alive():
+            return
+        process.join()
+        del self._processes[job_id]
+        status = service.read_status(self.spool_dir, job_id)
+        if status["state"] not in FINAL_STATES:
+            # The worker died before recording an outcome (e.g. killed by the OOM killer).
+            status = service.write_status(self.spool_dir, job_id, state="failed",
+                                          error=f"worker exited with code {process.exitcode}")
+        job.update(state=status["state"], status=status, finished=time.time())
+
+    def cancel(self, job_id):
+        """Withdraws a queued job or terminates a running one; returns whether the job was still active."""
+        job = self.jobs[job_id]
+        if job["state"] not in ACTIVE_STATES:
+            return False
+        process = self._processes.pop(job_id, None)
+        if process is not None:
+            _stop(process)
+        elif service.claim(self.spool_dir, job_id) is None:
+            # Claimed by some other worker sharing the spool; it is no longer ours to stop.
+            return False
+        status = service.write_status(self.spool_dir, job_id, state="cancelled")
+        job.update(state="cancelled", status=status, finished=time.time())
+        return True
+
+    def forget(self, job_id):
+        """Drops a finished job from jobs; its directory is removed too when the spool is the pool's own."""
+        if self.jobs[job_id]["state"] in ACTIVE_STATES:
+            raise ValueError(f"Job {job_id} is still {self.jobs[job_id]['state']}")
+        del self.jobs[job_id]
+        self._offsets.pop(job_id, None)
+        if self.owns_spool:
+            shutil.rmtree(self.directory(job_id), ignore_errors=True)
+
+    def shutdown(self):
+        """Cancels every active job."""
+        for job_id in self.active():
+            self.cancel(job_id)
+
+    def close(self):
+        """Cancels every active job and removes the pool's own spool directory (a given spool_dir is kept)."""
+        self.shutdown()
+        if self._finalizer is not None:
+            self._finalizer()
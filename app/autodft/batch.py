@@ -0,0 +1,177 @@
+import os
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def thread_budget(workers, threads=None):
+    """Returns the number of OpenMP/BLAS threads each worker may use."""
+    if threads:
+        return threads
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+@contextmanager
+def thread_env(threads):
+    """Temporarily sets the OpenMP/BLAS thread variables inherited by spawned workers."""
+    saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _init_worker(threads):
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    from pyscf import lib
+    lib.num_threads(threads)
+
+
+@contextmanager
+def worker_threads(threads):
+    """Runs this process as a worker with threads threads, restoring its thread settings afterwards."""
+    from pyscf import lib
+
+    saved = lib.num_threads()
+    with thread_env(threads):
+        lib.num_threads(threads)
+        try:
+            yield
+        finally:
+            lib.num_threads(saved)
+
+
+def pick_next(pending, memory_mb, used_mb, memory_budget_mb=None, idle=False):
+    """The first job of pending whose memory fits next to the running jobs, or None.
+
+    When nothing is running (idle), the first pending job is started even if
+    it alone exceeds the budget, so an oversized job cannot stall the batch.
+    """
+    for i in pending:
+        if memory_budget_mb is None or used_mb + memory_mb[i] <= memory_budget_mb:
+            return i
+    return pending[0] if idle and pending else None
+
+
+def run_batch(jobs, run_job, workers=1, threads=None, costs=None, memory_mb=None, memory_budget_mb=None):
+    """Runs run_job over every job, in-process or on a pool of spawned workers.
+
+    run_job must be a picklable module-level function that never raises; it is
+    expected to catch its own errors and report them in the returned dict so one
+    bad record does not stop the rest of the batch. Results are returned in job
+    order.
+
+    With costs, jobs are started longest first (LPT), which keeps one long
+    job from running alone at the end. With memory_mb (per job) and
+    memory_budget_mb, a job only starts when it fits next to the running
+    ones; a free worker takes the longest job that fits.
+
+    A worker process that dies (e.g. killed by the OOM killer) breaks the
+    pool and every job running on it. The pool is then replaced and only the
+    job that died gets an error record: when several jobs were running, each
+    is rerun alone first, since any of them may have been the one.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    threads = thread_budget(workers, threads)
+    order = list(range(len(jobs)))
+    if costs is not None:
+        order.sort(key=lambda i: costs[i], reverse=True)
+
+    if workers <= 1 or len(jobs) <= 1:
+        results = [None] * len(jobs)
+        with worker_threads(threads):
+            for i in order:
+                results[i] = run_job(jobs[i])
+        return results
+
+    results = [None] * len(jobs)
+    memory_mb = memory_mb or [0.0] * len(jobs)
+    pending = list(order)
+    running = {}
+    # Jobs that were running when a worker died; they are retried one at a time.
+    suspects = set()
+    used = 0.0
+    with thread_env(threads):
+        pool = _new_pool(workers, threads)
+        try:
+            while pending or running:
+                isolated = any(i in suspects for i in running.values())
+                while pending and len(running) < workers and not isolated:
+                    i = pick_next(pending, memory_mb, used, memory_budget_mb, idle=not running)
+                    if i is None or (i in suspects and running):
+                        break
+                    try:
+                        future = pool.submit(run_job, jobs[i])
+                    except BrokenProcessPool:
+                        # The running futures report the break below.
+                        break
+                    pending.remove(i)
+                    running[future] = i
+                    used += memory_mb[i]
+                    isolated = i in suspects
+                if not running:
+                    # The pool broke with nothing of ours running.
+                    pool.shutdown(wait=True)
+                    pool = _new_pool(workers, threads)
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = []
+                for future in done:
+                    i = running.pop(future)
+                    used -= memory_mb[i]
+                    try:
+                        results[i] = future.result()
+                    except BrokenProcessPool:
+                        broken.append(i)
+                    except Exception as e:
+                        results[i] = {"error": f"worker failed: {e}"}
+                if not broken:
+                    continue
+                # A worker died (e.g. killed by the OOM killer) and took the pool down with the
+                # jobs running on it. Collect them and carry on with a fresh pool.
+                wait(running)
+                for future, i in running.items():
+                    try:
+                        results[i] = future.result()
+                    except BrokenProcessPool:
+                        broken.append(i)
+                    except Exception as e:
+                        results[i] = {"error": f"worker failed: {e}"}
+                running = {}
+                used = 0.0
+                pool.shutdown(wait=True)
+                pool = _new_pool(workers, threads)
+                if len(broken) == 1:
+                    # It ran alone (or outlived every other job), so it is the one that died.
+                    results[broken[0]] = {"error": "worker process died while running this record "
+                                                   "(out of memory?)"}
+                else:
+                    # Any of them may have killed the worker; rerun each alone to find out.
+                    suspects.update(broken)
+                    pending = sorted(broken, key=order.index) + pending
+        finally:
+            pool.shutdown(wait=True)
+    return results
+
+
+def _new_pool(workers, threads):
+    # CUDA and OpenMP runtimes do not survive fork(), so workers are always spawned.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(threads,))
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import hashlib
+
+CACHE_VERSION = 1
+COORD_DECIMALS = 4
+DEFAULT_MAX_SIZE_MB = 200
+DEFAULT_MAX_AGE_DAYS = 90
+
+
+def default_cache_dir():
+    return os.environ.get("AUTODFT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "autodft")
+
+
+def cache_key(atom_list, **params):
+    """Returns a hex digest identifying a geometry + method combination.
+
+    Coordinates are rounded to COORD_DECIMALS Angstrom so the same structure
+    written by different tools hashes the same; params (functional, basis,
+    charge, solvent, grid settings, ...) must be JSON-serializable.
+    """
+    atoms = [[symbol, [round(float(c), COORD_DECIMALS) + 0.0 for c in coords]] for symbol, coords in atom_list]
+    payload = {"version": CACHE_VERSION, "atoms": atoms, "params": params}
+    text = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=list)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _entry_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+
+def lookup(cache_dir, key):
+    """Returns the cached entry for key, or None. A hit refreshes the entry's age."""
+    path = _entry_path(cache_dir, key)
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    os.utime(path)
+    return entry
+
+
+def store(cache_dir, key, entry):
+    """Writes entry under key; the rename makes concurrent writers safe."""
+    path = _entry_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(dict(entry, created=time.time()), f)
+    os.replace(tmp_path, path)
+
+
+def evict(cache_dir, max_size_mb=DEFAULT_MAX_SIZE_MB, max_age_days=DEFAULT_MAX_AGE_DAYS):
+    """Drops entries unused for max_age_days, then the least recently used ones until under max_size_mb.
+
+    Returns the number of entries removed.
+    """
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+    removed = 0
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries):
+        if mtime >= cutoff and total <= max_size_mb * 1024 * 1024:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
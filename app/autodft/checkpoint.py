@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+
+import numpy as np
+from pyscf import lib
+from pyscf.scf import chkfile as scf_chkfile
+
+
+def checkpoint_path(xyz_filename):
+    return os.path.splitext(xyz_filename)[0] + ".chk"
+
+
+def _find_optimizer():
+    """Returns the running geomeTRIC Optimizer by walking up the call stack, or None.
+
+    PySCF's geomeTRIC interface only hands the callback the engine's locals;
+    the optimizer that owns the approximate Hessian is a few frames up.
+    """
+    from geometric.optimize import Optimizer
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        candidate = frame.f_locals.get("self")
+        if isinstance(candidate, Optimizer):
+            return candidate
+        frame = frame.f_back
+    return None
+
+
+def _cartesian_hessian(optimizer):
+    if optimizer is None or getattr(optimizer, "H", None) is None:
+        return None
+    try:
+        return np.asarray(optimizer.IC.calcHessCart(optimizer.X, optimizer.G, optimizer.H))
+    except Exception:
+        return None
+
+
+class Checkpointer:
+    """geomeTRIC callback that saves the optimization state after every step.
+
+    The file is a PySCF chkfile: the SCF object writes its orbitals to the
+    'scf' group itself (mf.chkfile is pointed at the same file), and this
+    callback adds the current geometry under 'mol' and the optimizer state
+    (Cartesian Hessian and step history) under 'autodft'.
+    """
+
+    def __init__(self, path, recorder, every=1):
+        self.path = path
+        self.recorder = recorder
+        self.every = max(1, every)
+
+    def __call__(self, envs):
+        if len(self.recorder.history) % self.every:
+            return
+        state = {"history": json.dumps(self.recorder.history)}
+        hessian = _cartesian_hessian(_find_optimizer())
+        if hessian is not None:
+            state["hessian"] = hessian
+        # The scanner has already dumped this step's orbitals; rewrite the
+        # geometry so the orbitals and coordinates in the file match.
+        lib.chkfile.save_mol(envs["mol"], self.path)
+        lib.chkfile.save(self.path, "autodft", state)
+
+
+def load_checkpoint(path):
+    """Reads a checkpoint written by Checkpointer; returns None when there is none.
+
+    The returned dict holds the 'mol' at the last completed step, the 'scf'
+    orbitals (mo_coeff, mo_occ, ...) whose density restarts the SCF, the
+    Cartesian 'hessian' (None before the optimizer built one) and the step
+    'history'.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    data = lib.chkfile.load(path, "autodft")
+    if not data:
+        return None
+    history = data["history"]
+    if isinstance(history, bytes):
+        history = history.decode()
+    return {
+        "mol": lib.chkfile.load_mol(path),
+        "scf": scf_chkfile.load(path, "scf"),
+        "hessian": data.get("hessian"),
+        "history": json.loads(history),
+    }
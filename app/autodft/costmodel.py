@@ -0,0 +1,199 @@
+"""Runtime predictions for scheduling batch jobs.
+
+Before anything runs, each job's cost is estimated from its molecule as
+gto.M builds it, counted in work units of about 1e9 floating-point
+operations:
+
+    SCF cycle      DF Coulomb 2 naux nao^2, plus 2 nocc naux nao^2 of exchange
+                   for hybrids, plus XC_FACTOR grid_points nao^2 for the XC
+                   quadrature
+    geometry step  CYCLES_PER_STEP such cycles and the gradient, plus nsurf^3
+                   for the PCM solve, plus STEP_OVERHEAD for the fixed cost of
+                   a step (grid setup, optimizer, Python)
+    optimization   BASE_STEPS + STEPS_PER_ATOM * natm steps
+
+A unit costs about seconds_per_unit CPU-seconds. That figure is the median
+over this machine's earlier runs, which are logged to timings.jsonl in the
+result cache directory after every batch. Only the production optimization
+is modelled and logged: pre-optimization, single-point and frequency stages
+are left out of the timings, and adaptive-accuracy runs are not logged. Before the first run it is
+DEFAULT_SECONDS_PER_UNIT. Jobs are then dispatched longest first (LPT) within
+a node memory budget (see autodft.batch.run_batch). After the batch the
+predicted and actual times are reported and logged.
+"""
+import os
+import json
+import time
+import statistics
+
+from autodft.batch import pick_next
+
+XC_FACTOR = 4
+CYCLES_PER_STEP = 5
+# The nuclear gradient costs about three SCF cycles.
+GRADIENT_CYCLES = 3
+# Measured on molecules of 2-5 atoms, where the fixed cost dominates.
+STEP_OVERHEAD = 1.0
+BASE_STEPS = 4
+STEPS_PER_ATOM = 0.5
+# CPU-seconds per work unit (measured: ethanol, 6-31G, PBE, 1 thread) and a guess for gpu4pyscf.
+DEFAULT_SECONDS_PER_UNIT = {"cpu": 0.7, "gpu": 0.03}
+TIMINGS_FILE = "timings.jsonl"
+# Most recent runs the calibration uses.
+CALIBRATION_RUNS = 200
+# Resident memory of a worker process before it builds any arrays.
+WORKER_BASELINE_MB = 300
+
+
+def job_features(job, settings):
+    """Size of a job's calculation: natm, nao, naux, grid and surface points, and its memory estimate (MB)."""
+    from pyscf import gto
+    from pyscf.dft import libxc
+    from autodft.memory import estimate_memory
+
+    mol = gto.M(atom=job["atom_list"], basis=job["basis"], charge=job["charge"], spin=0, verbose=0)
+    estimate = estimate_memory(mol, settings, job["functional"])
+    features = {key: estimate[key] for key in ("nao", "naux", "grid_points", "surface_points")}
+    features.update(natm=mol.natm, nocc=mol.nelectron // 2, hybrid=bool(libxc.is_hybrid_xc(job["functional"])))
+    memory = estimate["total"]
+    if job.get("max_memory"):
+        # The DF tensor goes out of core rather than past the budget (see autodft.memory).
+        memory = min(memory, job["max_memory"])
+    features["memory_mb"] = memory + WORKER_BASELINE_MB
+    return features
+
+
+def work_units(features):
+    nao, naux = features["nao"], features["naux"]
+    cycle = 2 * naux * nao ** 2 + XC_FACTOR * features["grid_points"] * nao ** 2
+    if features["hybrid"]:
+        cycle += 2 * features["nocc"] * naux * nao ** 2
+    step = ((CYCLES_PER_STEP + GRADIENT_CYCLES) * cycle + features["surface_points"] ** 3) / 1e9 + STEP_OVERHEAD
+    return (BASE_STEPS + STEPS_PER_ATOM * features["natm"]) * step
+
+
+def timings_path(cache_dir):
+    return os.path.join(cache_dir, TIMINGS_FILE)
+
+
+def seconds_per_unit(cache_dir, backend):
+    """CPU-seconds per work unit: the median over the last CALIBRATION_RUNS runs on backend, or the default."""
+    ratios = []
+    try:
+        with open(timings_path(cache_dir)) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry.get("stage") == "production" and entry["backend"] == backend and entry["units"] > 0:
+                    ratios.append(entry["actual"] * entry["threads"] / entry["units"])
+    except (OSError, ValueError, KeyError):
+        pass
+    if not ratios:
+        return DEFAULT_SECONDS_PER_UNIT[backend], 0
+    ratios = ratios[-CALIBRATION_RUNS:]
+    return statistics.median(ratios), len(ratios)
+
+
+def effective_threads(backend, workers, threads):
+    """Cores each worker actually gets: threads, less when workers x threads exceeds the CPU count."""
+    if backend == "gpu":
+        # gpu4pyscf's speed does not depend on the host threads.
+        return 1
+    return threads * min(1.0, (os.cpu_count() or 1) / (workers * threads))
+
+
+def predict(jobs, backend, workers, threads, settings, cache_dir):
+    """Adds 'features', 'units' and 'predicted' (seconds for one of workers workers) to every job; returns the jobs.
+
+    Conformers of one molecule share everything but the coordinates, so the
+    features are computed once per element list, basis, charge and functional.
+    """
+    rate, runs = seconds_per_unit(cache_dir, backend)
+    threads = effective_threads(backend, workers, threads)
+    seen = {}
+    for job in jobs:
+        if job["atom_list"] is None:
+            # Unparsable records fail at once.
+            job.update(features=None, units=0.0, predicted=0.0)
+            continue
+        key = (tuple(symbol for symbol, _ in job["atom_list"]), job["basis"].lower(), job["charge"],
+               job["functional"].upper(), job.get("max_memory"))
+        if key not in seen:
+            seen[key] = job_features(job, settings)
+        job["features"] = seen[key]
+        job["units"] = work_units(job["features"])
+        job["predicted"] = job["units"] * rate / threads
+    source = f"calibrated on {runs} earlier runs" if runs else "default, no earlier runs yet"
+    print(f"Cost model: {rate:.3g} CPU-s per work unit on {backend} ({source})")
+    return jobs
+
+
+def job_memory_mb(job):
+    return job["features"]["memory_mb"] if job["features"] else 0.0
+
+
+def simulate_makespan(costs, memory_mb, workers, memory_budget_mb=None):
+    """Wall time of running jobs with the given costs under the dispatch rule of autodft.batch.run_batch."""
+    pending = sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+    running = []  # (finish time, job)
+    now = 0.0
+    used = 0.0
+    while pending or running:
+        while pending and len(running) < workers:
+            i = pick_next(pending, memory_mb, used, memory_budget_mb, idle=not running)
+            if i is None:
+                break
+            pending.remove(i)
+            running.append((now + costs[i], i))
+            used += memory_mb[i]
+        running.sort()
+        now, i = running.pop(0)
+        used -= memory_mb[i]
+    return now
+
+
+def node_memory_mb():
+    """Physical memory of this node in MB."""
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1e6
+
+
+def print_schedule(jobs, workers, memory_budget_mb):
+    order = sorted(jobs, key=lambda job: job["predicted"], reverse=True)
+    makespan = simulate_makespan([job["predicted"] for job in jobs], [job_memory_mb(job) for job in jobs],
+                                 workers, memory_budget_mb)
+    budget = "" if memory_budget_mb is None else f", memory budget {memory_budget_mb:.0f} MB"
+    print(f"Schedule: {len(jobs)} jobs, longest first, on {workers} workers{budget}; "
+          f"predicted wall time {makespan:.0f} s")
+    for job in order:
+        features = job["features"]
+        if features is None:
+            continue
+        print(f"  {job['name'] or 'record ' + str(job['index'] + 1):<24}{features['nao']:>6} AOs "
+              f"{features['natm']:>4} atoms {features['memory_mb']:>8.0f} MB {job['predicted']:>9.0f} s")
+    return makespan
+
+
+def report(jobs, results, makespan, wall_time, backend, workers, threads, cache_dir):
+    """Prints predicted against actual optimization times of the computed jobs and logs them for the calibration.
+
+    The actual time is that of the production optimization ('opt_time'),
+    which is what the model predicts.
+    """
+    threads = effective_threads(backend, workers, threads)
+    rows = [(job, result) for job, result in zip(jobs, results) if "error" not in result and result.get("opt_time")]
+    print(f"{'Record':<24}{'Predicted (s)':>15}{'Actual (s)':>12}{'Ratio':>8}")
+    for job, result in rows:
+        print(f"{job['name'] or 'record ' + str(job['index'] + 1):<24}{job['predicted']:>15.1f}"
+              f"{result['opt_time']:>12.1f}{result['opt_time'] / job['predicted']:>8.2f}")
+    print(f"Wall time: predicted {makespan:.0f} s, actual {wall_time:.0f} s")
+    # Adaptive runs change grids and tolerances along the way; the model is for fixed settings.
+    rows = [(job, result) for job, result in rows if not job.get("adaptive")]
+    if not rows:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(timings_path(cache_dir), "a") as f:
+        for job, result in rows:
+            f.write(json.dumps({"created": time.time(), "stage": "production", "backend": backend,
+                                "threads": threads, "functional": job["functional"], "basis": job["basis"],
+                                "units": job["units"], "predicted": job["predicted"], "actual": result["opt_time"],
+                                **{key: job["features"][key] for key in ("natm", "nao", "naux", "grid_points")}})
+                    + "\n")
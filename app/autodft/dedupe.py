@@ -0,0 +1,99 @@
+"""Near-duplicate detection for conformer sets without all-pairs RMSD.
+
+Conformers are first grouped by a topology key (canonical isomeric SMILES
+with stereo perceived from 3D), so only conformers of the same molecule are
+compared and atom order in the input does not matter. Within a group every
+conformer gets an alignment- and permutation-invariant fingerprint: its
+sorted heavy-atom distances. Two conformers are duplicates when their
+fingerprints differ by at most `tolerance` Angstrom in every entry.
+
+Candidate pairs come from a KD-tree (Chebyshev metric) over a fixed number
+of evenly spaced samples of each fingerprint. Sampling never increases the
+max-norm distance, so the tree returns every true duplicate pair; each
+candidate is then checked against the full fingerprint.
+"""
+import numpy as np
+
+DEFAULT_TOLERANCE = 0.1  # Angstrom
+INDEX_SAMPLES = 16
+
+
+def topology_key(mol):
+    """Canonical isomeric SMILES of the heavy-atom graph, with stereo taken from the 3D coordinates."""
+    from rdkit import Chem
+
+    mol = Chem.Mol(mol)
+    Chem.AssignStereochemistryFrom3D(mol)
+    return Chem.MolToSmiles(Chem.RemoveHs(mol))
+
+
+def distance_fingerprint(mol, heavy_atoms_only=True):
+    """Sorted interatomic distances (Angstrom) of mol's heavy atoms.
+
+    All atoms are used when heavy_atoms_only is unset or the molecule has
+    fewer than two heavy atoms (e.g. water).
+    """
+    positions = mol.GetConformer().GetPositions()
+    heavy = [atom.GetAtomicNum() > 1 for atom in mol.GetAtoms()]
+    if heavy_atoms_only and sum(heavy) >= 2:
+        positions = positions[heavy]
+    i, j = np.triu_indices(len(positions), k=1)
+    return np.sort(np.linalg.norm(positions[i] - positions[j], axis=1))
+
+
+def atom_order(mol, reference):
+    """Order of reference's atoms in mol's numbering: mol atom k is reference atom order[k].
+
+    Duplicates are found regardless of atom order, so a duplicate's input can
+    number its atoms differently from its representative. Returns None when
+    the two are not the same bonded structure.
+    """
+    match = mol.GetSubstructMatch(reference)
+    if len(match) != reference.GetNumAtoms() or mol.GetNumAtoms() != reference.GetNumAtoms():
+        return None
+    return [int(k) for k in np.argsort(match)]
+
+
+def _candidate_pairs(fingerprints, tolerance):
+    from scipy.spatial import cKDTree
+
+    length = fingerprints.shape[1]
+    if length == 0:
+        return np.array([(a, b) for a in range(len(fingerprints)) for b in range(a + 1, len(fingerprints))],
+                        dtype=int).reshape(-1, 2)
+    samples = fingerprints[:, np.unique(np.linspace(0, length - 1, INDEX_SAMPLES).round().astype(int))]
+    return cKDTree(samples).query_pairs(tolerance, p=np.inf, output_type='ndarray')
+
+
+def find_duplicates(mols, tolerance=DEFAULT_TOLERANCE, heavy_atoms_only=True):
+    """Maps every near-duplicate conformer to its group's representative.
+
+    mols is a sequence of (key, RDKit mol) in order of preference: the first
+    conformer of each group is kept as the representative and every later
+    one within tolerance of it is mapped to it. Returns {key: representative
+    key} for the duplicates only.
+    """
+    groups = {}
+    for position, (key, mol) in enumerate(mols):
+        groups.setdefault(topology_key(mol), []).append((position, key, mol))
+
+    duplicates = {}
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        fingerprints = np.array([distance_fingerprint(mol, heavy_atoms_only) for _, _, mol in members])
+        neighbours = {}
+        for a, b in _candidate_pairs(fingerprints, tolerance):
+            if np.abs(fingerprints[a] - fingerprints[b]).max(initial=0.0) <= tolerance:
+                neighbours.setdefault(a, []).append(b)
+                neighbours.setdefault(b, []).append(a)
+
+        # Members are in preference order; each one joins the first kept neighbour, so every
+        # duplicate is within tolerance of its representative (no chaining through other duplicates).
+        representative = {}
+        for a in range(len(members)):
+            kept = [b for b in neighbours.get(a, ()) if b < a and b not in representative]
+            if kept:
+                representative[a] = min(kept)
+                duplicates[members[a][1]] = members[min(kept)][1]
+    return duplicates
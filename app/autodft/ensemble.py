@@ -0,0 +1,231 @@
+"""Conformer-ensemble workflow: cheap pre-screen, RMSD dedupe, DFT on the best conformers.
+
+Every conformer of an ensemble SDF is scored with a cheap method (MMFF94/UFF
+minimization, or a single point in a small basis with coarse grids), the
+duplicates left after the pre-screen are removed by heavy-atom RMSD, and only
+the lowest-energy K (and/or those within an energy window) go through the
+full opti_PCM optimization. The result is a ranked ensemble with relative
+energies and Boltzmann weights.
+"""
+import os
+import json
+
+import numpy as np
+
+from autodft import batch
+from autodft.app import (PREOPT_SETTINGS, build_mf, iter_sdf_records, make_job, mol_to_atom_list,
+                         resolve_backend, run_jobs)
+from autodft.dedupe import find_duplicates
+from autodft.results import HARTREE_TO_KJMOL
+
+PRESCREEN_METHODS = ("ff", "dft")
+KCAL_TO_KJ = 4.184
+GAS_CONSTANT_KJMOL = 8.314462618e-3  # kJ/(mol K)
+
+
+def _prescreen_record(job):
+    """Scores one conformer with the cheap method; errors are returned rather than raised."""
+    from rdkit import Chem
+    from rdkit.Chem import AllChem
+
+    result = {"index": job["index"]}
+    try:
+        rdmol = Chem.MolFromMolBlock(job["molblock"], removeHs=False)
+        if job["method"] == "ff":
+            if AllChem.MMFFHasAllMoleculeParams(rdmol):
+                ff = AllChem.MMFFGetMoleculeForceField(rdmol, AllChem.MMFFGetMoleculeProperties(rdmol))
+            else:
+                ff = AllChem.UFFGetMoleculeForceField(rdmol)
+            ff.Initialize()
+            ff.Minimize(maxIts=2000)
+            conformer = rdmol.GetConformer()
+            for i, position in enumerate(np.array(ff.Positions()).reshape(-1, 3)):
+                conformer.SetAtomPosition(i, position.tolist())
+            result["energy_kjmol"] = ff.CalcEnergy() * KCAL_TO_KJ
+        else:
+            from pyscf import gto, lib
+            mol = gto.M(atom=mol_to_atom_list(rdmol), basis=job["basis"], charge=job["charge"], spin=0,
+                        verbose=0, max_memory=job["max_memory"] or lib.param.MAX_MEMORY)
+            mf = build_mf(mol, job["functional"], job["eps"], job["backend"], PREOPT_SETTINGS)
+            result["energy_kjmol"] = float(mf.kernel()) * HARTREE_TO_KJMOL
+        result["molblock"] = Chem.MolToMolBlock(rdmol)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def heavy_atom_rmsd(probe, reference):
+    """Symmetry-aware best-fit RMSD over heavy atoms (Angstrom)."""
+    from rdkit import Chem
+    from rdkit.Chem import rdMolAlign
+
+    return rdMolAlign.GetBestRMS(Chem.RemoveHs(probe), Chem.RemoveHs(reference))
+
+
+def dedupe_by_rmsd(mols, threshold):
+    """Greedy dedupe of mols (sorted best first): returns {index: index of the kept conformer it duplicates}."""
+    kept = []
+    duplicates = {}
+    for index, mol in mols:
+        for kept_index, kept_mol in kept:
+            if heavy_atom_rmsd(mol, kept_mol) < threshold:
+                duplicates[index] = kept_index
+                break
+        else:
+            kept.append((index, mol))
+    return duplicates
+
+
+def boltzmann_weights(relative_kjmol, temperature):
+    """Boltzmann populations of energies (kJ/mol, relative to the minimum) at temperature (K)."""
+    factors = np.exp(-np.asarray(relative_kjmol, dtype=float) / (GAS_CONSTANT_KJMOL * temperature))
+    return factors / factors.sum()
+
+
+def select_conformers(energies, top_k=None, energy_window=None):
+    """Indices of the conformers to optimize: those within energy_window (kJ/mol) of the minimum, at most top_k."""
+    ranked = sorted(energies, key=energies.get)
+    if energy_window is not None and ranked:
+        lowest = energies[ranked[0]]
+        ranked = [index for index in ranked if energies[index] - lowest <= energy_window]
+    if top_k is not None:
+        ranked = ranked[:top_k]
+    return ranked
+
+
+def write_ensemble_sdf(path, ranked):
+    from rdkit import Chem
+
+    with Chem.SDWriter(path) as writer:
+        for entry in ranked:
+            mol = Chem.MolFromMolBlock(entry["molblock"], removeHs=False)
+            conformer = mol.GetConformer()
+            for i, (_, coords) in enumerate(entry["atoms"]):
+                conformer.SetAtomPosition(i, list(coords))
+            mol.SetProp("_Name", entry["name"] or f"conformer_{entry['index'] + 1}")
+            mol.SetIntProp("autodft_rank", entry["rank"])
+            mol.SetIntProp("autodft_source_index", entry["index"] + 1)
+            mol.SetDoubleProp("autodft_energy_hartree", entry["energy_hartree"])
+            mol.SetDoubleProp("autodft_relative_energy_kjmol", entry["relative_kjmol"])
+            mol.SetDoubleProp("autodft_boltzmann_weight", entry["boltzmann_weight"])
+            mol.SetDoubleProp("autodft_prescreen_energy_kjmol", entry["prescreen_kjmol"])
+            writer.write(mol)
+
+
+def run_ensemble(sdf_file_path, output_dir=None, prescreen="ff", rmsd_threshold=0.5, top_k=5, energy_window=None,
+                 temperature=298.15, dielectric_constant=78.5, functional="M06-2X", basis="def2-svpd", charge=0,
+                 prescreen_basis="sto-3g", workers=1, threads=None, backend="auto", max_memory=None, use_cache=True,
+                 cache_dir=None):
+    """Runs the ensemble workflow; returns a dict with one entry per input conformer and the output paths.
+
+    Writes '<base>_ensemble.sdf' (optimized conformers, best first, with
+    relative energies and Boltzmann weights as SD properties) and
+    '<base>_ensemble.json' (every input conformer with its pre-screen energy,
+    duplicate mapping and DFT result) next to the per-conformer XYZ files.
+    top_k=0 optimizes every unique conformer (within energy_window, if set).
+    """
+    if prescreen not in PRESCREEN_METHODS:
+        raise ValueError(f"Unknown pre-screen '{prescreen}', expected one of {', '.join(PRESCREEN_METHODS)}")
+    if not os.path.isfile(sdf_file_path):
+        raise FileNotFoundError(f"SDF file '{sdf_file_path}' not found")
+    if top_k is None and energy_window is None:
+        raise ValueError("set top_k and/or energy_window to choose the conformers to optimize")
+    top_k = top_k or None
+    records = list(iter_sdf_records(sdf_file_path))
+    if not records:
+        raise ValueError(f"No molecules found in '{sdf_file_path}'")
+
+    from rdkit import Chem
+
+    output_dir = output_dir or os.path.dirname(os.path.abspath(sdf_file_path))
+    os.makedirs(output_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(sdf_file_path))[0]
+    backend = resolve_backend(backend)
+
+    conformers = {index: {"index": index, "name": name} for index, name, _ in records}
+    for index, _, rdmol in records:
+        if rdmol is None:
+            conformers[index]["error"] = "RDKit could not parse this record"
+
+    # 1. Cheap pre-screen.
+    screen_jobs = [
+        {"index": index, "molblock": Chem.MolToMolBlock(rdmol), "method": prescreen, "functional": functional,
+         "basis": prescreen_basis, "charge": charge, "eps": dielectric_constant, "backend": backend,
+         "max_memory": max_memory}
+        for index, _, rdmol in records if rdmol is not None
+    ]
+    print(f"Pre-screening {len(screen_jobs)} conformers ({prescreen})...")
+    for result in batch.run_batch(screen_jobs, _prescreen_record, workers=workers, threads=threads):
+        conformers[result["index"]].update(result)
+    screened = {index: entry["energy_kjmol"] for index, entry in conformers.items() if "error" not in entry}
+    if not screened:
+        raise ValueError("no conformer could be pre-screened")
+    lowest = min(screened.values())
+    for index, energy in screened.items():
+        conformers[index]["prescreen_kjmol"] = energy - lowest
+        del conformers[index]["energy_kjmol"]
+
+    # 2. Remove duplicates, best first so each group keeps its lowest-energy member.
+    order = sorted(screened, key=screened.get)
+    mols = [(index, Chem.MolFromMolBlock(conformers[index]["molblock"], removeHs=False)) for index in order]
+    # The fingerprint index removes near-identical conformers cheaply; RMSD is only computed for the rest.
+    duplicates = find_duplicates(mols)
+    rmsd_duplicates = dedupe_by_rmsd([(index, mol) for index, mol in mols if index not in duplicates],
+                                     rmsd_threshold)
+    duplicates = {index: rmsd_duplicates.get(kept_index, kept_index) for index, kept_index in duplicates.items()}
+    duplicates.update(rmsd_duplicates)
+    for index, kept_index in duplicates.items():
+        conformers[index]["duplicate_of"] = kept_index
+    unique = {index: screened[index] for index in order if index not in duplicates}
+    print(f"{len(duplicates)} duplicates removed (heavy-atom RMSD < {rmsd_threshold} A); {len(unique)} unique.")
+
+    # 3. Full optimization of the selected conformers.
+    selected = select_conformers(unique, top_k, energy_window)
+    print(f"Optimizing {len(selected)} conformers with {functional}/{basis}...")
+    jobs = [
+        make_job(index, conformers[index]["name"],
+                 Chem.MolFromMolBlock(conformers[index]["molblock"], removeHs=False),
+                 os.path.join(output_dir, f"{base_name}_{index + 1}.xyz"),
+                 functional=functional, basis=basis, charge=charge, eps=dielectric_constant, backend=backend,
+                 max_memory=max_memory, preopt="none", preopt_basis=prescreen_basis, single_point=False,
+                 checkpoint=True, resume=False, events=None, profile=False)
+        for index in selected
+    ]
+    for index, result in zip(selected, run_jobs(jobs, workers=workers, threads=threads, use_cache=use_cache,
+                                                  cache_dir=cache_dir)):
+        conformers[index]["selected"] = True
+        for key in ("energy_hartree", "converged", "atoms", "xyz_filename", "cached", "error"):
+            if key in result:
+                conformers[index][key] = result[key]
+
+    # 4. Rank by the DFT energy.
+    ranked = sorted((entry for entry in conformers.values() if "energy_hartree" in entry),
+                    key=lambda entry: entry["energy_hartree"])
+    if ranked:
+        relative = [(entry["energy_hartree"] - ranked[0]["energy_hartree"]) * HARTREE_TO_KJMOL for entry in ranked]
+        for rank, (entry, rel, weight) in enumerate(zip(ranked, relative, boltzmann_weights(relative, temperature))):
+            entry.update(rank=rank + 1, relative_kjmol=rel, boltzmann_weight=float(weight))
+
+    sdf_path = os.path.join(output_dir, f"{base_name}_ensemble.sdf")
+    json_path = os.path.join(output_dir, f"{base_name}_ensemble.json")
+    write_ensemble_sdf(sdf_path, ranked)
+    summary = {
+        "sdf_file": sdf_file_path,
+        "prescreen": prescreen,
+        "rmsd_threshold": rmsd_threshold,
+        "top_k": top_k,
+        "energy_window": energy_window,
+        "temperature": temperature,
+        "functional": functional,
+        "basis": basis,
+        "ensemble_sdf": sdf_path,
+        "conformers": [
+            {key: value for key, value in entry.items() if key not in ("molblock", "atoms")}
+            for _, entry in sorted(conformers.items())
+        ],
+    }
+    with open(json_path, "w") as f:
+        json.dump(summary, f, indent=2)
+    summary["ensemble_json"] = json_path
+    summary["ranked"] = ranked
+    return summary
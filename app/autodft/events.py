@@ -0,0 +1,121 @@
+"""JSON-lines progress events.
+
+One JSON object per line, each with an "event" type ("start", "scf_cycle",
+"geometry_step", "result" or "error"), a Unix "time", the "elapsed" seconds
+since the stream was opened, and the stream's context (record index and name
+in a batch, current stage).
+"""
+import os
+import sys
+import json
+import time
+
+import numpy as np
+
+from autodft.results import to_numpy
+
+# geomeTRIC's default (GAU) convergence criteria, reported per geometry step.
+CONVERGENCE_CRITERIA = {
+    "energy": 1e-6,   # Hartree
+    "grms": 3e-4,     # Hartree/Bohr
+    "gmax": 4.5e-4,   # Hartree/Bohr
+    "drms": 1.2e-3,   # Angstrom
+    "dmax": 1.8e-3,   # Angstrom
+}
+BOHR = 0.52917721092
+
+
+def open_stream(target):
+    """Opens '-' (stdout), 'fd:N' (an inherited file descriptor) or a file path for appending."""
+    if target == "-":
+        return sys.stdout, False
+    if target.startswith("fd:"):
+        return os.fdopen(int(target[3:]), "a", buffering=1, closefd=False), True
+    return open(target, "a", buffering=1), True
+
+
+class EventStream:
+    def __init__(self, target, **context):
+        self.target = target
+        self.stream, self._owned = open_stream(target)
+        self.context = context
+        self.start = time.time()
+        self._last_energy = None
+        self._last_coords = None
+
+    def emit(self, event, **fields):
+        now = time.time()
+        record = {"event": event, "time": now, "elapsed": round(now - self.start, 3)}
+        record.update(self.context)
+        record.update(fields)
+        self.stream.write(json.dumps(record, default=float) + "\n")
+        self.stream.flush()
+
+    def on_scf_cycle(self, envs):
+        """PySCF mf.callback: one event per SCF iteration."""
+        energy = float(envs["e_tot"])
+        self.emit(
+            "scf_cycle",
+            cycle=envs["cycle"] + 1,
+            energy=energy,
+            delta_e=energy - float(envs["last_hf_e"]),
+            grad_norm=float(envs["norm_gorb"]),
+            ddm_norm=float(envs["norm_ddm"]),
+            converged=bool(envs["scf_conv"]),
+        )
+
+    def on_geometry_step(self, envs):
+        """geomeTRIC callback: one event per geometry step with the GAU convergence flags."""
+        energy = float(envs["energy"])
+        gradient = to_numpy(envs["gradients"]).reshape(-1, 3)
+        coords = np.asarray(envs["coords"]).reshape(-1, 3) * BOHR
+
+        step = None
+        criteria = {
+            "grms": float(np.sqrt(np.mean(gradient ** 2))) < CONVERGENCE_CRITERIA["grms"],
+            "gmax": float(np.abs(gradient).max()) < CONVERGENCE_CRITERIA["gmax"],
+        }
+        delta_e = None
+        if self._last_coords is not None:
+            displacement = np.linalg.norm(coords - self._last_coords, axis=1)
+            step = float(np.linalg.norm(coords - self._last_coords))
+            delta_e = energy - self._last_energy
+            criteria["energy"] = abs(delta_e) < CONVERGENCE_CRITERIA["energy"]
+            criteria["drms"] = float(np.sqrt(np.mean(displacement ** 2))) < CONVERGENCE_CRITERIA["drms"]
+            criteria["dmax"] = float(displacement.max()) < CONVERGENCE_CRITERIA["dmax"]
+        self._last_energy = energy
+        self._last_coords = coords
+
+        self.emit(
+            "geometry_step",
+            step=envs["self"].cycle,
+            energy=energy,
+            delta_e=delta_e,
+            grad_norm=float(np.linalg.norm(gradient)),
+            grad_max=float(np.abs(gradient).max()),
+            step_size=step,
+            scf_converged=bool(envs["g_scanner"].converged),
+            criteria=criteria,
+            converged=len(criteria) == len(CONVERGENCE_CRITERIA) and all(criteria.values()),
+        )
+
+    def close(self):
+        if self._owned:
+            self.stream.close()
+
+
+def read_events(path, offset=0):
+    """Reads the complete events written to path after byte offset; returns (events, new offset).
+
+    A line still being written is left for the next call, so a stream can be
+    followed by calling this repeatedly with the returned offset.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+    end = data.rfind(b"\n") + 1
+    events = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return events, offset + end
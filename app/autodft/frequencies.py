@@ -0,0 +1,170 @@
+"""Harmonic frequencies and thermochemistry at an optimized geometry.
+
+The Hessian is analytic when the backend implements it for the SCF object
+(DF-RKS + PCM on PySCF and gpu4pyscf). Otherwise, or when requested, it is
+built from central finite differences of analytic gradients: the 6N displaced
+gradient calculations are independent, so they run on a process pool, and
+each one starts from the reference density instead of a fresh guess.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from autodft import batch
+from autodft.results import to_numpy
+
+HESSIAN_METHODS = ("auto", "analytic", "fd")
+FD_STEP = 5e-3  # Bohr
+DEFAULT_TEMPERATURE = 298.15  # K
+DEFAULT_PRESSURE = 101325.0  # Pa
+
+
+def analytic_hessian(mf):
+    """Returns the (natm, natm, 3, 3) analytic Hessian, or None when the backend does not implement it."""
+    try:
+        hessian = mf.Hessian()
+    except (AttributeError, NotImplementedError):
+        return None
+    try:
+        return to_numpy(hessian.kernel())
+    except NotImplementedError:
+        return None
+
+
+def _displaced_gradient(job):
+    """Gradient at one displaced geometry, warm-started from the reference density."""
+    from pyscf import gto, lib
+    from autodft.app import build_mf
+
+    try:
+        mol = gto.M(atom=job["atom_list"], unit='Bohr', basis=job["basis"], charge=job["charge"],
+                    spin=job["spin"], verbose=0, max_memory=job["max_memory"] or lib.param.MAX_MEMORY)
+        mf = build_mf(mol, job["functional"], job["eps"], job["backend"], job["settings"])
+        mf.kernel(dm0=np.load(job["dm_file"]))
+        if not mf.converged:
+            raise RuntimeError("SCF did not converge")
+        return {"gradient": to_numpy(mf.nuc_grad_method().kernel()).tolist(), "cycles": mf.cycles}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def finite_difference_hessian(mf, functional, eps, backend, settings=None, step=FD_STEP, workers=1, threads=None,
+                              max_memory=None):
+    """Central-difference Hessian from 6N displaced gradients; returns (hessian, total SCF cycles).
+
+    max_memory (MB) is the budget of each displaced calculation (default: mf.mol.max_memory).
+    """
+    mol = mf.mol
+    coords = mol.atom_coords()
+    symbols = [mol.atom_symbol(i) for i in range(mol.natm)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # One shared file instead of pickling the density into every job.
+        dm_file = os.path.join(tmp, "dm0.npy")
+        np.save(dm_file, to_numpy(mf.make_rdm1()))
+        jobs = []
+        for coordinate in range(coords.size):
+            for sign in (1, -1):
+                displaced = coords.copy().reshape(-1)
+                displaced[coordinate] += sign * step
+                jobs.append({
+                    "atom_list": list(zip(symbols, displaced.reshape(-1, 3).tolist())),
+                    "basis": mol.basis, "charge": mol.charge, "spin": mol.spin,
+                    "max_memory": max_memory or mol.max_memory,
+                    "functional": functional, "eps": eps, "backend": backend, "settings": settings,
+                    "dm_file": dm_file,
+                })
+        results = batch.run_batch(jobs, _displaced_gradient, workers=workers, threads=threads)
+
+    failed = [result["error"] for result in results if "error" in result]
+    if failed:
+        raise RuntimeError(f"{len(failed)} displaced gradient calculations failed: {failed[0]}")
+    gradients = np.array([result["gradient"] for result in results]).reshape(coords.size, 2, -1)
+    hessian = (gradients[:, 0] - gradients[:, 1]) / (2 * step)
+    hessian = (hessian + hessian.T) / 2
+    natm = mol.natm
+    return hessian.reshape(natm, 3, natm, 3).transpose(0, 2, 1, 3), sum(result["cycles"] for result in results)
+
+
+def fd_budget(mol, workers=None, threads=None):
+    """Splits the calling job's threads and memory between finite-difference workers.
+
+    Returns (workers, threads per worker, max_memory per worker in MB). The
+    job's budget is this process's PySCF thread count and mol.max_memory.
+    By default a process that is itself a pool worker (e.g. of a batch) uses
+    one worker, and any other process one worker per thread.
+    """
+    import multiprocessing
+    from pyscf import lib
+
+    job_threads = lib.num_threads()
+    if workers is None:
+        workers = 1 if multiprocessing.parent_process() is not None else job_threads
+    workers = max(1, workers)
+    return workers, threads or max(1, job_threads // workers), mol.max_memory / workers
+
+
+def run_frequencies(mf, functional, eps, backend, settings=None, hessian="auto", temperature=DEFAULT_TEMPERATURE,
+                    pressure=DEFAULT_PRESSURE, workers=None, threads=None):
+    """Computes frequencies and thermochemistry for the converged SCF object mf at a stationary point.
+
+    Returns a dict with the Hessian method, frequencies (cm-1, imaginary
+    modes as negative numbers), the imaginary modes, and the electronic
+    energy, ZPE, enthalpy, entropy and Gibbs free energy (Hartree, Hartree/K)
+    at temperature (K) and pressure (Pa).
+
+    A finite-difference Hessian runs on workers processes with threads
+    threads each; both default to a share of the calling job's budget (see
+    fd_budget).
+    """
+    from pyscf.hessian import thermo
+
+    if hessian not in HESSIAN_METHODS:
+        raise ValueError(f"Unknown Hessian method '{hessian}', expected one of {', '.join(HESSIAN_METHODS)}")
+
+    hess = analytic_hessian(mf) if hessian != "fd" else None
+    method, fd_cycles = "analytic", None
+    if hess is None:
+        if hessian == "analytic":
+            raise ValueError(f"the {backend} backend has no analytic Hessian for this method")
+        workers, threads, max_memory = fd_budget(mf.mol, workers, threads)
+        print(f"Building the Hessian from {6 * mf.mol.natm} displaced gradients on {workers} workers "
+              f"({threads} threads, {max_memory:.0f} MB each)...")
+        hess, fd_cycles = finite_difference_hessian(mf, functional, eps, backend, settings, workers=workers,
+                                                    threads=threads, max_memory=max_memory)
+        method = "finite differences"
+
+    modes = thermo.harmonic_analysis(mf.mol, hess, imaginary_freq=False)
+    frequencies = np.asarray(modes["freq_wavenumber"]).real
+    properties = thermo.thermo(mf, modes["freq_au"], temperature, pressure)
+    return {
+        "hessian_method": method,
+        "fd_scf_cycles": fd_cycles,
+        "temperature": temperature,
+        "pressure": pressure,
+        "frequencies_cm": frequencies.tolist(),
+        "imaginary_cm": frequencies[frequencies < 0].tolist(),
+        "e_electronic": float(properties["E0"][0]),
+        "zpe": float(properties["ZPE"][0]),
+        "enthalpy": float(properties["H_tot"][0]),
+        "entropy": float(properties["S_tot"][0]),
+        "free_energy": float(properties["G_tot"][0]),
+    }
+
+
+def print_thermo(result):
+    print(f"Frequencies ({result['hessian_method']} Hessian), cm-1:")
+    frequencies = result["frequencies_cm"]
+    for start in range(0, len(frequencies), 6):
+        print("  " + "".join(f"{f:>10.2f}" for f in frequencies[start:start + 6]))
+    if result["imaginary_cm"]:
+        print(f"Warning: {len(result['imaginary_cm'])} imaginary mode(s): "
+              + ", ".join(f"{abs(f):.1f}i" for f in result["imaginary_cm"])
+              + " cm-1; the geometry is not a minimum.")
+    print(f"Thermochemistry at {result['temperature']:.2f} K, {result['pressure']:.0f} Pa (Hartree):")
+    print(f"  {'Electronic energy':<24}{result['e_electronic']:>18.8f}")
+    print(f"  {'Zero-point energy':<24}{result['zpe']:>18.8f}")
+    print(f"  {'Enthalpy':<24}{result['enthalpy']:>18.8f}")
+    print(f"  {'T*S':<24}{result['temperature'] * result['entropy']:>18.8f}")
+    print(f"  {'Gibbs free energy':<24}{result['free_energy']:>18.8f}")
@@ -0,0 +1,95 @@
+"""Initial SCF guesses shared between conformers of a batch.
+
+Conformers with the same atom list (same elements in the same order) in the
+same basis have the same AO layout, so the converged density of one can be
+the first guess for another instead of PySCF's superposition of atomic
+densities. Every finished job saves its final density and geometry in a
+guess directory, under a subdirectory named by a key of its element list,
+basis, charge, functional and dielectric constant. A job that starts later
+with the same key takes the density of the most similar finished conformer,
+the one with the smallest RMSD after superposition, and its optimizer starts
+the first SCF from it (see opti_PCM's dm0). The directory is shared by the
+pool workers of a batch and, in a work queue, by every node.
+
+Conformers are generated in arbitrary orientations, and the p, d, ... blocks
+of an AO density matrix turn with the molecule. So the donor density is first
+rotated by the rigid rotation that best superimposes its geometry on the new
+one (Kabsch). Without that rotation it is a worse guess than the atomic one.
+
+Each saved density also records how many SCF cycles the first geometry step
+of the first cold-started conformer of its key took. Warm-started conformers
+report the cycles they saved against that number.
+"""
+import os
+import glob
+import json
+import uuid
+import hashlib
+
+import numpy as np
+
+
+def guess_key(job):
+    payload = {"symbols": [symbol for symbol, _ in job["atom_list"]], "basis": job["basis"].lower(),
+               "charge": job["charge"], "functional": job["functional"].upper(), "eps": job["eps"]}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def load_guess(guess_dir, key, coords):
+    """Returns (density, its geometry in Bohr, cold-start first-step SCF cycles or None) for key.
+
+    They belong to the finished conformer of key whose geometry is closest to
+    coords (Bohr); all are None when none has finished yet.
+    """
+    best, best_rmsd = None, None
+    for path in glob.glob(os.path.join(guess_dir, key, "*.npz")):
+        try:
+            with np.load(path) as data:
+                # Only the coordinates are read here; npz members load on access.
+                rmsd = aligned_rmsd(data["coords"], coords)
+        except (OSError, ValueError, KeyError):
+            continue
+        if best_rmsd is None or rmsd < best_rmsd:
+            best, best_rmsd = path, rmsd
+    if best is None:
+        return None, None, None
+    with np.load(best) as data:
+        cold_cycles = int(data["cold_cycles"])
+        print(f"Conformer guess: density of a finished conformer {best_rmsd:.3f} Bohr RMSD away")
+        return data["dm"], data["coords"], (cold_cycles if cold_cycles >= 0 else None)
+
+
+def save_guess(guess_dir, key, dm, coords, cold_cycles=None):
+    """Adds the converged density dm of a finished conformer of key at coords (Bohr).
+
+    The rename makes the file appear complete to concurrent readers.
+    """
+    key_dir = os.path.join(guess_dir, key)
+    os.makedirs(key_dir, exist_ok=True)
+    name = uuid.uuid4().hex
+    tmp_path = os.path.join(key_dir, f".{name}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, dm=dm, coords=coords, cold_cycles=-1 if cold_cycles is None else cold_cycles)
+    os.replace(tmp_path, os.path.join(key_dir, f"{name}.npz"))
+
+
+def kabsch_rotation(p, q):
+    """The proper rotation r that best superimposes the centered rows of p on those of q (q ~ p r^T)."""
+    p = p - p.mean(axis=0)
+    q = q - q.mean(axis=0)
+    u, _, vt = np.linalg.svd(p.T @ q)
+    d = np.sign(np.linalg.det(vt.T @ u.T))
+    return vt.T @ np.diag([1.0, 1.0, d]) @ u.T
+
+
+def aligned_rmsd(p, q):
+    """RMSD of the rows of p and q after the best rigid superposition."""
+    p = p - p.mean(axis=0)
+    q = q - q.mean(axis=0)
+    return float(np.sqrt(np.mean(np.sum((p @ kabsch_rotation(p, q).T - q) ** 2, axis=1))))
+
+
+def align_density(mol, dm, coords):
+    """Rotates dm, a density of mol's atoms at coords (Bohr), into the orientation of mol's geometry."""
+    u = mol.ao_rotation_matrix(kabsch_rotation(np.asarray(coords), mol.atom_coords()))
+    return u.T @ dm @ u
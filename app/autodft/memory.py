@@ -0,0 +1,153 @@
+"""Memory estimates and the memory plan for large molecules.
+
+Before the optimization starts, estimate_memory predicts the largest arrays
+of one geometry step: the DF 3-index tensor, the DFT grid (coordinates and
+weights, and the largest block of AO values with its work arrays), the dense
+PCM matrices and the AO matrices of the SCF (density, Fock, orbitals, DIIS
+history). The peak is reached in the nuclear gradient, which evaluates AO
+second derivatives on the grid; the factors below are calibrated against the
+peak RSS of DF-RKS + PCM gradients on ethanol (6-31G and def2-SVPD).
+
+PySCF bounds its arrays by max_memory, but each part on its own: DF.build
+keeps the 3-index tensor in memory while it fits in 0.9 of the free
+max_memory (writing it to a temporary file in PySCF's TMPDIR otherwise), and
+numint sizes AO-value blocks from the free max_memory, without counting the
+PCM and SCF matrices that are needed at the same time. plan_memory splits the
+budget instead. DF.build runs after the grids and the PCM matrices of the SCF
+exist, so PySCF already counts those; the arrays allocated later (SCF
+matrices, PCM gradient matrices) are taken off the DF object's max_memory
+('df_max_memory'), and the AO-value blocks of the gradient get what the
+tensor leaves ('grid_block'). configure_memory applies both. The PCM
+matrices cannot be blocked; a budget below them only produces a warning.
+"""
+# Share of the grid points left after Becke partitioning and NWChem pruning (measured: 0.55-0.56).
+GRID_PRUNE_FACTOR = 0.56
+# Share of the Lebedev points per atom left on the solvent-accessible surface (measured: 0.38-0.48).
+SURFACE_FACTOR = 0.5
+# PCM keeps S, D, K and R (nsurf x nsurf) from the first SCF on; the gradient adds about four more (measured: 8).
+PCM_MATRICES = 8
+PCM_SCF_MATRICES = 4
+# Density, Fock, orbitals, overlap, core Hamiltonian and an 8-vector DIIS history.
+SCF_MATRICES = 14
+# PySCF numint block limits (pyscf.dft.gen_grid.BLKSIZE and the 1200-block cap in numint.block_loop).
+BLKSIZE = 56
+MAX_BLOCKS = 1200
+# AO values up to second derivatives (10 components) in the gradient, plus numint's work arrays (measured: 16).
+AO_VALUE_ARRAYS = 16
+# AO-value components PySCF's block size accounts for in the gradient (see grid_block_size).
+GRADIENT_AO_COMPONENTS = 10
+# Least share of the budget DF gets for its own work arrays, even when the reserved arrays exceed the budget.
+MIN_DF_SHARE = 0.25
+
+
+def lebedev_points(order):
+    from pyscf.dft.gen_grid import LEBEDEV_ORDER
+    return LEBEDEV_ORDER[order]
+
+
+def grid_block_size(nao, ngrids, max_memory_mb, comp=4):
+    """Grid points per AO-value block PySCF's numint uses with max_memory_mb available (see numint.block_loop)."""
+    blksize = int(max_memory_mb * 1e6 / ((comp + 1) * nao * 8 * BLKSIZE)) * BLKSIZE
+    return max(BLKSIZE, min(blksize, ngrids, BLKSIZE * MAX_BLOCKS))
+
+
+def estimate_memory(mol, settings, functional=None, auxbasis=None):
+    """Predicts the memory (MB) of the large arrays of one DF-RKS + PCM geometry step.
+
+    Pure functionals only need the Coulomb term, which PySCF fits without
+    storing the 3-index tensor, so 'df' is 0 for them.
+
+    Returns a dict with the sizes (nao, naux, grid_points, surface_points)
+    and the MB of 'df' (3-index tensor), 'grids' (points and weights),
+    'ao_values' (the largest AO-value block of the gradient, with its work
+    arrays, that numint uses without a budget),
+    'pcm' and 'scf', and their 'total'.
+    """
+    from pyscf.df import addons
+    from pyscf.dft import libxc
+
+    nao = mol.nao_nr()
+    naux = addons.make_auxmol(mol, auxbasis).nao_nr()
+    radial, angular = settings["atom_grid"]
+    grid_points = int(mol.natm * radial * angular * GRID_PRUNE_FACTOR)
+    surface_points = int(mol.natm * lebedev_points(settings["lebedev_order"]) * SURFACE_FACTOR)
+    # The largest block numint would use without a budget.
+    block = min(grid_points, BLKSIZE * MAX_BLOCKS)
+    estimate = {
+        "nao": nao,
+        "naux": naux,
+        "grid_points": grid_points,
+        "surface_points": surface_points,
+        "df": naux * nao * (nao + 1) // 2 * 8 / 1e6 if functional is None or libxc.is_hybrid_xc(functional) else 0.0,
+        "grids": grid_points * 4 * 8 / 1e6,
+        "ao_values": block * nao * AO_VALUE_ARRAYS * 8 / 1e6,
+        "pcm": PCM_MATRICES * surface_points ** 2 * 8 / 1e6,
+        "scf": SCF_MATRICES * nao ** 2 * 8 / 1e6,
+    }
+    estimate["total"] = sum(estimate[key] for key in ("df", "grids", "ao_values", "pcm", "scf"))
+    return estimate
+
+
+def plan_memory(estimate, budget_mb, backend="cpu", baseline_mb=0.0):
+    """Decides how to run within budget_mb (MB, including baseline_mb already in use).
+
+    Returns a dict with 'budget_mb', 'df_max_memory' (the max_memory of the
+    DF object: the budget less the arrays allocated after DF.build), 'df_outcore'
+    (the DF tensor does not fit in it and goes to disk), 'grid_block' (points
+    per AO-value block under what the tensor leaves; None on the gpu backend,
+    which blocks by device memory) and 'warnings'.
+    """
+    available = budget_mb - baseline_mb
+    # AO values are blocked to fit whatever is left; everything else is needed whole.
+    fixed = estimate["pcm"] + estimate["scf"] + estimate["grids"]
+    warnings = []
+    later = estimate["scf"] + estimate["pcm"] * (PCM_MATRICES - PCM_SCF_MATRICES) / PCM_MATRICES
+    df_max_memory = max(budget_mb - later, MIN_DF_SHARE * budget_mb)
+    # PySCF compares the tensor with 0.9 of df_max_memory less what is in use when DF.build runs.
+    df_outcore = estimate["df"] > 0.9 * (df_max_memory - baseline_mb - (fixed - later))
+    if df_outcore and backend == "gpu":
+        warnings.append("the gpu backend has no out-of-core DF; the DF tensor stays in device memory")
+        df_outcore = False
+    if fixed > available:
+        warnings.append(f"the PCM and SCF matrices alone need about {fixed:.0f} MB, more than the "
+                        f"{available:.0f} MB left of the budget; the run may swap or fail")
+    left = available - fixed - (0 if df_outcore else estimate["df"])
+    block = None
+    if backend != "gpu":
+        block = grid_block_size(estimate["nao"], estimate["grid_points"], max(left, 0), comp=GRADIENT_AO_COMPONENTS)
+    return {"budget_mb": budget_mb, "df_max_memory": df_max_memory, "df_outcore": df_outcore, "grid_block": block,
+            "warnings": warnings}
+
+
+def print_memory_plan(estimate, plan):
+    print(f"Memory estimate ({estimate['nao']} AOs, {estimate['naux']} auxiliary functions, "
+          f"{estimate['grid_points']} grid points, {estimate['surface_points']} PCM surface points):")
+    for key, label in (("df", "DF tensor"), ("grids", "Grid points"), ("ao_values", "AO values"),
+                       ("pcm", "PCM matrices"), ("scf", "SCF matrices"), ("total", "Total")):
+        print(f"  {label:<16}{estimate[key]:>10.0f} MB")
+    mode = "out of core" if plan["df_outcore"] else "in memory"
+    blocks = f", AO values in blocks of {plan['grid_block']} grid points" if plan["grid_block"] else ""
+    print(f"Budget {plan['budget_mb']:.0f} MB: DF tensor {mode} ({plan['df_max_memory']:.0f} MB for DF){blocks}")
+    for warning in plan["warnings"]:
+        print(f"Warning: {warning}")
+
+
+def configure_memory(mf, plan):
+    """Applies plan to a PySCF SCF object: DF gets df_max_memory, and numint uses grid_block points per block.
+
+    The block size also holds for the nuclear gradient, which evaluates AO
+    values through the same NumInt object.
+    """
+    mf.max_memory = plan["budget_mb"]
+    with_df = getattr(mf, "with_df", None)
+    if with_df is not None:
+        with_df.max_memory = plan["df_max_memory"]
+    ni = getattr(mf, "_numint", None)
+    if plan["grid_block"] and ni is not None:
+        block_loop = type(ni).block_loop
+
+        def planned_block_loop(mol, grids, nao=None, deriv=0, max_memory=2000, non0tab=None, blksize=None,
+                               buf=None):
+            return block_loop(ni, mol, grids, nao, deriv, max_memory, non0tab, blksize or plan["grid_block"], buf)
+        ni.block_loop = planned_block_loop
+    return mf
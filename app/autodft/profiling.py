@@ -0,0 +1,221 @@
+"""Stage timing and resource instrumentation for the optimization pipeline.
+
+A Profiler temporarily wraps the PySCF/geomeTRIC entry points of each stage
+(DF integrals, grids, PCM, SCF, gradients, optimizer) and accumulates the
+exclusive wall and CPU time, call count and peak RSS of every stage: time
+spent in a nested stage (e.g. the grid build triggered by the first SCF
+iteration) is charged to that stage only. Nothing is patched outside a
+`with Profiler():` block, so a run without a profiler pays nothing.
+
+write_report and write_prometheus export the summaries of one or more runs
+as a JSON run report and as a Prometheus textfile (node_exporter textfile
+collector format).
+"""
+import os
+import json
+import time
+import resource
+import importlib
+from contextlib import contextmanager
+
+# (stage, module, class or None for a module-level function, attribute)
+STAGE_TARGETS = (
+    ("integrals", "pyscf.df.df", "DF", "build"),
+    ("grids", "pyscf.dft.gen_grid", "Grids", "build"),
+    ("pcm", "pyscf.solvent.pcm", "PCM", "build"),
+    ("scf", "pyscf.scf.hf", "SCF", "scf"),
+    ("gradient", "pyscf.grad.rhf", "GradientsBase", "kernel"),
+    ("gradient", "pyscf.solvent.grad.pcm", "WithSolventGrad", "kernel"),
+    ("optimizer", "pyscf.geomopt.geometric_solver", None, "kernel"),
+    ("integrals", "gpu4pyscf.df.df", "DF", "build"),
+    ("grids", "gpu4pyscf.dft.gen_grid", "Grids", "build"),
+    ("pcm", "gpu4pyscf.solvent.pcm", "PCM", "build"),
+    ("scf", "gpu4pyscf.scf.hf", "SCF", "scf"),
+    ("gradient", "gpu4pyscf.grad.rhf", "GradientsBase", "kernel"),
+)
+STAGES = ("integrals", "grids", "pcm", "scf", "gradient", "optimizer")
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if os.uname().sysname == "Darwin" else peak * 1024 / 1e6
+
+
+class Profiler:
+    def __init__(self):
+        self.stages = {stage: self._new_entry() for stage in STAGES}
+        self.counters = {"scf_cycles": 0}
+        self.steps = []
+        self._stack = []
+        self._patches = []
+        self.wall = 0.0
+        self.cpu = 0.0
+        self._start = None
+        self._last_step = None
+
+    @staticmethod
+    def _new_entry():
+        return {"wall": 0.0, "cpu": 0.0, "calls": 0, "peak_rss_mb": 0.0}
+
+    @contextmanager
+    def stage(self, name):
+        """Times a block as stage `name`; re-entering a stage already on the stack is not counted twice."""
+        if any(frame[0] == name for frame in self._stack):
+            yield
+            return
+        frame = [name, time.perf_counter(), time.process_time(), 0.0, 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            wall = time.perf_counter() - frame[1]
+            cpu = time.process_time() - frame[2]
+            entry = self.stages.setdefault(name, self._new_entry())
+            entry["wall"] += wall - frame[3]
+            entry["cpu"] += cpu - frame[4]
+            entry["calls"] += 1
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"], current_rss_mb())
+            if self._stack:
+                self._stack[-1][3] += wall
+                self._stack[-1][4] += cpu
+
+    def on_geometry_step(self, envs):
+        """geomeTRIC callback: records the wall/CPU time and SCF cycles of every geometry step."""
+        now = (time.perf_counter(), time.process_time(), self.counters["scf_cycles"])
+        last = self._last_step or self._start or now
+        self.steps.append({
+            "step": len(self.steps) + 1,
+            "wall": round(now[0] - last[0], 4),
+            "cpu": round(now[1] - last[1], 4),
+            "scf_cycles": now[2] - last[2],
+            "rss_mb": round(current_rss_mb(), 1),
+        })
+        self._last_step = now
+
+    def _wrap(self, name, func):
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            with profiler.stage(name):
+                result = func(*args, **kwargs)
+            if name == "scf" and args:
+                profiler.counters["scf_cycles"] += getattr(args[0], "cycles", 0)
+            return result
+        wrapper.__wrapped__ = func
+        wrapper.__name__ = getattr(func, "__name__", name)
+        return wrapper
+
+    def install(self):
+        self._start = (time.perf_counter(), time.process_time(), self.counters["scf_cycles"])
+        for name, module_name, class_name, attr in STAGE_TARGETS:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                continue
+            owner = getattr(module, class_name, None) if class_name else module
+            if owner is None or not hasattr(owner, attr):
+                continue
+            # Remember whether the attribute was inherited so uninstall restores the lookup exactly.
+            own = attr in vars(owner)
+            original = vars(owner)[attr] if own else None
+            setattr(owner, attr, self._wrap(name, getattr(owner, attr)))
+            self._patches.append((owner, attr, own, original))
+
+    def uninstall(self):
+        for owner, attr, own, original in reversed(self._patches):
+            if own:
+                setattr(owner, attr, original)
+            else:
+                delattr(owner, attr)
+        self._patches = []
+        if self._start is not None:
+            self.wall = time.perf_counter() - self._start[0]
+            self.cpu = time.process_time() - self._start[1]
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    def summary(self):
+        """JSON-serializable totals, per-stage entries and per-step records."""
+        if self._patches:
+            wall = time.perf_counter() - self._start[0]
+            cpu = time.process_time() - self._start[1]
+        else:
+            wall, cpu = self.wall, self.cpu
+        return {
+            "wall": round(wall, 4),
+            "cpu": round(cpu, 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "stages": {name: {"wall": round(entry["wall"], 4), "cpu": round(entry["cpu"], 4),
+                              "calls": entry["calls"], "peak_rss_mb": round(entry["peak_rss_mb"], 1)}
+                       for name, entry in self.stages.items()},
+            "counters": dict(self.counters),
+            "steps": list(self.steps),
+        }
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_report(path, runs, **metadata):
+    """Writes a JSON run report; runs is a list of dicts with at least 'name' and 'profile' (a summary)."""
+    report = dict(metadata, created=time.time(), runs=runs)
+    _write_atomic(path, json.dumps(report, indent=2))
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# (metric, help, getter); run metrics read a summary, stage metrics one stage entry.
+RUN_METRICS = (
+    ("autodft_run_wall_seconds", "Wall time of the optimization run.", lambda p: p["wall"]),
+    ("autodft_run_cpu_seconds", "CPU time of the optimization run (all threads).", lambda p: p["cpu"]),
+    ("autodft_peak_rss_bytes", "Peak resident memory of the process running the optimization.",
+     lambda p: p["peak_rss_mb"] * 1e6),
+    ("autodft_scf_cycles", "SCF iterations over the whole run.", lambda p: p["counters"]["scf_cycles"]),
+    ("autodft_geometry_steps", "Geometry steps of the production optimization.", lambda p: len(p["steps"])),
+)
+STAGE_METRICS = (
+    ("autodft_stage_wall_seconds", "Exclusive wall time spent in a pipeline stage.", lambda e: e["wall"]),
+    ("autodft_stage_cpu_seconds", "Exclusive CPU time spent in a pipeline stage.", lambda e: e["cpu"]),
+    ("autodft_stage_calls", "Number of times a pipeline stage ran.", lambda e: e["calls"]),
+    ("autodft_stage_peak_rss_bytes", "Largest resident memory seen at the end of a pipeline stage.",
+     lambda e: e["peak_rss_mb"] * 1e6),
+)
+
+
+def write_prometheus(path, runs):
+    """Writes the runs' metrics as a Prometheus textfile, one sample per run (and stage)."""
+    lines = []
+    for metric, help_text, getter in RUN_METRICS:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for run in runs:
+            labels = f'molecule="{_label(run["name"])}",index="{run["index"]}"'
+            lines.append(f"{metric}{{{labels}}} {getter(run['profile']):g}")
+    for metric, help_text, getter in STAGE_METRICS:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for run in runs:
+            for stage, entry in run["profile"]["stages"].items():
+                labels = f'molecule="{_label(run["name"])}",index="{run["index"]}",stage="{stage}"'
+                lines.append(f"{metric}{{{labels}}} {getter(entry):g}")
+    _write_atomic(path, "\n".join(lines) + "\n")
@@ -0,0 +1,117 @@
+import os
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+HARTREE_TO_KJMOL = 2625.5
+
+
+def to_numpy(array):
+    """Copies a numpy or cupy array to a host numpy array."""
+    if array is None:
+        return None
+    if hasattr(array, "get"):
+        array = array.get()
+    return np.asarray(array)
+
+
+@dataclass
+class OptResult:
+    """Outcome of one opti_PCM run.
+
+    energy_hartree, gradient and dm belong to the optimizer's final step (or to
+    the explicit single point when one was requested). history holds one dict
+    per geometry step with its energy and gradient norms. thermo holds the
+    frequencies and thermochemistry when a frequency stage ran. scf is the
+    optimizer's SCF scanner, which still holds the final density, DF tensors
+    and grids. trajectory holds the geometry of every recorded step (nsteps,
+    natm, 3) in Angstrom. memory holds the memory estimate, the plan (budget, out-of-core
+    DF, grid block size) and the peak RSS of the process. warm_start is set when
+    the first SCF started from an initial density (dm0).
+    """
+    mol: object
+    energy_hartree: float
+    converged: bool
+    gradient: np.ndarray = None
+    dm: np.ndarray = None
+    history: list = field(default_factory=list)
+    stages: list = field(default_factory=list)
+    time: float = 0.0
+    thermo: dict = None
+    scf: object = None
+    memory: dict = None
+    trajectory: np.ndarray = None
+    warm_start: bool = False
+
+    @property
+    def energy_kjmol(self):
+        return self.energy_hartree * HARTREE_TO_KJMOL
+
+
+class StepRecorder:
+    """geomeTRIC callback that records every optimizer step and keeps the last gradient scanner.
+
+    trajectory holds the geometry (Bohr) of every step this recorder saw; a
+    resumed run's earlier steps are only in history.
+
+    The scanner's underlying SCF object holds the converged density of the last
+    evaluated geometry, which is the geometry the optimizer returns.
+    """
+
+    def __init__(self, history=None):
+        self.history = list(history or [])
+        self.trajectory = []
+        self.scanner = None
+        self.gradient = None
+        self.start = time.time()
+
+    def __call__(self, envs):
+        gradient = to_numpy(envs["gradients"])
+        self.scanner = envs["g_scanner"]
+        self.gradient = gradient
+        self.trajectory.append(to_numpy(envs["coords"]).reshape(-1, 3))
+        self.history.append({
+            "step": len(self.history) + 1,
+            "energy": float(envs["energy"]),
+            "grad_norm": float(np.linalg.norm(gradient)),
+            "grad_max": float(np.abs(gradient).max()),
+            "scf_converged": bool(self.scanner.converged),
+            "scf_cycles": getattr(self.scanner.base, "cycles", None),
+            "time": time.time() - self.start,
+        })
+
+    @property
+    def energy(self):
+        return self.history[-1]["energy"] if self.history else None
+
+    def density(self):
+        if self.scanner is None:
+            return None
+        return to_numpy(self.scanner.base.make_rdm1())
+
+
+def scf_cycles(history):
+    """Total SCF cycles of a step history, or None when a step did not record its count."""
+    cycles = [step.get("scf_cycles") for step in history]
+    return None if None in cycles else sum(cycles)
+
+
+def write_csv(path, rows, fields):
+    """Writes rows (dicts) as CSV with the given columns, atomically."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def write_json(path, data):
+    """Writes data as JSON, atomically: readers see the old file or the complete new one."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
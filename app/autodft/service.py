@@ -0,0 +1,156 @@
+"""File-spool worker service.
+
+Layout of a spool directory::
+
+    incoming/<job_id>.json   job specs waiting for a worker
+    jobs/<job_id>/           per-job working directory: input SDF, outputs,
+                             log.txt, events.jsonl and status.json
+
+A client creates jobs/<job_id>/ with the input SDF, then atomically renames a
+spec {"job_id", "sdf_file", "options"} into incoming/. A worker claims a job
+by renaming its spec into the job directory, so any number of workers can
+share one spool.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+from autodft.results import write_json
+
+INCOMING = "incoming"
+JOBS = "jobs"
+
+# Options a job spec may pass through to optimize_sdf.
+JOB_OPTIONS = (
+    "dielectric_constant", "functional", "basis", "charge", "backend", "max_memory",
+    "preopt", "preopt_basis", "single_point", "use_cache", "dedupe", "dedupe_tolerance",
+    "frequencies", "hessian", "temperature", "pressure", "adaptive_accuracy",
+)
+
+
+def job_dir(spool_dir, job_id):
+    return os.path.join(spool_dir, JOBS, job_id)
+
+
+def read_status(spool_dir, job_id):
+    path = os.path.join(job_dir(spool_dir, job_id), "status.json")
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"job_id": job_id, "state": "unknown"}
+
+
+def write_status(spool_dir, job_id, **fields):
+    status = read_status(spool_dir, job_id)
+    status.update(fields, job_id=job_id, updated=time.time())
+    write_json(os.path.join(job_dir(spool_dir, job_id), "status.json"), status)
+    return status
+
+
+def submit(spool_dir, sdf_file_path, options=None, job_id=None):
+    """Copies the SDF into a fresh job directory and queues it; returns the job ID."""
+    job_id = job_id or uuid.uuid4().hex
+    directory = job_dir(spool_dir, job_id)
+    os.makedirs(directory)
+    os.makedirs(os.path.join(spool_dir, INCOMING), exist_ok=True)
+    sdf_file = os.path.basename(sdf_file_path)
+    shutil.copy(sdf_file_path, os.path.join(directory, sdf_file))
+    write_status(spool_dir, job_id, state="queued", submitted=time.time())
+    spec = {"job_id": job_id, "sdf_file": sdf_file, "options": options or {}}
+    write_json(os.path.join(spool_dir, INCOMING, f"{job_id}.json"), spec)
+    return job_id
+
+
+def claim_next(spool_dir):
+    """Claims the oldest queued job; returns its spec, or None when the queue is empty."""
+    incoming = os.path.join(spool_dir, INCOMING)
+    try:
+        names = sorted((entry for entry in os.scandir(incoming) if entry.name.endswith(".json")),
+                       key=lambda entry: entry.stat().st_mtime)
+    except FileNotFoundError:
+        return None
+    for entry in names:
+        job_id = entry.name[:-len(".json")]
+        claimed = os.path.join(job_dir(spool_dir, job_id), "job.json")
+        try:
+            os.rename(entry.path, claimed)
+        except FileNotFoundError:
+            # Another worker got there first.
+            continue
+        with open(claimed) as f:
+            return json.load(f)
+    return None
+
+
+def claim(spool_dir, job_id):
+    """Claims one queued job by ID; returns its spec, or None when it is no longer queued."""
+    claimed = os.path.join(job_dir(spool_dir, job_id), "job.json")
+    try:
+        os.rename(os.path.join(spool_dir, INCOMING, f"{job_id}.json"), claimed)
+    except FileNotFoundError:
+        return None
+    with open(claimed) as f:
+        return json.load(f)
+
+
+def run_job(spool_dir, spec, backend="auto"):
+    """Runs one claimed job in its own directory and records the outcome in status.json."""
+    from autodft.app import optimize_sdf
+
+    job_id = spec["job_id"]
+    directory = job_dir(spool_dir, job_id)
+    options = {key: value for key, value in spec.get("options", {}).items() if key in JOB_OPTIONS}
+    options.setdefault("backend", backend)
+    start = time.time()
+    write_status(spool_dir, job_id, state="running", started=start, pid=os.getpid())
+    try:
+        with open(os.path.join(directory, "log.txt"), "a") as log, redirect_stdout(log), redirect_stderr(log):
+            results = optimize_sdf(os.path.join(directory, spec["sdf_file"]), output_dir=directory,
+                                   events=os.path.join(directory, "events.jsonl"), **options)
+    except Exception as e:
+        with open(os.path.join(directory, "log.txt"), "a") as log:
+            traceback.print_exc(file=log)
+        return write_status(spool_dir, job_id, state="failed", error=str(e), elapsed=time.time() - start)
+
+    records = [
+        {key: result.get(key) for key in ("index", "name", "xyz_filename", "energy_hartree", "energy_kjmol",
+                                          "converged", "cached", "duplicate_of", "thermo", "error")}
+        for result in results
+    ]
+    for record in records:
+        if record["xyz_filename"]:
+            record["xyz_filename"] = os.path.relpath(record["xyz_filename"], directory)
+    failed = [record for record in records if record["error"]]
+    state = "failed" if len(failed) == len(records) else "done"
+    fields = {"state": state, "results": records, "elapsed": time.time() - start}
+    if failed:
+        fields["error"] = "; ".join(record["error"] for record in failed)
+    return write_status(spool_dir, job_id, **fields)
+
+
+def serve(spool_dir, poll_interval=1.0, backend="auto", max_jobs=None):
+    """Processes queued jobs until interrupted (or until max_jobs jobs have run)."""
+    from autodft.app import get_rks, resolve_backend
+
+    # Pay the import cost of the heavy modules once, not per job.
+    backend = resolve_backend(backend)
+    get_rks(backend)
+    os.makedirs(os.path.join(spool_dir, INCOMING), exist_ok=True)
+    os.makedirs(os.path.join(spool_dir, JOBS), exist_ok=True)
+    print(f"Serving jobs from '{spool_dir}' (backend: {backend}, pid {os.getpid()})", flush=True)
+
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        spec = claim_next(spool_dir)
+        if spec is None:
+            time.sleep(poll_interval)
+            continue
+        print(f"Job {spec['job_id']}: running", flush=True)
+        status = run_job(spool_dir, spec, backend)
+        print(f"Job {spec['job_id']}: {status['state']} in {status['elapsed']:.1f} s", flush=True)
+        done += 1
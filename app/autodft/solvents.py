@@ -0,0 +1,194 @@
+"""Solvent scans: one molecule optimized in several dielectrics in one run.
+
+The first listed solvent is optimized from the input geometry. Every later
+solvent starts from the optimized geometry and converged density of the
+finished solvent whose PCM response is closest to its own, measured by the
+IEF-PCM screening factor (eps - 1) / eps, so water seeds DMSO and acetone,
+and chloroform seeds vacuum.
+
+All solvents share the molecule and basis. When the seed is the solvent
+that just finished, its SCF scanner is reused as is: only the PCM
+intermediates are rebuilt for the new dielectric, and the first SCF at the
+seed geometry runs on the DF tensors and grids already in memory. PySCF's
+scanner rebuilds those at every new geometry, so the reuse covers the seed
+geometry of each solvent, not the later optimizer steps.
+"""
+import os
+
+from autodft.app import build_mf, opti_PCM, resolve_backend, warm_scanner
+from autodft.results import HARTREE_TO_KJMOL, scf_cycles, write_csv
+
+# Static dielectric constants at 25 C (the Streamlit app's solvent list and its help text).
+SOLVENTS = {
+    "vacuum": 1.0,
+    "water": 78.5,
+    "dmso": 46.7,
+    "acetonitrile": 36.6,
+    "methanol": 32.7,
+    "ethanol": 24.3,
+    "acetone": 20.7,
+    "chloroform": 4.8,
+    "diethyl ether": 4.3,
+    "toluene": 2.4,
+    "benzene": 2.3,
+    "hexane": 1.9,
+}
+
+
+def parse_dielectrics(values):
+    """Parses solvent names and/or dielectric constants into [(label, eps)].
+
+    values is a list of strings; each may hold several comma-separated items,
+    e.g. ["water,dmso", "4.8"].
+    """
+    solvents = []
+    for value in values:
+        for item in value.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            name = item.lower().replace("_", " ")
+            if name in SOLVENTS:
+                label, eps = name, SOLVENTS[name]
+            else:
+                try:
+                    eps = float(item)
+                except ValueError:
+                    raise ValueError(f"Unknown solvent '{item}', expected a dielectric constant or one of "
+                                     f"{', '.join(SOLVENTS)}") from None
+                label = f"eps={eps:g}"
+            if eps < 1:
+                raise ValueError(f"Dielectric constant of '{item}' must be at least 1")
+            if label in (existing for existing, _ in solvents):
+                continue
+            solvents.append((label, eps))
+    if not solvents:
+        raise ValueError("no solvent given")
+    return solvents
+
+
+def screening_factor(eps):
+    return (eps - 1) / eps
+
+
+def scan_order(solvents):
+    """Orders [(label, eps)] for warm starts; returns [(label, eps, seed label or None)].
+
+    The first solvent starts cold; then the unfinished solvent closest to any
+    finished one (by screening factor) is next, seeded from that solvent.
+    """
+    order = [(solvents[0][0], solvents[0][1], None)]
+    done = [solvents[0]]
+    pending = list(solvents[1:])
+    while pending:
+        _, seed, nearest = min(
+            (abs(screening_factor(eps) - screening_factor(seed_eps)), seed_label, (label, eps))
+            for label, eps in pending for seed_label, seed_eps in done
+        )
+        pending.remove(nearest)
+        done.append(nearest)
+        order.append((nearest[0], nearest[1], seed))
+    return order
+
+
+def run_solvent_scan(mol, functional, solvents, xyz_base, backend="auto", settings=None, preopt="none",
+                     preopt_basis="sto-3g", molblock=None):
+    """Optimizes mol in every solvent of [(label, eps)]; returns one row per solvent, in input order.
+
+    The optimized geometry of each solvent is written to
+    '<xyz_base>_<label>.xyz'. Energies in the rows are relative to the first
+    listed solvent (list vacuum first to get solvation energies).
+    """
+    backend = resolve_backend(backend)
+    results = {}
+    rows = {}
+    last_label = None
+    for label, eps, seed in scan_order(solvents):
+        print(f"Solvent {label} (eps = {eps:g})" + (f", starting from {seed}" if seed else ""))
+        xyz_filename = f"{xyz_base}_{label.replace(' ', '_').replace('=', '')}.xyz"
+        seed_cycles = 0
+        if seed is None:
+            result = opti_PCM(mol, functional, eps, xyz_filename, backend=backend, preopt=preopt,
+                              preopt_basis=preopt_basis, molblock=molblock, settings=settings)
+        else:
+            previous = results[seed]
+            if seed == last_label:
+                # The last scanner's DF tensors and grids belong to the seed's final geometry.
+                mf = previous.scf
+                mf.with_solvent.eps = eps
+                mf.with_solvent.reset()
+            else:
+                mf = build_mf(previous.mol, functional, eps, backend, settings)
+            mf = warm_scanner(mf, previous.dm)
+            seed_cycles = getattr(mf, "cycles", 0)
+            result = opti_PCM(previous.mol, functional, eps, xyz_filename, backend=backend, settings=settings,
+                              mf=mf)
+        results[label] = result
+        last_label = label
+        cycles = scf_cycles(result.history)
+        rows[label] = {
+            "solvent": label,
+            "eps": eps,
+            "seed": seed,
+            "energy_hartree": result.energy_hartree,
+            "converged": bool(result.converged),
+            "steps": len(result.history),
+            "scf_cycles": None if cycles is None else cycles + seed_cycles,
+            "time": result.time,
+            "xyz_filename": xyz_filename,
+        }
+        # Only the last scanner can be reused; drop the others' DF tensors.
+        for other in results.values():
+            if other is not result:
+                other.scf = None
+
+    reference = rows[solvents[0][0]]["energy_hartree"]
+    for row in rows.values():
+        row["relative_kjmol"] = (row["energy_hartree"] - reference) * HARTREE_TO_KJMOL
+    return [rows[label] for label, _ in solvents]
+
+
+def print_scan_table(rows):
+    print(f"{'Solvent':<16}{'eps':>7}{'Energy (Hartree)':>19}{'dE (kJ/mol)':>13}{'Start from':>14}"
+          f"{'Steps':>7}{'SCF cycles':>12}{'Time (s)':>10}")
+    for row in rows:
+        cycles = "-" if row["scf_cycles"] is None else row["scf_cycles"]
+        flag = "" if row["converged"] else "  (not converged)"
+        print(f"{row['solvent']:<16}{row['eps']:>7.2f}{row['energy_hartree']:>19.8f}{row['relative_kjmol']:>13.2f}"
+              f"{row['seed'] or 'input':>14}{row['steps']:>7}{cycles:>12}{row['time']:>10.1f}{flag}")
+
+
+SCAN_FIELDS = ["solvent", "eps", "energy_hartree", "relative_kjmol", "converged", "seed", "steps", "scf_cycles",
+               "time", "xyz_filename"]
+
+
+def scan_sdf(sdf_file_path, dielectrics, functional="M06-2X", basis="def2-svpd", charge=0, output_dir=None,
+             backend="auto", max_memory=None, preopt="none", preopt_basis="sto-3g"):
+    """Runs a solvent scan on the first record of an SDF file; returns (rows, CSV path).
+
+    dielectrics is a list of solvent names and/or dielectric constants (see
+    parse_dielectrics). The table is also written to '<base>_solvents.csv'.
+    """
+    from rdkit import Chem
+    from pyscf import gto, lib
+    from autodft.app import PREOPT_METHODS, mol_to_atom_list
+
+    if preopt not in PREOPT_METHODS:
+        raise ValueError(f"Unknown pre-optimization '{preopt}', expected one of {', '.join(PREOPT_METHODS)}")
+    if not os.path.isfile(sdf_file_path):
+        raise FileNotFoundError(f"SDF file '{sdf_file_path}' not found")
+    solvents = parse_dielectrics(dielectrics)
+    rdmol = next(iter(Chem.SDMolSupplier(sdf_file_path, removeHs=False)), None)
+    if rdmol is None:
+        raise ValueError(f"No molecule could be read from '{sdf_file_path}'")
+
+    output_dir = output_dir or os.path.dirname(os.path.abspath(sdf_file_path))
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, os.path.splitext(os.path.basename(sdf_file_path))[0])
+    mol = gto.M(atom=mol_to_atom_list(rdmol), basis=basis, charge=charge, spin=0, verbose=4,
+                max_memory=max_memory or lib.param.MAX_MEMORY)
+    rows = run_solvent_scan(mol, functional, solvents, base, backend=backend, preopt=preopt,
+                            preopt_basis=preopt_basis, molblock=Chem.MolToMolBlock(rdmol))
+    csv_path = f"{base}_solvents.csv"
+    write_csv(csv_path, rows, SCAN_FIELDS)
+    return rows, csv_path
@@ -0,0 +1,159 @@
+"""Append-only HDF5 store for batch results.
+
+One file holds every optimized molecule of any number of batches:
+
+    /molecules/<id>/<run>/   one group per run of a molecule ID (0, 1, ...)
+        symbols              element symbols
+        coords               optimized geometry (natm, 3), Angstrom
+        gradient             final gradient (natm, 3), Hartree/Bohr
+        trajectory           geometry of every optimizer step (nsteps, natm, 3), Angstrom
+        attrs                energy_hartree (full precision), converged, time,
+                             method metadata, and JSON-encoded history, thermo
+                             and settings
+
+Runs are only ever added, never rewritten: optimizing a molecule again adds
+a run under the same ID, and get() returns the latest one unless asked for
+another. IDs are the XYZ file stems of the batch ('<sdf name>_<n>'), so a
+molecule is read with a single group lookup. Cached records have no gradient
+or trajectory; a duplicate record (duplicate_of) holds its representative's
+geometry, gradient and trajectory in its own atom order.
+"""
+import json
+import time
+
+import numpy as np
+
+STORE_FORMAT = "autodft-results"
+STORE_VERSION = 1
+# Attributes written as JSON because HDF5 attributes cannot hold nested data.
+JSON_ATTRS = ("history", "thermo", "settings")
+
+
+class ResultStore:
+    def __init__(self, path, mode="a"):
+        import h5py
+
+        self.path = path
+        self.file = h5py.File(path, mode)
+        if mode != "r" and "molecules" not in self.file:
+            self.file.attrs["format"] = STORE_FORMAT
+            self.file.attrs["version"] = STORE_VERSION
+            self.file.create_group("molecules")
+        elif self.file.attrs.get("format") != STORE_FORMAT:
+            raise ValueError(f"'{path}' is not an autodft results store")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def __contains__(self, mol_id):
+        return mol_id in self.file["molecules"]
+
+    def __len__(self):
+        return len(self.file["molecules"])
+
+    def ids(self):
+        return list(self.file["molecules"])
+
+    def runs(self, mol_id):
+        return sorted(int(run) for run in self.file["molecules"][mol_id])
+
+    def append(self, mol_id, atoms, energy_hartree, converged, gradient=None, trajectory=None, molblock=None,
+               **metadata):
+        """Adds a run of mol_id; atoms is [(symbol, (x, y, z)), ...] in Angstrom. Returns the run number.
+
+        metadata values must be scalars or strings, except for the
+        JSON_ATTRS keys (history, thermo, settings), which may be any
+        JSON-serializable value; None values are skipped.
+        """
+        if not mol_id or "/" in mol_id:
+            raise ValueError(f"Invalid molecule ID '{mol_id}'")
+        import h5py
+
+        molecule = self.file["molecules"].require_group(mol_id)
+        run = max((int(name) for name in molecule), default=-1) + 1
+        group = molecule.create_group(str(run))
+        group.create_dataset("symbols", data=[symbol for symbol, _ in atoms], dtype=h5py.string_dtype())
+        group.create_dataset("coords", data=np.array([coords for _, coords in atoms], dtype=float))
+        if gradient is not None:
+            group.create_dataset("gradient", data=np.asarray(gradient, dtype=float))
+        if trajectory is not None and len(trajectory):
+            group.create_dataset("trajectory", data=np.asarray(trajectory, dtype=float), compression="gzip")
+        group.attrs["energy_hartree"] = float(energy_hartree)
+        group.attrs["converged"] = bool(converged)
+        group.attrs["created"] = time.time()
+        if molblock:
+            group.attrs["molblock"] = molblock
+        for key, value in metadata.items():
+            if value is None:
+                continue
+            group.attrs[key] = json.dumps(value) if key in JSON_ATTRS else value
+        self.file.flush()
+        return run
+
+    def get(self, mol_id, run=-1):
+        """Reads one run of mol_id (the latest by default) as a dict."""
+        if mol_id not in self:
+            raise KeyError(f"Molecule '{mol_id}' is not in '{self.path}'")
+        runs = self.runs(mol_id)
+        run = runs[run] if run < 0 else run
+        group = self.file["molecules"][mol_id][str(run)]
+        symbols = [symbol.decode() if isinstance(symbol, bytes) else symbol for symbol in group["symbols"][()]]
+        record = {"id": mol_id, "run": run,
+                  "atoms": [(symbol, tuple(coords)) for symbol, coords in zip(symbols, group["coords"][()].tolist())]}
+        for name in ("gradient", "trajectory"):
+            record[name] = group[name][()] if name in group else None
+        for key, value in group.attrs.items():
+            if isinstance(value, np.generic):
+                value = value.item()
+            record[key] = json.loads(value) if key in JSON_ATTRS else value
+        return record
+
+    def __iter__(self):
+        """Yields the latest run of every molecule, in ID order."""
+        for mol_id in self.ids():
+            yield self.get(mol_id)
+
+
+def export_xyz(records, path):
+    """Writes records as a multi-frame XYZ file with the full-precision energy and ID in each comment line."""
+    with open(path, "w") as f:
+        for record in records:
+            f.write(f"{len(record['atoms'])}\n")
+            f.write(f"{record['id']} run={record['run']} energy={record['energy_hartree']:.10f} Hartree "
+                    f"converged={record['converged']}\n")
+            for symbol, coords in record["atoms"]:
+                f.write(f"{symbol} {' '.join(f'{c:.8f}' for c in coords)}\n")
+
+
+def export_sdf(records, path):
+    """Writes records as SDF with the optimized coordinates; records without a molblock have no bonds."""
+    from rdkit import Chem
+    from rdkit.Geometry import Point3D
+
+    with Chem.SDWriter(path) as writer:
+        for record in records:
+            if record.get("molblock"):
+                mol = Chem.MolFromMolBlock(record["molblock"], removeHs=False)
+            else:
+                mol = Chem.RWMol()
+                for symbol, _ in record["atoms"]:
+                    mol.AddAtom(Chem.Atom(symbol))
+                mol = mol.GetMol()
+                mol.AddConformer(Chem.Conformer(mol.GetNumAtoms()), assignId=True)
+            conformer = mol.GetConformer()
+            for i, (_, coords) in enumerate(record["atoms"]):
+                conformer.SetAtomPosition(i, Point3D(*coords))
+            mol.SetProp("_Name", record["id"])
+            mol.SetDoubleProp("autodft_energy_hartree", record["energy_hartree"])
+            mol.SetIntProp("autodft_converged", int(record["converged"]))
+            mol.SetIntProp("autodft_run", record["run"])
+            for key in ("functional", "basis", "eps"):
+                if key in record:
+                    mol.SetProp(f"autodft_{key}", str(record[key]))
+            writer.write(mol)
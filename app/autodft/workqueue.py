@@ -0,0 +1,409 @@
+"""Shared-filesystem work queue for spreading one batch over several machines.
+
+init_queue splits an SDF file into one job per record in a directory that
+every node mounts (NFS or similar). Any number of workers (`run_opt
+queue-work`), on any nodes, then run jobs until every job has a result:
+
+    queue.json          batch settings; written last, so its presence marks a complete queue
+    jobs/<n>.json       the job of record n (see autodft.app.make_job)
+    leases/<n>.lease    held by the worker running job n
+    attempts/<n>.<k>    present once attempt k of job n has started
+    results/<n>.json    the result of job n (see autodft.app.run_jobs); present once it is done
+    xyz/                optimized geometries, and the checkpoints of running jobs
+    guesses/            converged densities shared by conformers (see autodft.guess)
+
+A worker claims a job by creating its lease with O_CREAT | O_EXCL, which only
+one worker can win, and keeps it by touching the lease every heartbeat
+seconds while the job runs. A lease not touched for lease_seconds belongs to
+a dead worker: another worker renames it away (only one rename succeeds) and
+runs the job again with the next attempt number, resuming from the job's
+checkpoint. Attempt numbers come from the attempts/ markers rather than the
+lease, so a worker that claims the job while the expired lease is moved
+away still counts the dead attempts. Lease ages are measured against the file server's clock, not the
+node's, so clock skew between nodes does not matter. A job whose lease
+expired MAX_ATTEMPTS times gets an error result instead of another attempt,
+so a record that kills its worker (e.g. out of memory) cannot stall the queue.
+
+Results are published with os.link, which fails if the file exists, so when a
+job was run twice the first result wins.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+
+from autodft.results import write_json
+
+QUEUE_FILE = "queue.json"
+JOBS = "jobs"
+LEASES = "leases"
+RESULTS = "results"
+ATTEMPTS = "attempts"
+OUTPUT = "xyz"
+GUESSES = "guesses"
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_HEARTBEAT = 30.0
+MAX_ATTEMPTS = 3
+# Method settings of a queue's jobs unless init_queue is given others.
+JOB_DEFAULTS = {"functional": "M06-2X", "basis": "def2-svpd", "charge": 0, "eps": 78.5, "backend": "auto",
+                "max_memory": None, "preopt": "none", "preopt_basis": "sto-3g", "single_point": False,
+                "adaptive": False}
+STATUS_FIELDS = ["job", "name", "state", "worker", "attempt", "energy_hartree", "converged", "time",
+                 "scf_cycles_saved", "error"]
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _path(queue_dir, kind, job_id):
+    suffix = ".lease" if kind == LEASES else ".json"
+    return os.path.join(queue_dir, kind, f"{job_id}{suffix}")
+
+
+def read_queue(queue_dir):
+    path = os.path.join(queue_dir, QUEUE_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"'{queue_dir}' is not a work queue (no {QUEUE_FILE})")
+    return _read_json(path)
+
+
+def job_ids(queue_dir):
+    return sorted((name[:-len(".json")] for name in os.listdir(os.path.join(queue_dir, JOBS))
+                   if name.endswith(".json")), key=int)
+
+
+def init_queue(queue_dir, sdf_file_path, conformer_guess=True, **options):
+    """Seeds queue_dir with one job per record of an SDF file; returns the number of jobs.
+
+    options override the method settings of JOB_DEFAULTS (see
+    autodft.app.make_job). With conformer_guess, jobs with the same atom list
+    start from each other's converged densities, on whichever node they run.
+    """
+    from autodft.app import BACKENDS, PREOPT_METHODS, batch_xyz_filenames, iter_sdf_records, make_job
+
+    options = dict(JOB_DEFAULTS, **options)
+    if options["backend"] not in BACKENDS:
+        raise ValueError(f"Unknown backend '{options['backend']}', expected one of {', '.join(BACKENDS)}")
+    if options["preopt"] not in PREOPT_METHODS:
+        raise ValueError(f"Unknown pre-optimization '{options['preopt']}', expected one of {', '.join(PREOPT_METHODS)}")
+    if os.path.exists(os.path.join(queue_dir, QUEUE_FILE)):
+        raise FileExistsError(f"'{queue_dir}' already holds a work queue")
+    if not os.path.isfile(sdf_file_path):
+        raise FileNotFoundError(f"SDF file '{sdf_file_path}' not found")
+    records = list(iter_sdf_records(sdf_file_path))
+    if not records:
+        raise ValueError(f"No molecules found in '{sdf_file_path}'")
+    for kind in (JOBS, LEASES, RESULTS, ATTEMPTS, OUTPUT):
+        os.makedirs(os.path.join(queue_dir, kind), exist_ok=True)
+    for (index, name, rdmol), xyz_name in zip(records, batch_xyz_filenames(sdf_file_path, len(records))):
+        # XYZ paths are relative to the queue so nodes may mount it in different places. Every
+        # attempt resumes from the checkpoint an earlier, dead attempt left behind.
+        job = make_job(index, name, rdmol, os.path.join(OUTPUT, xyz_name), checkpoint=True, resume=True,
+                       events=None, profile=False, guess_dir=GUESSES if conformer_guess else None, **options)
+        write_json(_path(queue_dir, JOBS, index), job)
+    write_json(os.path.join(queue_dir, QUEUE_FILE), {"sdf_file": os.path.abspath(sdf_file_path),
+                                                      "jobs": len(records), "options": options,
+                                                      "created": time.time()})
+    return len(records)
+
+
+def filesystem_time(queue_dir):
+    """The file server's current time: the mtime of a probe file created in the queue."""
+    path = os.path.join(queue_dir, LEASES, f".clock-{uuid.uuid4().hex}")
+    with open(path, "w"):
+        pass
+    try:
+        return os.stat(path).st_mtime
+    finally:
+        os.remove(path)
+
+
+def read_lease(path):
+    """Reads a lease as a dict with its 'mtime'; None when there is none.
+
+    A lease that is still being written (or whose writer died before it
+    finished) reads as an unknown worker's first attempt.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+        with open(path) as f:
+            lease = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        lease = {}
+    return {"worker": lease.get("worker", "unknown"), "attempt": lease.get("attempt", 1),
+            "token": lease.get("token"), "mtime": mtime}
+
+
+class Lease:
+    """A job claimed by this worker; renew() is the heartbeat."""
+
+    def __init__(self, queue_dir, job_id, worker_id, attempt):
+        self.queue_dir = queue_dir
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.attempt = attempt
+        self.token = uuid.uuid4().hex
+        self.path = _path(queue_dir, LEASES, job_id)
+
+    @classmethod
+    def create(cls, queue_dir, job_id, worker_id, attempt=1):
+        """Claims job_id; returns the Lease, or None when another worker holds it."""
+        lease = cls(queue_dir, job_id, worker_id, attempt)
+        try:
+            fd = os.open(lease.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w") as f:
+            json.dump({"worker": worker_id, "attempt": attempt, "token": lease.token, "host": socket.gethostname(),
+                       "pid": os.getpid(), "claimed": time.time()}, f)
+        return lease
+
+    def held(self):
+        current = read_lease(self.path)
+        return current is not None and current["token"] == self.token
+
+    def renew(self):
+        """Touches the lease; returns False when it was lost (taken over after it expired)."""
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            return False
+        return self.held()
+
+    def release(self):
+        if self.held():
+            if not os.path.exists(_path(self.queue_dir, RESULTS, self.job_id)):
+                # Given back unfinished (e.g. on Ctrl-C) rather than lost with a dead worker.
+                _remove(_attempt_path(self.queue_dir, self.job_id, self.attempt))
+            os.remove(self.path)
+
+
+class Heartbeat:
+    """Renews a lease every interval seconds from a background thread while a job runs."""
+
+    def __init__(self, lease, interval):
+        self.lease = lease
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.lease.renew():
+                self.lost = True
+                print(f"Job {self.lease.job_id}: lease lost; another worker has taken the job over", flush=True)
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def publish_result(queue_dir, job_id, result):
+    """Writes the result of a job unless it already has one; returns whether this result was written."""
+    path = _path(queue_dir, RESULTS, job_id)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f, default=float)
+    try:
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+
+def _attempt_path(queue_dir, job_id, attempt):
+    return os.path.join(queue_dir, ATTEMPTS, f"{job_id}.{attempt}")
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def attempts_started(queue_dir, job_id):
+    """Number of attempts of a job that were started and not given back."""
+    attempt = 0
+    while os.path.exists(_attempt_path(queue_dir, job_id, attempt + 1)):
+        attempt += 1
+    return attempt
+
+
+def _claim(queue_dir, job_id, worker_id, previous=0):
+    """Leases job_id for the attempt after the started ones (at least previous + 1); None when it is held.
+
+    Once MAX_ATTEMPTS attempts have started, the job gets an error result
+    instead of another attempt; holding the lease makes sure none is running.
+    """
+    attempt = max(attempts_started(queue_dir, job_id), previous) + 1
+    lease = Lease.create(queue_dir, job_id, worker_id, attempt)
+    if lease is None:
+        return None
+    if attempt > MAX_ATTEMPTS:
+        job = _read_json(_path(queue_dir, JOBS, job_id))
+        publish_result(queue_dir, job_id, {"index": job["index"], "name": job["name"],
+                                           "xyz_filename": job["xyz_filename"], "attempt": attempt - 1,
+                                           "error": f"abandoned after {MAX_ATTEMPTS} attempts whose workers died"})
+        os.remove(lease.path)
+        return None
+    os.makedirs(os.path.join(queue_dir, ATTEMPTS), exist_ok=True)
+    with open(_attempt_path(queue_dir, job_id, attempt), "w") as f:
+        f.write(worker_id)
+    return lease
+
+
+def _take_over(queue_dir, job_id, stale, worker_id, now, lease_seconds):
+    path = _path(queue_dir, LEASES, job_id)
+    moved = f"{path}.expired-{worker_id}"
+    try:
+        os.rename(path, moved)
+    except FileNotFoundError:
+        # Another worker took it over first.
+        return None
+    taken = read_lease(moved)
+    if taken is None or taken["token"] != stale["token"] or now - taken["mtime"] <= lease_seconds:
+        # The lease was renewed or replaced since it was read: put the live lease back.
+        try:
+            os.link(moved, path)
+        except FileExistsError:
+            pass
+        os.remove(moved)
+        return None
+    os.remove(moved)
+    print(f"Job {job_id}: lease of worker {stale['worker']} expired after {now - stale['mtime']:.0f} s", flush=True)
+    return _claim(queue_dir, job_id, worker_id, stale["attempt"])
+
+
+def claim_next(queue_dir, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Claims the first job with neither a result nor a live lease; returns its Lease, or None."""
+    now = filesystem_time(queue_dir)
+    for job_id in job_ids(queue_dir):
+        if os.path.exists(_path(queue_dir, RESULTS, job_id)):
+            continue
+        lease = _claim(queue_dir, job_id, worker_id)
+        if lease is None:
+            stale = read_lease(_path(queue_dir, LEASES, job_id))
+            if stale is None or now - stale["mtime"] <= lease_seconds:
+                continue
+            lease = _take_over(queue_dir, job_id, stale, worker_id, now, lease_seconds)
+        # The job may have finished between the result check and the claim.
+        if lease is not None and os.path.exists(_path(queue_dir, RESULTS, job_id)):
+            lease.release()
+            continue
+        if lease is not None:
+            return lease
+    return None
+
+
+def run_claimed(queue_dir, lease, heartbeat=DEFAULT_HEARTBEAT, use_cache=True, cache_dir=None):
+    """Runs the job of a lease while renewing it, publishes its result and releases the lease; returns the result."""
+    from autodft.app import run_jobs
+
+    job = _read_json(_path(queue_dir, JOBS, lease.job_id))
+    xyz_filename = job["xyz_filename"]
+    job["xyz_filename"] = os.path.join(queue_dir, xyz_filename)
+    if job.get("guess_dir"):
+        job["guess_dir"] = os.path.join(queue_dir, job["guess_dir"])
+    try:
+        with Heartbeat(lease, heartbeat):
+            try:
+                result = run_jobs([job], use_cache=use_cache, cache_dir=cache_dir)[0]
+            except Exception as e:
+                result = {"index": job["index"], "name": job["name"], "error": str(e)}
+        result = dict(result, xyz_filename=xyz_filename, worker=lease.worker_id, attempt=lease.attempt)
+        result["published"] = publish_result(queue_dir, lease.job_id, result)
+    finally:
+        # Also on Ctrl-C, so the job can be claimed again at once instead of after the lease expires.
+        lease.release()
+    return result
+
+
+def pending(queue_dir):
+    """Number of jobs without a result."""
+    return sum(not os.path.exists(_path(queue_dir, RESULTS, job_id)) for job_id in job_ids(queue_dir))
+
+
+def work(queue_dir, worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS, heartbeat=DEFAULT_HEARTBEAT,
+         poll_interval=10.0, max_jobs=None, threads=None, use_cache=True, cache_dir=None):
+    """Runs jobs of the queue until every job has a result (or max_jobs have run); returns the number run.
+
+    While the remaining jobs are leased by other workers, the worker waits, so
+    it can take over the jobs of any worker that dies.
+    """
+    from autodft.batch import thread_budget, worker_threads
+
+    if heartbeat >= lease_seconds:
+        raise ValueError(f"heartbeat ({heartbeat} s) must be shorter than the lease ({lease_seconds} s)")
+    info = read_queue(queue_dir)
+    worker_id = worker_id or default_worker_id()
+    print(f"Worker {worker_id} on '{queue_dir}' ({info['jobs']} jobs, lease {lease_seconds:.0f} s, "
+          f"heartbeat {heartbeat:.0f} s)", flush=True)
+    done = 0
+    with worker_threads(thread_budget(1, threads)):
+        while max_jobs is None or done < max_jobs:
+            lease = claim_next(queue_dir, worker_id, lease_seconds)
+            if lease is None:
+                if not pending(queue_dir):
+                    break
+                time.sleep(poll_interval)
+                continue
+            print(f"Job {lease.job_id}: running (attempt {lease.attempt})", flush=True)
+            result = run_claimed(queue_dir, lease, heartbeat, use_cache=use_cache, cache_dir=cache_dir)
+            outcome = f"failed: {result['error']}" if "error" in result else f"{result['energy_hartree']:.8f} Hartree"
+            if not result["published"]:
+                outcome += " (discarded, another worker finished it first)"
+            print(f"Job {lease.job_id}: {outcome}", flush=True)
+            done += 1
+    print(f"Worker {worker_id}: {done} jobs run, {pending(queue_dir)} left in the queue", flush=True)
+    return done
+
+
+def queue_status(queue_dir, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """One row per job: state is pending, running, expired (lease not renewed), done or failed."""
+    now = filesystem_time(queue_dir)
+    rows = []
+    for job_id in job_ids(queue_dir):
+        job = _read_json(_path(queue_dir, JOBS, job_id))
+        row = {"job": job_id, "name": job["name"], "state": "pending"}
+        result_path = _path(queue_dir, RESULTS, job_id)
+        lease = read_lease(_path(queue_dir, LEASES, job_id))
+        if os.path.exists(result_path):
+            result = _read_json(result_path)
+            row.update({key: result.get(key) for key in STATUS_FIELDS[3:]})
+            row["state"] = "failed" if result.get("error") else "done"
+        elif lease is not None:
+            row.update(worker=lease["worker"], attempt=lease["attempt"],
+                       state="expired" if now - lease["mtime"] > lease_seconds else "running")
+        rows.append(row)
+    return rows
+
+
+def collect(queue_dir):
+    """Returns (jobs, results) in record order; results of unfinished jobs are None."""
+    jobs, results = [], []
+    for job_id in job_ids(queue_dir):
+        job = _read_json(_path(queue_dir, JOBS, job_id))
+        job["xyz_filename"] = os.path.join(queue_dir, job["xyz_filename"])
+        jobs.append(job)
+        result_path = _path(queue_dir, RESULTS, job_id)
+        results.append(_read_json(result_path) if os.path.exists(result_path) else None)
+    return jobs, results
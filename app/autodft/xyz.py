@@ -0,0 +1,88 @@
+import numpy as np
+from rdkit import Chem
+
+# Two atoms are bonded when their distance is below the sum of their covalent
+# radii plus this tolerance (Angstrom), the same rule Open Babel uses.
+BOND_TOLERANCE = 0.45
+# Up to this many atoms a dense distance matrix is cheapest; above it a
+# KD-tree keeps bond perception close to linear.
+DENSE_LIMIT = 256
+
+
+def covalent_radii(symbols):
+    table = Chem.GetPeriodicTable()
+    return np.array([table.GetRcovalent(symbol) for symbol in symbols])
+
+
+def find_bonds(symbols, positions, tolerance=BOND_TOLERANCE):
+    """Returns an (n_bonds, 2) array of atom index pairs (i < j) within bonding distance."""
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    radii = covalent_radii(symbols)
+    if len(radii) < 2:
+        return np.empty((0, 2), dtype=int)
+
+    if len(radii) <= DENSE_LIMIT:
+        i, j = np.triu_indices(len(radii), k=1)
+    else:
+        from scipy.spatial import cKDTree
+        cutoff = 2 * radii.max() + tolerance
+        pairs = cKDTree(positions).query_pairs(cutoff, output_type='ndarray')
+        if len(pairs) == 0:
+            return np.empty((0, 2), dtype=int)
+        i, j = pairs[:, 0], pairs[:, 1]
+
+    distances = np.linalg.norm(positions[i] - positions[j], axis=1)
+    bonded = distances < radii[i] + radii[j] + tolerance
+    return np.column_stack((i[bonded], j[bonded]))
+
+
+def iter_xyz_frames(content):
+    """Yields (comment, symbols, positions) for every frame of a (multi-frame) XYZ text."""
+    lines = iter(content.splitlines())
+    for line in lines:
+        if not line.strip():
+            continue
+        num_atoms = int(line.strip())
+        comment = next(lines, "")
+        symbols = []
+        positions = np.empty((num_atoms, 3))
+        for i in range(num_atoms):
+            parts = next(lines).split()
+            symbols.append(parts[0])
+            positions[i] = [float(x) for x in parts[1:4]]
+        yield comment, symbols, positions
+
+
+def frame_to_mol(symbols, positions):
+    """Builds a sanitized RDKit molecule with single bonds from perceived connectivity."""
+    mol = Chem.RWMol()
+    conformer = Chem.Conformer(len(symbols))
+    for i, (symbol, position) in enumerate(zip(symbols, positions)):
+        mol.AddAtom(Chem.Atom(symbol))
+        conformer.SetAtomPosition(i, position.tolist())
+    mol.AddConformer(conformer, assignId=True)
+
+    for i, j in find_bonds(symbols, positions):
+        mol.AddBond(int(i), int(j), Chem.BondType.SINGLE)
+
+    Chem.SanitizeMol(mol)
+    return mol
+
+
+def read_xyz_content(content: str) -> Chem.Mol:
+    """Reads XYZ content, adds bonds based on covalent radii, and returns an RDKit molecule."""
+    frame = next(iter_xyz_frames(content), None)
+    if frame is None:
+        raise ValueError("Could not parse XYZ content.")
+    comment, symbols, positions = frame
+    return frame_to_mol(symbols, positions)
+
+
+def read_xyz_frames(content: str) -> list[Chem.Mol]:
+    """Reads every frame of a multi-frame XYZ text; each molecule keeps its comment line as '_Name'."""
+    mols = []
+    for comment, symbols, positions in iter_xyz_frames(content):
+        mol = frame_to_mol(symbols, positions)
+        mol.SetProp("_Name", comment.strip())
+        mols.append(mol)
+    return mols
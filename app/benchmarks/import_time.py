@@ -0,0 +1,92 @@
+"""Startup benchmark: how long `import autodft.app` and `run_opt --help` take.
+
+Each measurement runs in a fresh interpreter so nothing is cached between
+runs. The median of --repeat runs is compared with the stored baseline and the
+script exits non-zero when any measurement is slower than the baseline by more
+than --threshold (a fraction, default 0.5 = 50 %).
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --update-baseline
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "import_time.json")
+
+MEASUREMENTS = {
+    "import autodft.app": [sys.executable, "-c", "import autodft.app"],
+    "run_opt --help": [sys.executable, "-m", "autodft.app", "--help"],
+}
+
+# Modules that must not be loaded by `import autodft.app`.
+HEAVY_MODULES = ("rdkit", "pyscf", "geometric", "gpu4pyscf", "cupy")
+
+
+def time_command(command, repeat):
+    timings = []
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [APP_DIR, os.environ.get("PYTHONPATH")])))
+    for _ in range(repeat):
+        code = ("import time, subprocess, sys; start = time.perf_counter(); "
+                "subprocess.run(sys.argv[1:], check=True, stdout=subprocess.DEVNULL); "
+                "print(time.perf_counter() - start)")
+        out = subprocess.run([sys.executable, "-c", code, *command], env=env, check=True,
+                             capture_output=True, text=True).stdout
+        timings.append(float(out.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def heavy_modules_loaded():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [APP_DIR, os.environ.get("PYTHONPATH")])))
+    code = ("import sys, autodft.app; "
+            f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+    return out.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = {name: time_command(command, args.repeat) for name, command in MEASUREMENTS.items()}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failed = False
+    print(f"{'Measurement':<24}{'Median (s)':>12}{'Baseline (s)':>14}")
+    for name, seconds in results.items():
+        reference = baseline.get(name)
+        flag = ""
+        if reference is not None and seconds > reference * (1 + args.threshold):
+            flag = "  REGRESSION"
+            failed = True
+        reference_text = "-" if reference is None else f"{reference:.3f}"
+        print(f"{name:<24}{seconds:>12.3f}{reference_text:>14}{flag}")
+
+    loaded = heavy_modules_loaded()
+    if loaded:
+        print(f"`import autodft.app` loads heavy modules: {', '.join(loaded)}")
+        failed = True
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({name: round(seconds, 3) for name, seconds in results.items()}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
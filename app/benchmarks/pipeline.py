@@ -0,0 +1,182 @@
+"""Pipeline benchmark: opti_PCM on the CPU backend over a ladder of molecule sizes.
+
+Every molecule runs in a fresh interpreter so its peak RSS is its own. For
+each one the script records the exclusive wall time of every stage (DF
+integrals, grids, PCM, SCF, gradients, optimizer overhead), the SCF cycle and
+geometry step counts and the peak RSS, writes them to --output and compares
+them with the stored baseline of the same preset. It exits non-zero when a
+total time, stage time, count or peak RSS exceeds the baseline by more than
+--threshold (a fraction, default 0.25 = 25 %).
+
+    python benchmarks/pipeline.py --max-heavy-atoms 15
+    python benchmarks/pipeline.py --preset small --update-baseline
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+BASELINE = os.path.join(BENCH_DIR, "baselines", "pipeline.json")
+
+# (name, SDF path relative to app/, heavy atoms), smallest first.
+MOLECULES = (
+    ("ethanol", "auto-dft-nextjs/uploads/ethanol.sdf", 3),
+    ("rep_of_cluster_1", "auto-dft-nextjs/rep_of_cluster_1.sdf", 5),
+    ("caffeine", "benchmarks/molecules/caffeine.sdf", 14),
+    ("testosterone", "benchmarks/molecules/testosterone.sdf", 21),
+    ("imatinib", "benchmarks/molecules/imatinib.sdf", 37),
+    ("erythromycin", "benchmarks/molecules/erythromycin.sdf", 51),
+)
+
+# Reduced basis/grid settings so the ladder runs on a CPU in reasonable time.
+# Both keep the production hybrid functional: a pure functional takes PySCF's
+# J-only DF path and never builds the 3-index tensor.
+PRESETS = {
+    "tiny": {
+        "functional": "M06-2X",
+        "basis": "sto-3g",
+        "settings": {"atom_grid": (50, 194), "lebedev_order": 17, "conv_tol": 1e-7,
+                     "conv_tol_grad": 1e-3, "max_cycle": 50},
+    },
+    "small": {
+        "functional": "M06-2X",
+        "basis": "6-31g",
+        "settings": {"atom_grid": (75, 302), "lebedev_order": 23, "conv_tol": 1e-8,
+                     "conv_tol_grad": 3e-4, "max_cycle": 70},
+    },
+}
+# Stages faster than this (seconds) are too noisy to flag.
+MIN_STAGE_TIME = 0.5
+COUNTS = ("scf_cycles", "steps")
+
+
+def run_one(name, preset, threads):
+    """Runs one molecule in this process and prints its result as JSON."""
+    from pyscf import gto, lib
+    from autodft.app import get_atom_list, opti_PCM
+    from autodft.profiling import Profiler, peak_rss_mb
+
+    if threads:
+        lib.num_threads(threads)
+    path = next(os.path.join(APP_DIR, sdf) for mol_name, sdf, _ in MOLECULES if mol_name == name)
+    config = PRESETS[preset]
+    mol = gto.M(atom=get_atom_list(path), basis=config["basis"], charge=0, spin=0, verbose=0)
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            with Profiler() as profiler:
+                result = opti_PCM(mol, config["functional"], 78.5, os.path.join(tmp, f"{name}.xyz"),
+                                  backend="cpu", settings=config["settings"])
+        finally:
+            sys.stdout = stdout
+
+    summary = profiler.summary()
+    print(json.dumps({
+        "atoms": mol.natm,
+        "nao": mol.nao_nr(),
+        "total": round(result.time, 3),
+        "stages": {stage: entry["wall"] for stage, entry in summary["stages"].items()},
+        "scf_cycles": summary["counters"]["scf_cycles"],
+        "steps": len(result.history),
+        "converged": bool(result.converged),
+        "energy_hartree": result.energy_hartree,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }))
+
+
+def run_isolated(name, preset, threads):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [APP_DIR, os.environ.get("PYTHONPATH")])))
+    command = [sys.executable, os.path.abspath(__file__), "--run-one", name, "--preset", preset]
+    if threads:
+        command += ["--threads", str(threads)]
+    out = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def regressions(result, reference, threshold):
+    """Yields a description of every measurement that is worse than reference by more than threshold."""
+    limit = 1 + threshold
+    if result["total"] > reference["total"] * limit:
+        yield f"total {result['total']:.1f} s vs {reference['total']:.1f} s"
+    for stage, seconds in result["stages"].items():
+        base = reference["stages"].get(stage)
+        if base is not None and max(seconds, base) >= MIN_STAGE_TIME and seconds > base * limit:
+            yield f"{stage} {seconds:.1f} s vs {base:.1f} s"
+    for count in COUNTS:
+        if result[count] > reference[count] * limit:
+            yield f"{count} {result[count]} vs {reference[count]}"
+    if result["peak_rss_mb"] > reference["peak_rss_mb"] * limit:
+        yield f"peak RSS {result['peak_rss_mb']:.0f} MB vs {reference['peak_rss_mb']:.0f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="tiny")
+    parser.add_argument("--molecules", nargs="+", choices=[name for name, _, _ in MOLECULES])
+    parser.add_argument("--max-heavy-atoms", type=int)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--output", default="pipeline_results.json")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_one(args.run_one, args.preset, args.threads)
+        return 0
+
+    names = [name for name, _, heavy in MOLECULES
+             if (not args.molecules or name in args.molecules)
+             and (args.max_heavy_atoms is None or heavy <= args.max_heavy_atoms)]
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(args.preset, {})
+
+    results = {}
+    failed = False
+    print(f"{'Molecule':<18}{'Atoms':>6}{'Total (s)':>11}{'SCF (s)':>9}{'Grad (s)':>10}"
+          f"{'Cycles':>8}{'Steps':>7}{'RSS (MB)':>10}")
+    for name in names:
+        result = results[name] = run_isolated(name, args.preset, args.threads)
+        print(f"{name:<18}{result['atoms']:>6}{result['total']:>11.1f}{result['stages']['scf']:>9.1f}"
+              f"{result['stages']['gradient']:>10.1f}{result['scf_cycles']:>8}{result['steps']:>7}"
+              f"{result['peak_rss_mb']:>10.0f}", flush=True)
+        if name in baseline:
+            for message in regressions(result, baseline[name], args.threshold):
+                print(f"  REGRESSION {message}")
+                failed = True
+
+    report = {
+        "preset": args.preset,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "threads": args.threads,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.update_baseline:
+        baselines[args.preset] = dict(baseline, **results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+from autodft.batch import pick_next
+
+
+def test_pick_next_without_a_budget_takes_the_first_job():
+    assert pick_next([2, 0, 1], None, 0) == 2
+
+
+def test_pick_next_skips_jobs_that_do_not_fit():
+    memory_mb = {0: 800, 1: 300, 2: 100}
+    assert pick_next([0, 1, 2], memory_mb, used_mb=600, memory_budget_mb=1000) == 1
+    assert pick_next([0, 1, 2], memory_mb, used_mb=800, memory_budget_mb=1000) == 2
+
+
+def test_pick_next_waits_while_nothing_fits():
+    memory_mb = {0: 800, 1: 900}
+    assert pick_next([0, 1], memory_mb, used_mb=500, memory_budget_mb=1000) is None
+
+
+def test_pick_next_starts_an_oversized_job_when_idle():
+    memory_mb = {0: 2000, 1: 1500}
+    assert pick_next([0, 1], memory_mb, used_mb=0, memory_budget_mb=1000) is None
+    assert pick_next([0, 1], memory_mb, used_mb=0, memory_budget_mb=1000, idle=True) == 0
+    assert pick_next([], memory_mb, used_mb=0, memory_budget_mb=1000, idle=True) is None
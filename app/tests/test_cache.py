@@ -0,0 +1,41 @@
+from autodft.app import job_cache_key
+
+JOB = {
+    "atom_list": [["O", [0.0, 0.0, 0.1173]], ["H", [0.0, 0.7572, -0.4692]], ["H", [0.0, -0.7572, -0.4692]]],
+    "functional": "PBE0",
+    "basis": "def2-SVP",
+    "charge": 0,
+    "eps": 78.3553,
+    "preopt": "ff",
+    "preopt_basis": "sto-3g",
+    "single_point": False,
+}
+
+
+def test_key_ignores_case_and_coordinate_noise():
+    job = dict(JOB, functional="pbe0", basis="DEF2-SVP",
+               atom_list=[[symbol, [c + 1e-6 for c in coords]] for symbol, coords in JOB["atom_list"]])
+    assert job_cache_key(job) == job_cache_key(JOB)
+
+
+def test_key_ignores_preopt_basis_unless_preoptimizing_with_dft():
+    assert job_cache_key(dict(JOB, preopt_basis="6-31g")) == job_cache_key(JOB)
+    dft = dict(JOB, preopt="dft")
+    assert job_cache_key(dict(dft, preopt_basis="6-31g")) != job_cache_key(dft)
+
+
+def test_key_changes_with_method_and_geometry():
+    key = job_cache_key(JOB)
+    moved = [JOB["atom_list"][0], ["H", [0.0, 0.80, -0.4692]], JOB["atom_list"][2]]
+    for changed in (dict(JOB, basis="def2-TZVP"), dict(JOB, eps=4.7113), dict(JOB, charge=1),
+                    dict(JOB, single_point=True), dict(JOB, atom_list=moved)):
+        assert job_cache_key(changed) != key
+
+
+def test_optional_steps_keep_earlier_keys_valid():
+    key = job_cache_key(JOB)
+    assert job_cache_key(dict(JOB, frequencies=False, adaptive=False)) == key
+    with_freq = dict(JOB, frequencies=True, temperature=298.15, pressure=101325.0)
+    assert job_cache_key(with_freq) != key
+    assert job_cache_key(dict(with_freq, temperature=310.0)) != job_cache_key(with_freq)
+    assert job_cache_key(dict(JOB, adaptive=True)) != key
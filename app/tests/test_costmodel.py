@@ -0,0 +1,27 @@
+import json
+
+from autodft import costmodel
+
+
+def job(index, adaptive=False):
+    return {"index": index, "name": f"mol{index}", "functional": "PBE", "basis": "6-31g", "units": 10.0,
+            "predicted": 7.0, "adaptive": adaptive,
+            "features": {"natm": 9, "nao": 39, "naux": 150, "grid_points": 1000, "memory_mb": 500.0}}
+
+
+def test_only_production_timings_of_fixed_accuracy_runs_calibrate(tmp_path):
+    cache_dir = str(tmp_path)
+    with open(costmodel.timings_path(cache_dir), "w") as f:
+        # An entry logged with the total time, before timings were limited to the optimization.
+        f.write(json.dumps({"backend": "cpu", "threads": 1, "units": 10.0, "actual": 500.0}) + "\n")
+    assert costmodel.seconds_per_unit(cache_dir, "cpu") == (costmodel.DEFAULT_SECONDS_PER_UNIT["cpu"], 0)
+
+    results = [{"time": 90.0, "opt_time": 20.0}, {"time": 15.0, "opt_time": 5.0}, {"error": "failed"}]
+    costmodel.report([job(0), job(1, adaptive=True), job(2)], results, 30.0, 40.0, "cpu", 1, 1, cache_dir)
+    assert costmodel.seconds_per_unit(cache_dir, "cpu") == (2.0, 1)
+
+
+def test_simulated_makespan_runs_longest_first_within_memory():
+    assert costmodel.simulate_makespan([1.0, 4.0, 2.0, 3.0], [1, 1, 1, 1], workers=2) == 5.0
+    # Two big jobs cannot share the budget, so they run one after the other.
+    assert costmodel.simulate_makespan([4.0, 4.0, 1.0], [6, 6, 1], workers=2, memory_budget_mb=10) == 8.0
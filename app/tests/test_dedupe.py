@@ -0,0 +1,67 @@
+import numpy as np
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+from autodft import dedupe
+from autodft.app import reorder_atoms
+
+
+def embed(smiles, seed=7):
+    mol = Chem.AddHs(Chem.MolFromSmiles(smiles))
+    AllChem.EmbedMolecule(mol, randomSeed=seed)
+    return mol
+
+
+def positions(mol):
+    return mol.GetConformer().GetPositions()
+
+
+def test_atom_order_maps_a_renumbered_duplicate():
+    reference = embed("CCO")
+    numbering = list(np.random.default_rng(0).permutation(reference.GetNumAtoms()))
+    mol = Chem.RenumberAtoms(reference, [int(k) for k in numbering])
+    order = dedupe.atom_order(mol, reference)
+    assert [atom.GetSymbol() for atom in mol.GetAtoms()] == [reference.GetAtomWithIdx(k).GetSymbol() for k in order]
+    # The representative's geometry, renumbered, is the duplicate's own up to equivalent hydrogens.
+    result = {"atoms": [(atom.GetSymbol(), tuple(p)) for atom, p in zip(reference.GetAtoms(), positions(reference))],
+              "gradient": positions(reference).tolist(), "trajectory": [positions(reference).tolist()]}
+    renumbered = reorder_atoms(result, order)
+    coords = np.array([p for _, p in renumbered["atoms"]])
+    heavy = [atom.GetAtomicNum() > 1 for atom in mol.GetAtoms()]
+    assert np.allclose(coords[heavy], positions(mol)[heavy])
+    assert np.allclose(renumbered["gradient"], coords)
+    assert np.allclose(renumbered["trajectory"][0], coords)
+
+
+def test_atom_order_rejects_a_different_molecule():
+    assert dedupe.atom_order(embed("CCO"), embed("COC")) is None
+
+
+def test_fingerprint_ignores_atom_order_and_orientation():
+    mol = embed("CC(C)CO")
+    numbering = [int(k) for k in np.random.default_rng(1).permutation(mol.GetNumAtoms())]
+    renumbered = Chem.RenumberAtoms(mol, numbering)
+    conformer = renumbered.GetConformer()
+    rotation = np.array([[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+    for i, position in enumerate(positions(renumbered) @ rotation.T + 3.0):
+        conformer.SetAtomPosition(i, position.tolist())
+    assert np.allclose(dedupe.distance_fingerprint(renumbered), dedupe.distance_fingerprint(mol))
+    assert dedupe.topology_key(renumbered) == dedupe.topology_key(mol)
+    assert dedupe.find_duplicates([(0, mol), (1, renumbered)]) == {1: 0}
+
+
+def test_distinct_conformers_are_kept():
+    mol = Chem.AddHs(Chem.MolFromSmiles("CCCCCC"))
+    conformer_ids = AllChem.EmbedMultipleConfs(mol, numConfs=10, randomSeed=3)
+    conformers = [(n, Chem.Mol(mol, confId=conformer_id)) for n, conformer_id in enumerate(conformer_ids)]
+    fingerprints = [dedupe.distance_fingerprint(conformer) for _, conformer in conformers]
+    distinct = [n for n in range(len(fingerprints))
+                if all(np.abs(fingerprints[n] - fingerprints[m]).max() > dedupe.DEFAULT_TOLERANCE for m in range(n))]
+    # A conformer unlike every earlier one is never mapped to one of them.
+    duplicates = dedupe.find_duplicates(conformers)
+    assert len(distinct) > 1
+    assert not set(distinct) & set(duplicates)
+
+
+def test_different_molecules_are_never_duplicates():
+    assert dedupe.find_duplicates([(0, embed("CCO")), (1, embed("COC"))], tolerance=10.0) == {}
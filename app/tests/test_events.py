@@ -0,0 +1,64 @@
+import os
+import json
+from types import SimpleNamespace
+
+import numpy as np
+
+from autodft.events import BOHR, CONVERGENCE_CRITERIA, EventStream, read_events
+
+
+def test_records_carry_type_time_and_context_in_order(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    stream = EventStream(path, index=2, name="ethanol")
+    stream.emit("start", xyz_filename="ethanol.xyz")
+    stream.context["stage"] = "opt"
+    stream.emit("result", energy_hartree=np.float64(-154.75), converged=True)
+    stream.close()
+
+    events, offset = read_events(path)
+    assert [event["event"] for event in events] == ["start", "result"]
+    assert set(events[0]) == {"event", "time", "elapsed", "index", "name", "xyz_filename"}
+    assert events[0]["index"] == 2 and events[0]["name"] == "ethanol"
+    assert events[1]["stage"] == "opt" and events[1]["energy_hartree"] == -154.75
+    assert events[0]["time"] <= events[1]["time"] and 0 <= events[0]["elapsed"] <= events[1]["elapsed"]
+    assert offset == os.path.getsize(path)
+
+
+def test_read_events_leaves_a_partial_line_for_later(tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_text(json.dumps({"event": "start"}) + "\n" + '{"event": "res')
+    events, offset = read_events(str(path))
+    assert [event["event"] for event in events] == ["start"]
+    with open(path, "a") as f:
+        f.write('ult"}\n')
+    events, _ = read_events(str(path), offset)
+    assert [event["event"] for event in events] == ["result"]
+    assert read_events(str(tmp_path / "missing.jsonl"), 5) == ([], 5)
+
+
+def test_scf_and_geometry_step_events(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    stream = EventStream(path)
+    stream.on_scf_cycle({"e_tot": -154.70, "last_hf_e": -154.60, "cycle": 0, "norm_gorb": 0.1, "norm_ddm": 0.2,
+                         "scf_conv": False})
+    coords = np.zeros((2, 3))
+    coords[1, 2] = 1.4
+    optimizer = SimpleNamespace(cycle=0)
+    scanner = SimpleNamespace(converged=True)
+    gradient = np.full((2, 3), 1e-5)
+    stream.on_geometry_step({"energy": -154.75, "gradients": gradient, "coords": coords.ravel(),
+                             "self": optimizer, "g_scanner": scanner})
+    optimizer.cycle = 1
+    stream.on_geometry_step({"energy": -154.75 - 1e-7, "gradients": gradient, "coords": coords.ravel() + 1e-4,
+                             "self": optimizer, "g_scanner": scanner})
+    stream.close()
+
+    scf, first, second = read_events(path)[0]
+    assert scf["event"] == "scf_cycle" and scf["cycle"] == 1
+    assert np.isclose(scf["delta_e"], -0.1)
+    # The first step has no previous geometry, so only the gradient criteria are known.
+    assert first["event"] == "geometry_step" and first["step"] == 0
+    assert set(first["criteria"]) == {"grms", "gmax"} and not first["converged"]
+    assert first["delta_e"] is None and first["step_size"] is None
+    assert set(second["criteria"]) == set(CONVERGENCE_CRITERIA) and second["converged"]
+    assert np.isclose(second["step_size"], np.sqrt(6) * 1e-4 * BOHR)
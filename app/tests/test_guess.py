@@ -0,0 +1,52 @@
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+from pyscf import gto, scf
+
+from autodft import guess
+
+# Formaldehyde in Bohr; the basis has p and d shells, which turn with the molecule.
+COORDS = np.array([[0.0, 0.0, -1.0], [0.0, 0.0, 1.28], [0.0, 1.77, -2.1], [0.0, -1.77, -2.1]])
+SYMBOLS = ["C", "O", "H", "H"]
+
+
+def make_mol(coords):
+    return gto.M(atom=list(zip(SYMBOLS, coords.tolist())), basis="6-31g*", unit="Bohr", verbose=0)
+
+
+def rotated(coords, seed):
+    rotation = Rotation.random(random_state=seed).as_matrix()
+    return coords @ rotation.T + np.array([0.5, -1.0, 2.0])
+
+
+def test_kabsch_rotation_recovers_a_rotation():
+    rotation = Rotation.random(random_state=1).as_matrix()
+    assert np.allclose(guess.kabsch_rotation(COORDS, COORDS @ rotation.T), rotation)
+    assert guess.aligned_rmsd(COORDS, rotated(COORDS, 2)) < 1e-8
+
+
+def test_align_density_matches_the_density_of_the_rotated_molecule():
+    # The core-Hamiltonian guess needs no SCF and rotates with the molecule like a converged density.
+    mol = make_mol(COORDS)
+    dm = scf.RHF(mol).get_init_guess(key="1e")
+    turned = make_mol(rotated(COORDS, 3))
+    expected = scf.RHF(turned).get_init_guess(key="1e")
+    aligned = guess.align_density(turned, dm, COORDS)
+    assert np.abs(aligned - expected).max() < 1e-6
+    assert np.abs(dm - expected).max() > 1e-2
+
+
+def test_load_guess_picks_the_nearest_conformer(tmp_path):
+    guess_dir = str(tmp_path)
+    assert guess.load_guess(guess_dir, "key", COORDS) == (None, None, None)
+    far = COORDS.copy()
+    far[2, 1] += 0.5
+    near = COORDS.copy()
+    near[2, 1] += 0.05
+    guess.save_guess(guess_dir, "key", np.full((2, 2), 1.0), rotated(far, 4), cold_cycles=12)
+    guess.save_guess(guess_dir, "key", np.full((2, 2), 2.0), rotated(near, 5))
+    guess.save_guess(guess_dir, "other", np.full((2, 2), 3.0), COORDS)
+    dm, coords, cold_cycles = guess.load_guess(guess_dir, "key", COORDS)
+    assert np.all(dm == 2.0)
+    assert np.allclose(coords, rotated(near, 5))
+    assert cold_cycles is None
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from autodft.store import ResultStore, export_xyz
+
+ATOMS = [("O", (0.0, 0.0, 0.1173)), ("H", (0.0, 0.7572, -0.4692)), ("H", (0.0, -0.7572, -0.4692))]
+ENERGY = -76.38712345678912
+
+
+def test_append_and_get_round_trip(tmp_path):
+    path = str(tmp_path / "results.h5")
+    gradient = np.arange(9.0).reshape(3, 3) * 1e-5
+    with ResultStore(path) as store:
+        run = store.append("water_1", ATOMS, ENERGY, True, gradient=gradient, trajectory=[np.zeros((3, 3))],
+                           functional="PBE0", eps=78.3553, history=[{"step": 0}], thermo=None)
+    assert run == 0
+    with ResultStore(path, "r") as store:
+        assert "water_1" in store and len(store) == 1
+        record = store.get("water_1")
+    assert record["atoms"] == ATOMS
+    assert record["energy_hartree"] == ENERGY
+    assert record["converged"] is True
+    assert np.array_equal(record["gradient"], gradient)
+    assert record["trajectory"].shape == (1, 3, 3)
+    assert record["functional"] == "PBE0"
+    assert record["history"] == [{"step": 0}]
+    assert "thermo" not in record
+
+
+def test_runs_are_appended_never_rewritten(tmp_path):
+    path = str(tmp_path / "results.h5")
+    with ResultStore(path) as store:
+        store.append("water_1", ATOMS, ENERGY, False)
+        store.append("water_2", ATOMS, ENERGY, True)
+    with ResultStore(path) as store:
+        assert store.append("water_1", ATOMS, ENERGY - 1e-3, True) == 1
+        assert store.runs("water_1") == [0, 1]
+        assert store.get("water_1")["energy_hartree"] == ENERGY - 1e-3
+        assert store.get("water_1", run=0)["converged"] is False
+        assert store.get("water_2")["gradient"] is None
+        assert [record["id"] for record in store] == ["water_1", "water_2"]
+        with pytest.raises(KeyError):
+            store.get("water_3")
+        with pytest.raises(ValueError):
+            store.append("a/b", ATOMS, ENERGY, True)
+
+
+def test_export_xyz_keeps_the_full_precision_energy(tmp_path):
+    path = str(tmp_path / "results.h5")
+    with ResultStore(path) as store:
+        store.append("water_1", ATOMS, ENERGY, True)
+        export_xyz(store, str(tmp_path / "all.xyz"))
+    with open(tmp_path / "all.xyz") as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "3"
+    assert lines[1] == f"water_1 run=0 energy={ENERGY:.10f} Hartree converged=True"
+    assert lines[2].split() == ["O", "0.00000000", "0.00000000", "0.11730000"]
+
+
+def test_a_foreign_hdf5_file_is_rejected(tmp_path):
+    import h5py
+
+    path = str(tmp_path / "other.h5")
+    h5py.File(path, "w").close()
+    with pytest.raises(ValueError):
+        ResultStore(path, "r")
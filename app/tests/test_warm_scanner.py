@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from pyscf import gto
+from pyscf.df import df
+
+from autodft.app import PREOPT_SETTINGS, build_mf, warm_scanner
+
+
+@pytest.fixture
+def df_builds(monkeypatch):
+    builds = []
+    build = df.DF.build
+
+    def counted(self):
+        builds.append(self)
+        return build(self)
+    monkeypatch.setattr(df.DF, "build", counted)
+    return builds
+
+
+def test_first_gradient_step_reuses_the_df_tensors(df_builds):
+    mol = gto.M(atom="O 0 0 0.1173; H 0 0.7572 -0.4692; H 0 -0.7572 -0.4692", basis="sto-3g", verbose=0)
+    mf = warm_scanner(build_mf(mol, "PBE0", 78.5, "cpu", PREOPT_SETTINGS), None)
+    assert len(df_builds) == 1
+    energy = mf.e_tot
+    scanner = mf.nuc_grad_method().as_scanner()
+
+    # The optimizer's first step is at the start geometry: no new DF tensors or grids.
+    e_tot, _ = scanner(mol.copy())
+    assert len(df_builds) == 1
+    assert mf.grids.coords is not None
+    assert e_tot == pytest.approx(energy, abs=1e-8)
+
+    moved = mol.set_geom_(mol.atom_coords() + np.array([0.0, 0.0, 0.05]), unit="Bohr", inplace=False)
+    scanner(moved)
+    assert len(df_builds) == 2
@@ -0,0 +1,127 @@
+import os
+import json
+
+from autodft import workqueue
+from autodft.workqueue import ATTEMPTS, LEASES, RESULTS, Lease, claim_next, publish_result, read_lease
+
+LEASE_SECONDS = 60.0
+
+
+def make_queue(queue_dir, jobs=3):
+    for kind in (workqueue.JOBS, LEASES, RESULTS, ATTEMPTS, workqueue.OUTPUT):
+        os.makedirs(queue_dir / kind, exist_ok=True)
+    for index in range(jobs):
+        with open(queue_dir / workqueue.JOBS / f"{index}.json", "w") as f:
+            json.dump({"index": index, "name": f"mol{index}", "xyz_filename": f"xyz/mol_{index}.xyz"}, f)
+    return str(queue_dir)
+
+
+def expire(queue_dir, job_id, age=2 * LEASE_SECONDS):
+    path = workqueue._path(queue_dir, LEASES, job_id)
+    mtime = workqueue.filesystem_time(queue_dir) - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_claim_next_takes_jobs_in_order_and_skips_held_ones(tmp_path):
+    queue_dir = make_queue(tmp_path)
+    first = claim_next(queue_dir, "a", LEASE_SECONDS)
+    second = claim_next(queue_dir, "b", LEASE_SECONDS)
+    assert (first.job_id, second.job_id) == ("0", "1")
+    assert first.held() and second.held()
+    assert read_lease(first.path)["worker"] == "a"
+
+
+def test_claim_next_skips_finished_jobs(tmp_path):
+    queue_dir = make_queue(tmp_path, jobs=2)
+    assert publish_result(queue_dir, "0", {"energy_hartree": -1.0})
+    lease = claim_next(queue_dir, "a", LEASE_SECONDS)
+    assert lease.job_id == "1"
+    assert claim_next(queue_dir, "b", LEASE_SECONDS) is None
+
+
+def test_live_lease_is_not_taken_over(tmp_path):
+    queue_dir = make_queue(tmp_path, jobs=1)
+    lease = claim_next(queue_dir, "a", LEASE_SECONDS)
+    assert claim_next(queue_dir, "b", LEASE_SECONDS) is None
+    assert lease.renew()
+
+
+def test_expired_lease_is_taken_over_with_the_next_attempt(tmp_path):
+    queue_dir = make_queue(tmp_path, jobs=1)
+    dead = claim_next(queue_dir, "a", LEASE_SECONDS)
+    expire(queue_dir, "0")
+    lease = claim_next(queue_dir, "b", LEASE_SECONDS)
+    assert lease.job_id == "0" and lease.attempt == 2
+    assert lease.held()
+    # The dead worker finds out at its next heartbeat, and cannot release the new lease.
+    assert not dead.renew()
+    dead.release()
+    assert lease.held()
+
+
+def test_take_over_backs_off_when_the_lease_was_renewed(tmp_path):
+    queue_dir = make_queue(tmp_path, jobs=1)
+    lease = claim_next(queue_dir, "a", LEASE_SECONDS)
+    expire(queue_dir, "0")
+    stale = read_lease(lease.path)
+    # The owner renews between the other worker's read and its takeover.
+    assert lease.renew()
+    now = workqueue.filesystem_time(queue_dir)
+    assert workqueue._take_over(queue_dir, "0", stale, "b", now, LEASE_SECONDS) is None
+    assert lease.held()
+    assert not any(".expired-" in name for name in os.listdir(os.path.join(queue_dir, LEASES)))
+
+
+def test_take_over_backs_off_when_the_lease_was_replaced(tmp_path):
+    queue_dir = make_queue(tmp_path, jobs=1)
+    lease = claim_next(queue_dir, "a", LEASE_SECONDS)
+    expire(queue_dir, "0")
+    stale = read_lease(lease.path)
+    # A third worker took the job over first and holds a fresh lease.
+    os.remove(lease.path)
+    other = Lease.create(queue_dir, "0", "c", attempt=2)
+    now = workqueue.filesystem_time(queue_dir)
+    assert workqueue._take_over(queue_dir, "0", stale, "b", now, LEASE_SECONDS) is None
+    assert other.held()
+
+
+def test_job_is_abandoned_after_max_attempts(tmp_path):
+    queue_dir = make_queue(tmp_path, jobs=1)
+    Lease.create(queue_dir, "0", "a", attempt=workqueue.MAX_ATTEMPTS)
+    expire(queue_dir, "0")
+    assert claim_next(queue_dir, "b", LEASE_SECONDS) is None
+    with open(workqueue._path(queue_dir, RESULTS, "0")) as f:
+        result = json.load(f)
+    assert "abandoned" in result["error"]
+    assert result["attempt"] == workqueue.MAX_ATTEMPTS
+    assert workqueue.pending(queue_dir) == 0
+
+
+def test_attempts_survive_a_claim_while_the_expired_lease_is_moved_away(tmp_path):
+    queue_dir = make_queue(tmp_path, jobs=1)
+    for attempt in range(1, workqueue.MAX_ATTEMPTS + 1):
+        lease = claim_next(queue_dir, f"w{attempt}", LEASE_SECONDS)
+        assert lease.attempt == attempt
+        # The worker dies; another one renames its expired lease away, and a third claims the
+        # job in the gap before the takeover lease is created.
+        os.rename(lease.path, f"{lease.path}.expired-x")
+    assert claim_next(queue_dir, "late", LEASE_SECONDS) is None
+    with open(workqueue._path(queue_dir, RESULTS, "0")) as f:
+        assert "abandoned" in json.load(f)["error"]
+
+
+def test_released_attempt_is_not_counted(tmp_path):
+    queue_dir = make_queue(tmp_path, jobs=1)
+    claim_next(queue_dir, "a", LEASE_SECONDS).release()
+    lease = claim_next(queue_dir, "b", LEASE_SECONDS)
+    assert lease.attempt == 1
+    assert workqueue.attempts_started(queue_dir, "0") == 1
+
+
+def test_only_the_first_result_is_published(tmp_path):
+    queue_dir = make_queue(tmp_path, jobs=1)
+    assert publish_result(queue_dir, "0", {"worker": "a"})
+    assert not publish_result(queue_dir, "0", {"worker": "b"})
+    with open(workqueue._path(queue_dir, RESULTS, "0")) as f:
+        assert json.load(f)["worker"] == "a"
+    assert os.listdir(os.path.join(queue_dir, RESULTS)) == ["0.json"]
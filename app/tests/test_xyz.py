@@ -0,0 +1,46 @@
+import numpy as np
+
+from autodft.app import write_xyz
+from autodft.store import export_xyz
+from autodft.xyz import BOND_TOLERANCE, DENSE_LIMIT, covalent_radii, find_bonds, iter_xyz_frames, read_xyz_content, read_xyz_frames
+
+ATOMS = [("C", (-0.7481, 0.0094, 0.0)), ("C", (0.7481, -0.0094, 0.0)), ("O", (1.2175, 1.3323, 0.0)),
+         ("H", (-1.1314, 1.0320, 0.0)), ("H", (-1.1314, -0.5085, 0.8869)), ("H", (-1.1314, -0.5085, -0.8869)),
+         ("H", (1.1314, -0.5279, 0.8869)), ("H", (1.1314, -0.5279, -0.8869)), ("H", (2.1775, 1.3323, 0.0))]
+
+
+def test_written_xyz_reads_back(tmp_path):
+    path = tmp_path / "ethanol.xyz"
+    write_xyz(str(path), ATOMS, -406312.27)
+    content = path.read_text()
+    comment, symbols, positions = next(iter_xyz_frames(content))
+    assert comment == "Energy: -406312.27 kJ/mol"
+    assert symbols == [symbol for symbol, _ in ATOMS]
+    assert np.allclose(positions, [coords for _, coords in ATOMS])
+
+    mol = read_xyz_content(content)
+    assert mol.GetNumAtoms() == len(ATOMS)
+    assert mol.GetNumBonds() == 8
+    assert np.allclose(mol.GetConformer().GetPositions(), positions)
+
+
+def test_multi_frame_xyz_keeps_every_frame_and_comment(tmp_path):
+    path = str(tmp_path / "all.xyz")
+    records = [{"id": f"ethanol_{n}", "run": 0, "energy_hartree": -154.75 - n, "converged": True, "atoms": ATOMS}
+               for n in (1, 2)]
+    export_xyz(records, path)
+    with open(path) as f:
+        mols = read_xyz_frames(f.read())
+    assert [mol.GetProp("_Name").split()[0] for mol in mols] == ["ethanol_1", "ethanol_2"]
+    assert all(mol.GetNumAtoms() == len(ATOMS) for mol in mols)
+
+
+def test_kd_tree_bonds_match_the_dense_ones():
+    rng = np.random.default_rng(0)
+    symbols = ["C"] * (DENSE_LIMIT + 44)
+    positions = rng.uniform(0, 12, size=(len(symbols), 3))
+    bonds = {tuple(pair) for pair in find_bonds(symbols, positions).tolist()}
+    i, j = np.triu_indices(len(symbols), k=1)
+    distances = np.linalg.norm(positions[i] - positions[j], axis=1)
+    expected = {(int(a), int(b)) for a, b, d in zip(i, j, distances) if d < 2 * covalent_radii(["C"])[0] + BOND_TOLERANCE}
+    assert bonds == expected
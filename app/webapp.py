@@ -14,22 +14,35 @@ import time
 import glob
 import re
 import base64
-from pyscf import gto
-from pyscf.geomopt import geometric_solver
-from gpu4pyscf.dft import rks
-from pyscf.hessian import thermo
+import tempfile
+from autodft.background import ACTIVE_STATES, JobPool
+from autodft.xyz import read_xyz_content
 
 
-def add_custom_header_and_footer(header_and_footer_color, logo_image_path, header_background_path, background_image, title, subtitle, more_info_url):
-    """Adds custom header with animated subtitle, GitHub link button, and footer to the app."""
-    with open(logo_image_path, "rb") as image_file:
-        logo_image = base64.b64encode(image_file.read()).decode()
+# Bounded caches for rendered viewers and encoded page assets.
+RENDER_CACHE_ENTRIES = 64
+ASSET_CACHE_ENTRIES = 8
+# Molecules per page of the multi-molecule SDF viewer.
+SDF_PAGE_SIZE = 50
+
+
+@st.cache_data(max_entries=ASSET_CACHE_ENTRIES)
+def _encode_image(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode()
+
 
-    with open(header_background_path, "rb") as image_file:
-        header_background = base64.b64encode(image_file.read()).decode()
+def encode_image(path: str) -> str:
+    """Base64-encodes an image file once per version of the file (keyed on its mtime and size)."""
+    stat = os.stat(path)
+    return _encode_image(path, stat.st_mtime_ns, stat.st_size)
 
-    with open(background_image, "rb") as image_file:
-        background_image = base64.b64encode(image_file.read()).decode()
+
+def add_custom_header_and_footer(header_and_footer_color, logo_image_path, header_background_path, background_image, title, subtitle, more_info_url):
+    """Adds custom header with animated subtitle, GitHub link button, and footer to the app."""
+    logo_image = encode_image(logo_image_path)
+    header_background = encode_image(header_background_path)
+    background_image = encode_image(background_image)
 
     st.markdown(
         f"""
@@ -315,45 +328,6 @@ add_custom_css()
 
 warnings.filterwarnings("ignore", category=UserWarning, module="scipy.cluster")
 
-def read_xyz_content(content: str) -> Chem.Mol:
-    """Reads XYZ content, adds bonds based on distances, and returns an RDKit molecule."""
-    lines = content.strip().splitlines()
-    num_atoms = int(lines[0].strip())  # First line is the number of atoms
-    atom_block = lines[2:]  # Skip the first two lines (num_atoms and comment line)
-
-    # Create RDKit molecule
-    mol = Chem.RWMol()
-    conformer = Chem.Conformer(num_atoms)
-    positions = []
-
-    # Add atoms and positions
-    for i, line in enumerate(atom_block):
-        parts = line.split()
-        symbol = parts[0]
-        x, y, z = map(float, parts[1:])
-        positions.append((x, y, z))
-
-        atom = Chem.Atom(symbol)
-        mol.AddAtom(atom)
-        conformer.SetAtomPosition(i, (x, y, z))
-
-    # Add conformer
-    mol.AddConformer(conformer, assignId=True)
-
-    # Infer bonds based on distances
-    positions = np.array(positions)
-    for i in range(num_atoms):
-        for j in range(i + 1, num_atoms):
-            distance = np.linalg.norm(positions[i] - positions[j])
-            # Add a bond if distance is less than a threshold (e.g., 1.6 Å for covalent bonds)
-            if distance < 1.6:
-                mol.AddBond(i, j, Chem.BondType.SINGLE)
-
-    # Sanitize molecule
-    Chem.SanitizeMol(mol)
-
-    return mol
-
 def read_mol2_content(content: str) -> Chem.Mol:
     """Reads MOL2 content and returns an RDKit molecule."""
     mol = Chem.MolFromMol2Block(content, removeHs=False)
@@ -379,195 +353,98 @@ def read_structure_content(content: str, filetype: str) -> Chem.Mol:
     else:
         raise ValueError(f"Unsupported file type: {filetype}")
 
-def render_molecule(molecule: Chem.Mol) -> str:
-    """Renders an RDKit molecule as an HTML 3D visualization."""
-    if molecule is not None:
-        molecule = Chem.AddHs(molecule)
-        AllChem.EmbedMolecule(molecule)
-        AllChem.UFFOptimizeMolecule(molecule)
-        sdf_output = Chem.MolToMolBlock(molecule)
-
-        html_template = f"""
-        <div id="molViewer" style="height: 600px; width: 800px;"></div>
-        <script src="https://3Dmol.org/build/3Dmol-min.js"></script>
-        <script>
-            let viewer = new $3Dmol.createViewer(document.getElementById('molViewer'), {{backgroundColor: "white"}});
-            viewer.addModel(`{sdf_output}`, 'sdf');
-            viewer.setStyle({{stick: {{}}}});
-            viewer.zoomTo();
-            viewer.render();
-        </script>
-        """
-        return html_template
+def to_3d_molblock(molecule: Chem.Mol) -> str:
+    """Returns a 3D mol block of the molecule, embedding it with UFF only when it has no 3D conformer."""
+    if molecule.GetNumConformers() and molecule.GetConformer().Is3D():
+        # Keep the given (e.g. DFT-optimized) geometry; only missing hydrogens get coordinates.
+        molecule = Chem.AddHs(molecule, addCoords=True)
     else:
-        raise ValueError("Invalid molecule object.")
-
-# Render the SDF molecule in 3D
-def render_sdf(sdf_output: str):
-    molecule = Chem.MolFromMolBlock(sdf_output)
-    if molecule is not None:
         molecule = Chem.AddHs(molecule)
         AllChem.EmbedMolecule(molecule)
         AllChem.UFFOptimizeMolecule(molecule)
-        sdf_output = Chem.MolToMolBlock(molecule)
+    return Chem.MolToMolBlock(molecule)
+
 
-    html_template = f"""
+def viewer_html(mol_blocks, stick_radius=None) -> str:
+    """3Dmol.js viewer HTML showing every mol block as a stick model."""
+    style = "{stick: {}}" if stick_radius is None else f"{{stick: {{radius: {stick_radius}}}}}"
+    models = "".join(f"""
+        viewer.addModel(`{mol_block}`, 'sdf');""" for mol_block in mol_blocks)
+    return f"""
     <div id="molViewer" style="height: 600px; width: 800px;"></div>
     <script src="https://3Dmol.org/build/3Dmol-min.js"></script>
     <script>
-        let viewer = new $3Dmol.createViewer(document.getElementById('molViewer'), {{backgroundColor: "white"}});
-        viewer.addModel(`{sdf_output}`, 'sdf');
-        viewer.setStyle({{stick: {{}}}});
+        let viewer = new $3Dmol.createViewer(document.getElementById('molViewer'), {{backgroundColor: "white"}});{models}
+        viewer.setStyle({style});
         viewer.zoomTo();
         viewer.render();
     </script>
     """
-    return html_template
 
 
-def render_sdf_all(file_path: str, stick_radius: float = 0.1):
-    # Use Chem.SDMolSupplier to read molecules from the SDF file
-    suppl = Chem.SDMolSupplier(file_path)
-    
-    # Initialize the HTML template
-    html_template = """
-    <div id="molViewer" style="height: 600px; width: 800px;"></div>
-    <script src="https://3Dmol.org/build/3Dmol-min.js"></script>
-    <script>
-        let viewer = new $3Dmol.createViewer(document.getElementById('molViewer'), {backgroundColor: "white"});
-    """
+# Rendered viewers are memoized on the mol blocks they show (Streamlit hashes the arguments).
+@st.cache_data(max_entries=RENDER_CACHE_ENTRIES)
+def _render_mol_blocks(mol_blocks: tuple, stick_radius) -> str:
+    prepared = []
+    for mol_block in mol_blocks:
+        molecule = Chem.MolFromMolBlock(mol_block, removeHs=False)
+        prepared.append(mol_block if molecule is None else to_3d_molblock(molecule))
+    return viewer_html(prepared, stick_radius)
 
-    # Iterate over each molecule in the SDF
-    for molecule in suppl:
-        if molecule is not None:
-            print("Molecule found, processing...")
-            molecule = Chem.AddHs(molecule)
-            AllChem.EmbedMolecule(molecule)
-            AllChem.UFFOptimizeMolecule(molecule)
-            mol_block = Chem.MolToMolBlock(molecule)
-            
-            # Add each molecule to the viewer
-            html_template += f"""
-            viewer.addModel(`{mol_block}`, 'sdf');
-            """
-        else:
-            st.write("Invalid molecule encountered.")
 
-    # Finalize the HTML template with stick style
-    html_template += f"""
-        viewer.setStyle({{stick: {{radius: {stick_radius}}}}});
-        viewer.zoomTo();
-        viewer.render();
-    </script>
-    """
-    
-    return html_template
+def render_molecule(molecule: Chem.Mol) -> str:
+    """Renders an RDKit molecule as an HTML 3D visualization."""
+    if molecule is None:
+        raise ValueError("Invalid molecule object.")
+    return _render_mol_blocks((Chem.MolToMolBlock(molecule),), None)
 
 
-def render_molecule_all(molecule_list: list[Chem.Mol], stick_radius: float = 0.1) -> str:
-    """Renders RDKit molecules as an HTML 3D visualization."""
-    html_template = """
-    <div id="molViewer" style="height: 600px; width: 800px;"></div>
-    <script src="https://3Dmol.org/build/3Dmol-min.js"></script>
-    <script>
-        let viewer = new $3Dmol.createViewer(document.getElementById('molViewer'), {backgroundColor: "white"});
-    """
-    
-    labels = ['Original', 'Optimized']  # Define labels for the two molecules
-    for index, molecule in enumerate(molecule_list):
-        if molecule is not None:
-            molecule = Chem.AddHs(molecule)
-            AllChem.EmbedMolecule(molecule)
-            AllChem.UFFOptimizeMolecule(molecule)
-            sdf_output = Chem.MolToMolBlock(molecule)
-
-            html_template += f"""
-                viewer.addModel(`{sdf_output}`, 'sdf');
-                viewer.setStyle({{stick: {{radius: {stick_radius}}}}});
-            """
+# Render the SDF molecule in 3D
+def render_sdf(sdf_output: str):
+    return _render_mol_blocks((sdf_output,), None)
+
+
+@st.cache_data(max_entries=RENDER_CACHE_ENTRIES)
+def count_sdf_records(sdf_content: str) -> int:
+    suppl = Chem.SDMolSupplier()
+    suppl.SetData(sdf_content, removeHs=False)
+    return len(suppl)
+
+
+@st.cache_data(max_entries=RENDER_CACHE_ENTRIES)
+def _render_sdf_page(sdf_content: str, stick_radius: float, page: int, page_size: int):
+    suppl = Chem.SDMolSupplier()
+    suppl.SetData(sdf_content, removeHs=False)
+    total = len(suppl)
+    mol_blocks = []
+    invalid = 0
+    # The supplier parses records on access, so only this page's molecules are read.
+    for index in range(page * page_size, min((page + 1) * page_size, total)):
+        molecule = suppl[index]
+        if molecule is None:
+            invalid += 1
         else:
-            raise ValueError("Invalid molecule object.")
-    
-    html_template += """
-    viewer.zoomTo();
-    viewer.render();
-    </script>
-    """
+            mol_blocks.append(to_3d_molblock(molecule))
+    return viewer_html(mol_blocks, stick_radius), total, invalid
+
+
+def render_sdf_all(sdf_content: str, stick_radius: float = 0.1, page: int = 0, page_size: int = SDF_PAGE_SIZE):
+    """Renders one page (page_size molecules) of a multi-molecule SDF."""
+    html_template, total, invalid = _render_sdf_page(sdf_content, stick_radius, page, page_size)
+    for _ in range(invalid):
+        st.write("Invalid molecule encountered.")
+    if total > page_size:
+        first = page * page_size + 1
+        st.caption(f"Molecules {first}-{min(first + page_size - 1, total)} of {total}")
     return html_template
-    
-
-
-def get_atom_list(sdf_file):
-    molecules = Chem.SDMolSupplier(sdf_file, removeHs=False)
-    mol = next(molecules)  # Assuming you have one molecule in the SDF
-
-    # Get the first conformer to access 3D coordinates
-    conformer = mol.GetConformer()
-
-    # Extract atomic symbols and coordinates
-    atom_list = []
-    for atom in mol.GetAtoms():
-        pos = conformer.GetAtomPosition(atom.GetIdx())
-        atom_list.append((atom.GetSymbol(), (pos.x, pos.y, pos.z)))
-    return atom_list
-
-
-def opti_PCM(mol, functional, eps, xyz_filename):
-    # Set up the DFT calculation
-    mf = rks.RKS(mol).density_fit()  # Use density fitting for efficiency
-    mf.xc = functional  # Set the exchange-correlation functional
-
-    # SCF convergence Criteria
-    mf.conv_tol = 1e-8  # Energy convergence
-    mf.conv_tol_grad = 3e-4  # Gradient convergence
-    mf.max_cycle = 70  # Increase max iterations if needed
 
-    # Apply the solvation model
-    mf = mf.PCM()  # Initialize solvation model
-    mf.grids.atom_grid = (99, 590)
-    mf.with_solvent.lebedev_order = 29  # 302 Lebedev grids
-    mf.with_solvent.method = 'IEF-PCM'  # Can be C-PCM, SS(V)PE, COSMO
-    mf.with_solvent.eps = eps  # Set the solvent's dielectric constant
 
-    # Perform geometry optimization
-    print("Starting geometry optimization...")
-    mol_opt = geometric_solver.optimize(mf, max_steps=200, xtol=1e-8, gtol=3e-4, etol=1e-8)
-
-    # Ensure SCF calculation is performed
-    mf.kernel()
-
-    # Output optimized geometry
-    optimized_atoms = [(atom[0], mol_opt.atom_coords(unit='Angstrom')[i]) for i, atom in enumerate(mol_opt.atom)]
-
-    # Extract the final energy in Hartree
-    final_energy_hartree = mf.e_tot
-
-    # Convert energy from Hartree to kJ/mol
-    hartree_to_kjmol = 2625.5
-    final_energy_kjmol = final_energy_hartree * hartree_to_kjmol
-
-    # Save optimized geometry to XYZ file
-    with open(xyz_filename, 'w') as xyz_file:
-        xyz_file.write(f"{len(optimized_atoms)}\n")
-        xyz_file.write(f"Energy: {final_energy_kjmol:.2f} kJ/mol\n")
-        for symbol, coords in optimized_atoms:
-            formatted_coords = ' '.join(f"{coord:.8f}" for coord in coords)
-            xyz_file.write(f"{symbol} {formatted_coords}\n")
-
-    print(f"Optimized geometry saved to '{xyz_filename}'.")
-
-    # Print the final energy
-    print(f"Final energy: {final_energy_hartree:.8f} Hartree ({final_energy_kjmol:.2f} kJ/mol)")
-
-    # Record the end time
-    opt_time = time.time()
-
-    # Calculate and print the total run time
-    total_opt_time = opt_time - start_time
-    print(f"\nOPT Time: {total_opt_time:.2f} seconds")
+def render_molecule_all(molecule_list: list[Chem.Mol], stick_radius: float = 0.1) -> str:
+    """Renders RDKit molecules as an HTML 3D visualization."""
+    if any(molecule is None for molecule in molecule_list):
+        raise ValueError("Invalid molecule object.")
+    return _render_mol_blocks(tuple(Chem.MolToMolBlock(molecule) for molecule in molecule_list), stick_radius)
 
-    print("################################################################")
-    return mol_opt, final_energy_kjmol
 
 # Inputs
 inp_smiles = st.sidebar.text_input("Input SMILES *", value="")
@@ -643,47 +520,93 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-if st.sidebar.button("Optimize", type="primary"):
-    tab_titles = ["Optimized Conformer"] 
-    tabs = st.tabs(tab_titles)
-
-   
-    ref_confo_path = ref_confo_file.name
-    with open(ref_confo_path, "wb") as f:
-        f.write(ref_confo_file.getbuffer())
-    ref_sdf_content = ref_confo_file.getvalue().decode("utf-8")
-
-    with tabs[0]:  # Conformer tab
-        with st.spinner():
-            start_time = time.time()
-            # Define eps
-            eps = dielectric_value
-            functional_input = functional
-            atom_list = get_atom_list(ref_confo_path)
-            # Define the molecule
-            mol1 = gto.M(
-                atom=atom_list,
-                basis=basis,
-                charge=charge,
-                spin=0,
-                verbose=4,
-            )
-
-            xyz_filename = f'{ref_confo_path.split(".")[0]}.xyz'
-
-            HA, energy = opti_PCM(mol1, functional_input, eps, xyz_filename)
-            with open(xyz_filename,'r') as f:
-                ref_xyz_content = f.read()
-            ref_molecule = read_structure_content(ref_xyz_content,'xyz')
-            st.markdown(f"<div style='color: black; font-size: 14px; font-weight: bold; margin-top: 20px; margin-left: 20px'>Energy (kJ/mol): {energy:.2f}</div>", unsafe_allow_html=True)
-            ori_molecule = Chem.MolFromMolBlock(ref_sdf_content)
-            molecule_list = [ori_molecule, ref_molecule]
-            file_html = render_molecule_all(molecule_list)
-            st.components.v1.html(file_html, height=700, width=800)
+# Preview of the uploaded SDF, SDF_PAGE_SIZE molecules at a time.
+if ref_confo_file:
+    with st.expander(f"Uploaded molecules ({ref_confo_file.name})"):
+        upload_content = ref_confo_file.getvalue().decode("utf-8")
+        pages = max(1, -(-count_sdf_records(upload_content) // SDF_PAGE_SIZE))
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1,
+                               key=f"sdf_page_{ref_confo_file.name}") if pages > 1 else 1
+        st.components.v1.html(render_sdf_all(upload_content, page=page - 1), height=700, width=800)
+
+# Optimizations run in a per-session pool of worker processes, tracked by job ID.
+if "job_pool" not in st.session_state:
+    st.session_state.job_pool = JobPool()
+job_pool = st.session_state.job_pool
+job_pool.workers = st.sidebar.number_input("Parallel jobs", min_value=1, value=1, step=1,
+                                           help="Number of optimizations that run at the same time")
 
-            
+if st.sidebar.button("Optimize", type="primary"):
     if not ref_confo_file:
         st.error("No conformer uploaded.")
-
-        
-
+    else:
+        options = {"dielectric_constant": dielectric_value, "functional": functional, "basis": basis,
+                   "charge": int(charge)}
+        with tempfile.TemporaryDirectory() as upload_dir:
+            ref_confo_path = os.path.join(upload_dir, ref_confo_file.name)
+            with open(ref_confo_path, "wb") as f:
+                f.write(ref_confo_file.getbuffer())
+            job_pool.submit(ref_confo_path, options, name=ref_confo_file.name)
+
+
+def progress_text(job):
+    progress = job["progress"]
+    parts = [progress.get("stage", "waiting for a worker" if job["state"] == "queued" else "starting")]
+    if "step" in progress:
+        parts.append(f"step {progress['step']}")
+    if "energy" in progress:
+        parts.append(f"E = {progress['energy']:.8f} Ha")
+    if "grad_max" in progress:
+        parts.append(f"max gradient {progress['grad_max']:.2e}")
+    if "elapsed" in progress:
+        parts.append(f"{progress['elapsed']:.0f} s")
+    return ", ".join(parts)
+
+
+def show_active_jobs():
+    """Live table of queued and running jobs; reruns the page once one of them finishes."""
+    active = job_pool.active()
+    job_pool.poll()
+    if any(job_pool.jobs[job_id]["state"] not in ACTIVE_STATES for job_id in active):
+        st.rerun()
+    for job_id in job_pool.active():
+        job = job_pool.jobs[job_id]
+        name_col, state_col, progress_col, button_col = st.columns([3, 1, 5, 1])
+        name_col.write(f"**{job['name']}**")
+        state_col.write(job["state"])
+        progress_col.write(progress_text(job))
+        if button_col.button("Cancel", key=f"cancel_{job_id}"):
+            job_pool.cancel(job_id)
+            st.rerun()
+
+
+def show_finished_job(job_id, job):
+    status = job["status"]
+    directory = job_pool.directory(job_id)
+    if job["state"] != "done":
+        st.write(f"{job['state'].capitalize()}" + (f": {status['error']}" if status.get("error") else ""))
+    for record in status.get("results") or []:
+        if record["error"]:
+            st.error(record["error"])
+            continue
+        st.markdown(f"<div style='color: black; font-size: 14px; font-weight: bold; margin-top: 20px; margin-left: 20px'>Energy (kJ/mol): {record['energy_kjmol']:.2f}</div>", unsafe_allow_html=True)
+        with open(os.path.join(directory, record["xyz_filename"])) as f:
+            ref_molecule = read_structure_content(f.read(), 'xyz')
+        ori_molecule = Chem.SDMolSupplier(os.path.join(directory, job["sdf_file"]), removeHs=False)[record["index"]]
+        file_html = render_molecule_all([ori_molecule, ref_molecule])
+        st.components.v1.html(file_html, height=700, width=800)
+    if st.button("Remove", key=f"remove_{job_id}"):
+        job_pool.forget(job_id)
+        st.rerun()
+
+
+JOB_POLL_SECONDS = 2
+
+if job_pool.jobs:
+    st.subheader("Jobs")
+    # Only the job table refreshes while jobs are active; the rest of the page stays as it is.
+    st.fragment(run_every=JOB_POLL_SECONDS if job_pool.active() else None)(show_active_jobs)()
+    for job_id, job in reversed(list(job_pool.jobs.items())):
+        if job["state"] not in ACTIVE_STATES:
+            with st.expander(f"{job['name']} ({job['state']})", expanded=job["state"] == "done"):
+                show_finished_job(job_id, job)